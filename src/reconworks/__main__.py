@@ -10,9 +10,13 @@ from .pipeline import (
     run_normalize,
     run_model,
     run_qa,
+    run_qa_metrics,
     run_match,
+    run_rematch,
     run_exceptions,
+    run_exception_drilldown,
     run_report,
+    run_spend_trends,
     run_build_excel,
     run_publish_pq,
 )
@@ -65,18 +69,51 @@ def main() -> None:
     p_match.add_argument("--batch-id", default=None)
     p_match.add_argument("--export-csv", action="store_true")
 
+    p_qa_metrics = sub.add_parser("qa-metrics", help="Stage 6: per-check QA timings and hit counts (slowest first)")
+    p_qa_metrics.add_argument("--config", default="config.toml")
+    p_qa_metrics.add_argument("--repo-root", default=".")
+    p_qa_metrics.add_argument("--batch-id", default=None)
+    p_qa_metrics.add_argument("--top", type=int, default=20)
+    p_qa_metrics.add_argument("--sort", choices=["elapsed_ms", "hits", "hit_rate"], default="elapsed_ms")
+
+    p_rematch = sub.add_parser("rematch", help="Stage 7 (incremental): re-match only around added/changed fact rows")
+    p_rematch.add_argument("--config", default="config.toml")
+    p_rematch.add_argument("--repo-root", default=".")
+    p_rematch.add_argument("--batch-id", default=None)
+    p_rematch.add_argument("--txn-ids", default=None, help="Comma-separated txn_ids (default: detect changes since the last match)")
+    p_rematch.add_argument("--pay-ids", default=None, help="Comma-separated pay_ids (default: detect changes since the last match)")
+
     p_exc = sub.add_parser("exceptions", help="Stage 8: build exceptions table")
     p_exc.add_argument("--config", default="config.toml")
     p_exc.add_argument("--repo-root", default=".")
     p_exc.add_argument("--batch-id", default=None)
     p_exc.add_argument("--export-csv", action="store_true")
 
+    p_drill = sub.add_parser("exceptions-drilldown", help="Stage 8: individual exceptions behind one (rolled-up) code")
+    p_drill.add_argument("--config", default="config.toml")
+    p_drill.add_argument("--repo-root", default=".")
+    p_drill.add_argument("--batch-id", default=None)
+    p_drill.add_argument("--code", required=True)
+    p_drill.add_argument("--output", default=None, help="Write the rows to this CSV instead of printing the first --top")
+    p_drill.add_argument("--top", type=int, default=20)
+
     p_rpt = sub.add_parser("report", help="Stage 9: reporting marts")
     p_rpt.add_argument("--config", default="config.toml")
     p_rpt.add_argument("--repo-root", default=".")
     p_rpt.add_argument("--batch-id", default=None)
     p_rpt.add_argument("--export-csv", action="store_true")
 
+    p_trends = sub.add_parser("trends", help="Stage 9: spend and match-rate trends across batches (from rpt_spend_cube)")
+    p_trends.add_argument("--config", default="config.toml")
+    p_trends.add_argument("--repo-root", default=".")
+    p_trends.add_argument("--by", default="month,source,currency", help="Comma-separated: month, source, currency, vendor_id, vendor_canonical, matched")
+    p_trends.add_argument("--from", dest="start_month", default=None, help="First month (YYYY-MM)")
+    p_trends.add_argument("--to", dest="end_month", default=None, help="Last month (YYYY-MM)")
+    p_trends.add_argument("--source", default=None, choices=["transactions", "vendor_payments"])
+    p_trends.add_argument("--currency", default=None)
+    p_trends.add_argument("--vendor-id", default=None)
+    p_trends.add_argument("--output", default=None, help="Write the trend rows to this CSV instead of printing them")
+
     p_xl = sub.add_parser("build-excel", help="Stage 10: build Excel dashboard workbook")
     p_xl.add_argument("--config", default="config.toml")
     p_xl.add_argument("--repo-root", default=".")
@@ -136,6 +173,16 @@ def main() -> None:
             print(f"  - {k}: {v}")
         return
 
+    if args.cmd == "qa-metrics":
+        metrics = run_qa_metrics(repo_root=repo_root, config_path=repo_root / args.config, batch_id=args.batch_id)
+        if metrics.empty:
+            print("No QA metrics recorded for this batch; run `qa` first.")
+            return
+        metrics = metrics.sort_values(args.sort, ascending=False, kind="stable").head(args.top)
+        print(f"QA checks by {args.sort} (top {len(metrics)}):")
+        print(metrics.to_string(index=False))
+        return
+
     if args.cmd == "match":
         summary = run_match(repo_root=repo_root, config_path=repo_root / args.config, batch_id=args.batch_id, export_csv=bool(args.export_csv))
         print("✅ Matching complete.")
@@ -143,6 +190,19 @@ def main() -> None:
             print(f"  - {k}: {v}")
         return
 
+    if args.cmd == "rematch":
+        summary = run_rematch(
+            repo_root=repo_root,
+            config_path=repo_root / args.config,
+            batch_id=args.batch_id,
+            txn_ids=args.txn_ids.split(",") if args.txn_ids else None,
+            pay_ids=args.pay_ids.split(",") if args.pay_ids else None,
+        )
+        print("✅ Rematch complete.")
+        for k, v in summary.items():
+            print(f"  - {k}: {v}")
+        return
+
     if args.cmd == "exceptions":
         summary = run_exceptions(repo_root=repo_root, config_path=repo_root / args.config, batch_id=args.batch_id, export_csv=bool(args.export_csv))
         print("✅ Exceptions complete.")
@@ -150,6 +210,16 @@ def main() -> None:
             print(f"  - {k}: {v}")
         return
 
+    if args.cmd == "exceptions-drilldown":
+        rows = run_exception_drilldown(repo_root=repo_root, config_path=repo_root / args.config, code=args.code, batch_id=args.batch_id)
+        if args.output:
+            rows.to_csv(repo_root / args.output, index=False)
+            print(f"✅ {len(rows)} {args.code} exceptions written to {args.output}")
+            return
+        print(f"{len(rows)} {args.code} exceptions (first {min(args.top, len(rows))}):")
+        print(rows.head(args.top).to_string(index=False))
+        return
+
     if args.cmd == "report":
         summary = run_report(repo_root=repo_root, config_path=repo_root / args.config, batch_id=args.batch_id, export_csv=bool(args.export_csv))
         print("✅ Reporting complete.")
@@ -157,6 +227,27 @@ def main() -> None:
             print(f"  - {k}: {v}")
         return
 
+    if args.cmd == "trends":
+        trends = run_spend_trends(
+            repo_root=repo_root,
+            config_path=repo_root / args.config,
+            by=[d.strip() for d in args.by.split(",") if d.strip()],
+            start_month=args.start_month,
+            end_month=args.end_month,
+            source=args.source,
+            currency=args.currency,
+            vendor_id=args.vendor_id,
+        )
+        if args.output:
+            trends.to_csv(repo_root / args.output, index=False)
+            print(f"✅ {len(trends)} trend rows written to {args.output}")
+            return
+        if trends.empty:
+            print("No trend data; run `report` for at least one batch first.")
+            return
+        print(trends.to_string(index=False))
+        return
+
     if args.cmd == "build-excel":
         summary = run_build_excel(repo_root=repo_root, config_path=repo_root / args.config)
         print("✅ Excel built.")
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import numpy as np
+
+# Switch from vectorized rounds to the sequential scan once a round resolves
+# fewer than this many pairs (long chains of conflicting candidates).
+_MIN_ROUND_PICKS = 64
+
+def greedy_order(score: np.ndarray, vendor_sim: np.ndarray) -> np.ndarray:
+    """Stable rank order: score desc, then vendor_sim desc, then input order."""
+    # Two stable passes (secondary key first) are much cheaper than lexsort on floats.
+    order = np.argsort(-np.asarray(vendor_sim, dtype=np.float64), kind="stable")
+    return order[np.argsort(-np.asarray(score, dtype=np.float64)[order], kind="stable")]
+
+def _first_per_key(keys: np.ndarray, scratch: np.ndarray) -> np.ndarray:
+    """Boolean mask of the first occurrence of each key (keys already in rank order).
+
+    Writing positions in reverse leaves the earliest position per key, since
+    the last write wins for repeated indices; no sort needed.
+    """
+    pos = np.arange(len(keys), dtype=np.int64)
+    scratch[keys[::-1]] = pos[::-1]
+    return scratch[keys] == pos
+
+def greedy_assign(
+    txn_codes: np.ndarray,
+    pay_codes: np.ndarray,
+    score: np.ndarray,
+    vendor_sim: np.ndarray,
+    min_score: float,
+) -> np.ndarray:
+    """Greedy 1:1 assignment over integer-coded candidates.
+
+    Equivalent to walking candidates by (score desc, vendor_sim desc) and taking
+    every pair whose txn and pay are both unused, stopping below ``min_score``.
+    Returns the chosen candidate positions in that walk order.
+
+    Each round takes every pair that is the best remaining candidate for both
+    its txn and its pay (the sequential walk would take exactly those), then
+    drops candidates touching a used id. Leftovers go through a plain scan.
+    """
+    txn_codes = np.asarray(txn_codes, dtype=np.int64)
+    pay_codes = np.asarray(pay_codes, dtype=np.int64)
+    score = np.asarray(score, dtype=np.float64)
+    if len(score) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # Only candidates at or above the cut-off ever need ranking.
+    eligible = np.flatnonzero(score >= float(min_score))
+    order = eligible[greedy_order(score[eligible], np.asarray(vendor_sim, dtype=np.float64)[eligible])]
+
+    used_txn = np.zeros(int(txn_codes.max()) + 1, dtype=bool)
+    used_pay = np.zeros(int(pay_codes.max()) + 1, dtype=bool)
+    txn_scratch = np.empty(len(used_txn), dtype=np.int64)
+    pay_scratch = np.empty(len(used_pay), dtype=np.int64)
+    picked = []
+
+    rem = order
+    while len(rem):
+        t = txn_codes[rem]
+        p = pay_codes[rem]
+        take = _first_per_key(t, txn_scratch) & _first_per_key(p, pay_scratch)
+        chosen = rem[take]
+        picked.append(chosen)
+        used_txn[txn_codes[chosen]] = True
+        used_pay[pay_codes[chosen]] = True
+        rem = rem[~(used_txn[t] | used_pay[p])]
+        if len(chosen) < _MIN_ROUND_PICKS:
+            break
+
+    if len(rem):
+        tail = []
+        ut = used_txn.tolist()
+        up = used_pay.tolist()
+        for i, t, p in zip(rem.tolist(), txn_codes[rem].tolist(), pay_codes[rem].tolist()):
+            if ut[t] or up[p]:
+                continue
+            ut[t] = True
+            up[p] = True
+            tail.append(i)
+        picked.append(np.asarray(tail, dtype=np.int64))
+
+    if not picked:
+        return np.empty(0, dtype=np.int64)
+    chosen = np.concatenate(picked)
+    # Report in walk order, as the sequential scan would have emitted them.
+    rank = np.empty(len(score), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    return chosen[np.argsort(rank[chosen], kind="stable")]
+
+def optimal_assign(
+    txn_codes: np.ndarray,
+    pay_codes: np.ndarray,
+    score: np.ndarray,
+    vendor_sim: np.ndarray,
+    min_score: float,
+    max_component_size: int = 500,
+) -> np.ndarray:
+    """Max-total-score 1:1 assignment, solved per connected component.
+
+    The candidate graph (txn and pay ids as nodes, candidates >= ``min_score`` as
+    edges) is split into connected components. Components with a single txn or
+    a single pay only ever match one pair, so greedy is already optimal there.
+    Other components are solved with ``scipy.optimize.linear_sum_assignment``,
+    unless they have more than ``max_component_size`` nodes; those fall back to
+    greedy. Returns chosen candidate positions in greedy walk order.
+    """
+    try:
+        from scipy.optimize import linear_sum_assignment
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import connected_components
+    except ImportError as e:  # pragma: no cover - depends on environment
+        raise ImportError("assignment_mode = 'optimal' requires scipy (pip install 'reconworks[optimal]').") from e
+
+    txn_codes = np.asarray(txn_codes, dtype=np.int64)
+    pay_codes = np.asarray(pay_codes, dtype=np.int64)
+    score = np.asarray(score, dtype=np.float64)
+    vendor_sim = np.asarray(vendor_sim, dtype=np.float64)
+    eligible = np.flatnonzero(score >= float(min_score))
+    if len(eligible) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    t = txn_codes[eligible]
+    p = pay_codes[eligible]
+    n_txn = int(txn_codes.max()) + 1
+    n_nodes = n_txn + int(pay_codes.max()) + 1
+    graph = coo_matrix((np.ones(len(eligible)), (t, p + n_txn)), shape=(n_nodes, n_nodes))
+    _, labels = connected_components(graph, directed=False)
+    comp = labels[t]
+
+    # Distinct txn / pay nodes per component
+    n_comp = int(labels.max()) + 1
+    txn_nodes = np.unique(t)
+    pay_nodes = np.unique(p)
+    comp_txn = np.bincount(labels[txn_nodes], minlength=n_comp)
+    comp_pay = np.bincount(labels[pay_nodes + n_txn], minlength=n_comp)
+    trivial = (comp_txn <= 1) | (comp_pay <= 1) | ((comp_txn + comp_pay) > int(max_component_size))
+
+    # Components are independent, so one greedy pass over all of them is per-component greedy.
+    on_greedy = trivial[comp]
+    greedy_idx = eligible[on_greedy]
+    picked = [greedy_idx[greedy_assign(t[on_greedy], p[on_greedy], score[greedy_idx], vendor_sim[greedy_idx], min_score)]]
+
+    rest = np.flatnonzero(~on_greedy)
+    rest = rest[np.argsort(comp[rest], kind="stable")]
+    bounds = np.flatnonzero(np.diff(comp[rest])) + 1
+    for group in np.split(rest, bounds):
+        if len(group) == 0:
+            continue
+        rows, ti = np.unique(t[group], return_inverse=True)
+        cols, pi = np.unique(p[group], return_inverse=True)
+        weight = np.zeros((len(rows), len(cols)), dtype=np.float64)
+        edge = np.full((len(rows), len(cols)), -1, dtype=np.int64)
+        # Write lowest-ranked first so duplicate (txn, pay) candidates keep the best one.
+        k = greedy_order(score[eligible[group]], vendor_sim[eligible[group]])[::-1]
+        weight[ti[k], pi[k]] = score[eligible[group[k]]]
+        edge[ti[k], pi[k]] = eligible[group[k]]
+        r, c = linear_sum_assignment(weight, maximize=True)
+        chosen = edge[r, c]
+        picked.append(chosen[chosen >= 0])
+
+    chosen = np.sort(np.concatenate(picked))
+    return chosen[greedy_order(score[chosen], vendor_sim[chosen])]
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import tomllib
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Dict
 
@@ -21,6 +21,55 @@ class MatchingConfig:
     amount_tolerance_cents: int = 0
     min_score: float = 0.80
     low_confidence_threshold: float = 0.90
+    vendor_weight: float = 0.6
+    date_weight: float = 0.3
+    amount_weight: float = 0.1
+    exact_fast_path: bool = True
+    similarity_workers: int = -1  # rapidfuzz worker threads; -1 = all cores
+    similarity_cache: bool = True
+    similarity_cache_max_rows: int = 200000
+    assignment_mode: str = "greedy"  # "greedy" or "optimal"
+    optimal_max_component_size: int = 500
+    parallel_workers: int = 0  # > 1 enables partitioned candidate generation on a process pool
+    parallel_amount_bucket_cents: int = 10000
+    parallel_date_block_days: int = 31
+    candidate_top_k: int = 0  # 0 keeps every candidate
+    candidate_min_score: float = 0.0
+    candidate_storage: str = "all"  # "all", "summary" or "none"
+    open_items_ledger: bool = False
+    engine: str = "memory"  # "memory" or "sql" (out-of-core)
+    sql_chunk_rows: int = 200000
+    split_matching: bool = False  # many-to-one pass over residual records
+    split_date_window_days: int = 31
+    split_amount_tolerance_cents: int = 0
+    split_max_group_size: int = 32
+    split_max_nodes: int = 200000
+    split_time_budget_ms: int = 200
+    rematch_hops: int = 2  # neighbourhood expansion rounds for incremental rematch
+
+@dataclass(frozen=True)
+class QAConfig:
+    policy_engine: str = "pandas"  # "pandas" or "sql" (rules evaluated inside SQLite)
+    cross_batch_duplicates: bool = False
+    vendor_outliers: bool = False  # per-vendor amount quantiles from persistent sketches
+    vendor_outlier_quantile: float = 0.99
+    vendor_outlier_min_count: int = 20
+    sketch_relative_accuracy: float = 0.01
+    profile_memory: bool = False  # tracemalloc per check in qa_rule_metrics (slower)
+
+@dataclass(frozen=True)
+class ExceptionsConfig:
+    engine: str = "pandas"  # "pandas" or "sql" (INSERT ... SELECT with anti-joins inside SQLite)
+    lifecycle: bool = False  # track first_seen/last_seen/resolved_at and write only the delta
+    rollup_threshold: int = 0  # codes with more rows than this are stored as one summary row (0 = off)
+    rollup_thresholds: Dict[str, int] = field(default_factory=dict)  # per-code overrides (0 = never)
+
+@dataclass(frozen=True)
+class ReportingConfig:
+    top_n_vendors: int = 20
+    engine: str = "pandas"  # "pandas" or "sql" (each mart one GROUP BY inside SQLite)
+    incremental: bool = False  # refresh rpt_* marts from queued match/exception deltas
+    spend_cube: bool = True  # keep this batch's slice of rpt_spend_cube (cross-batch trends) current
 
 @dataclass(frozen=True)
 class PowerQueryConfig:
@@ -36,6 +85,9 @@ class ProjectConfig:
     reference: ReferenceConfig
     matching: MatchingConfig
     powerquery: PowerQueryConfig
+    qa: QAConfig = QAConfig()
+    exceptions: ExceptionsConfig = ExceptionsConfig()
+    reporting: ReportingConfig = ReportingConfig()
 
 def load_config(config_path: str | Path) -> ProjectConfig:
     p = Path(config_path)
@@ -46,6 +98,9 @@ def load_config(config_path: str | Path) -> ProjectConfig:
     reference_raw = data.get("reference", {})
     matching_raw = data.get("matching", {})
     pq_raw = data.get("powerquery", {})
+    qa_raw = data.get("qa", {})
+    exceptions_raw = data.get("exceptions", {})
+    reporting_raw = data.get("reporting", {})
 
     sources: Dict[str, SourceConfig] = {}
     for key, val in sources_raw.items():
@@ -61,6 +116,31 @@ def load_config(config_path: str | Path) -> ProjectConfig:
         amount_tolerance_cents=int(matching_raw.get("amount_tolerance_cents", 0)),
         min_score=float(matching_raw.get("min_score", 0.80)),
         low_confidence_threshold=float(matching_raw.get("low_confidence_threshold", 0.90)),
+        vendor_weight=float(matching_raw.get("vendor_weight", 0.6)),
+        date_weight=float(matching_raw.get("date_weight", 0.3)),
+        amount_weight=float(matching_raw.get("amount_weight", 0.1)),
+        exact_fast_path=bool(matching_raw.get("exact_fast_path", True)),
+        similarity_workers=int(matching_raw.get("similarity_workers", -1)),
+        similarity_cache=bool(matching_raw.get("similarity_cache", True)),
+        similarity_cache_max_rows=int(matching_raw.get("similarity_cache_max_rows", 200000)),
+        assignment_mode=str(matching_raw.get("assignment_mode", "greedy")),
+        optimal_max_component_size=int(matching_raw.get("optimal_max_component_size", 500)),
+        parallel_workers=int(matching_raw.get("parallel_workers", 0)),
+        parallel_amount_bucket_cents=int(matching_raw.get("parallel_amount_bucket_cents", 10000)),
+        parallel_date_block_days=int(matching_raw.get("parallel_date_block_days", 31)),
+        candidate_top_k=int(matching_raw.get("candidate_top_k", 0)),
+        candidate_min_score=float(matching_raw.get("candidate_min_score", 0.0)),
+        candidate_storage=str(matching_raw.get("candidate_storage", "all")),
+        open_items_ledger=bool(matching_raw.get("open_items_ledger", False)),
+        engine=str(matching_raw.get("engine", "memory")),
+        sql_chunk_rows=int(matching_raw.get("sql_chunk_rows", 200000)),
+        split_matching=bool(matching_raw.get("split_matching", False)),
+        split_date_window_days=int(matching_raw.get("split_date_window_days", 31)),
+        split_amount_tolerance_cents=int(matching_raw.get("split_amount_tolerance_cents", 0)),
+        split_max_group_size=int(matching_raw.get("split_max_group_size", 32)),
+        split_max_nodes=int(matching_raw.get("split_max_nodes", 200000)),
+        split_time_budget_ms=int(matching_raw.get("split_time_budget_ms", 200)),
+        rematch_hops=int(matching_raw.get("rematch_hops", 2)),
     )
 
     powerquery = PowerQueryConfig(
@@ -68,6 +148,30 @@ def load_config(config_path: str | Path) -> ProjectConfig:
         mode=str(pq_raw.get("mode", "history")),
     )
 
+    qa = QAConfig(
+        policy_engine=str(qa_raw.get("policy_engine", "pandas")),
+        cross_batch_duplicates=bool(qa_raw.get("cross_batch_duplicates", False)),
+        vendor_outliers=bool(qa_raw.get("vendor_outliers", False)),
+        vendor_outlier_quantile=float(qa_raw.get("vendor_outlier_quantile", 0.99)),
+        vendor_outlier_min_count=int(qa_raw.get("vendor_outlier_min_count", 20)),
+        sketch_relative_accuracy=float(qa_raw.get("sketch_relative_accuracy", 0.01)),
+        profile_memory=bool(qa_raw.get("profile_memory", False)),
+    )
+
+    exceptions = ExceptionsConfig(
+        engine=str(exceptions_raw.get("engine", "pandas")),
+        lifecycle=bool(exceptions_raw.get("lifecycle", False)),
+        rollup_threshold=int(exceptions_raw.get("rollup_threshold", 0)),
+        rollup_thresholds={str(k): int(v) for k, v in exceptions_raw.get("rollup_thresholds", {}).items()},
+    )
+
+    reporting = ReportingConfig(
+        top_n_vendors=int(reporting_raw.get("top_n_vendors", 20)),
+        engine=str(reporting_raw.get("engine", "pandas")),
+        incremental=bool(reporting_raw.get("incremental", False)),
+        spend_cube=bool(reporting_raw.get("spend_cube", True)),
+    )
+
     return ProjectConfig(
         name=str(project.get("name", "ReconWorks")),
         output_dir=str(project.get("output_dir", "out")),
@@ -76,4 +180,7 @@ def load_config(config_path: str | Path) -> ProjectConfig:
         reference=ref,
         matching=matching,
         powerquery=powerquery,
+        qa=qa,
+        exceptions=exceptions,
+        reporting=reporting,
     )
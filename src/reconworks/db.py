@@ -233,6 +233,19 @@ def create_match_candidates_table(conn: sqlite3.Connection) -> None:
     )
     conn.commit()
 
+def create_match_candidate_summary_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS match_candidate_summary ("
+        " batch_id TEXT,"
+        " txn_id TEXT,"
+        " candidate_count INTEGER,"
+        " best_pay_id TEXT,"
+        " best_score REAL,"
+        " runner_up_score REAL"
+        ");"
+    )
+    conn.commit()
+
 def create_matches_table(conn: sqlite3.Connection) -> None:
     conn.execute(
         "CREATE TABLE IF NOT EXISTS matches ("
@@ -330,3 +343,228 @@ def insert_excel_run(conn: sqlite3.Connection, row: Dict[str, Any]) -> None:
     values = [row[k] for k in keys]
     conn.execute(f"INSERT INTO excel_runs ({cols}) VALUES ({placeholders});", values)
     conn.commit()
+
+def create_vendor_similarity_cache_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS vendor_similarity_cache ("
+        " vendor_id_a TEXT,"
+        " vendor_id_b TEXT,"
+        " algo_version TEXT,"
+        " similarity REAL,"
+        " last_used_utc TEXT,"
+        " PRIMARY KEY (vendor_id_a, vendor_id_b, algo_version)"
+        ");"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vsim_last_used ON vendor_similarity_cache(last_used_utc);")
+    conn.commit()
+
+def create_open_items_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS open_items ("
+        " record_type TEXT,"  # 'txn' or 'pay'
+        " record_id TEXT,"
+        " batch_id TEXT,"  # batch the record came from
+        " vendor_id TEXT,"
+        " date TEXT,"
+        " amount_cents INTEGER,"
+        " added_at_utc TEXT,"
+        " closed_by_batch_id TEXT,"  # NULL while the item is open
+        " closed_at_utc TEXT,"
+        " PRIMARY KEY (record_type, record_id)"
+        ");"
+    )
+    # Partial index: lookups only ever scan open items, by amount range then date range.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_open_items_amount_date ON open_items(record_type, amount_cents, date)"
+        " WHERE closed_by_batch_id IS NULL;"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_open_items_batch ON open_items(batch_id);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_open_items_closed_by ON open_items(closed_by_batch_id);")
+    conn.commit()
+
+def create_fact_range_indexes(conn: sqlite3.Connection) -> None:
+    """(batch_id, amount_cents, date) indexes for range joins and neighbourhood lookups on the fact tables."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_fact_tx_batch_amount_date ON fact_transactions(batch_id, amount_cents, date);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_fact_vp_batch_amount_date ON fact_vendor_payments(batch_id, amount_cents, date);")
+    conn.commit()
+
+def create_fact_duplicate_indexes(conn: sqlite3.Connection) -> None:
+    """(vendor_id, date, amount_cents) indexes over all batches, for cross-batch duplicate lookups."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_fact_tx_vendor_date_amount ON fact_transactions(vendor_id, date, amount_cents);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_fact_vp_vendor_date_amount ON fact_vendor_payments(vendor_id, date, amount_cents);")
+    conn.commit()
+
+def create_vendor_amount_sketch_table(conn: sqlite3.Connection) -> None:
+    """Log-bucket amount counts per vendor and batch; summing over batches merges the sketches."""
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS vendor_amount_sketch ("
+        " record_type TEXT,"  # 'transactions' or 'vendor_payments'
+        " relative_accuracy REAL,"
+        " vendor_id TEXT,"
+        " batch_id TEXT,"
+        " bucket INTEGER,"
+        " count INTEGER,"
+        " PRIMARY KEY (record_type, relative_accuracy, vendor_id, batch_id, bucket)"
+        ");"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vendor_amount_sketch_batch ON vendor_amount_sketch(batch_id);")
+    conn.commit()
+
+def create_qa_rule_metrics_table(conn: sqlite3.Connection) -> None:
+    """Per-check QA instrumentation: one row per check (or policy rule) and record type per batch."""
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS qa_rule_metrics ("
+        " batch_id TEXT,"
+        " check_name TEXT,"
+        " check_kind TEXT,"  # 'builtin', 'policy', 'policy_sql' or 'history'
+        " rule_no INTEGER,"  # position in the compiled policy rule set
+        " record_type TEXT,"
+        " rows_scanned INTEGER,"
+        " hits INTEGER,"
+        " elapsed_ms REAL,"
+        " memory_delta_bytes INTEGER,"
+        " created_at_utc TEXT"
+        ");"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_qa_rule_metrics_batch ON qa_rule_metrics(batch_id);")
+    conn.commit()
+
+def create_match_lookup_indexes(conn: sqlite3.Connection) -> None:
+    """Per-record lookups into matches and match_candidates (anti-joins, partial deletes)."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_batch_txn ON matches(batch_id, txn_id);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_batch_pay ON matches(batch_id, pay_id);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_match_candidates_batch_txn ON match_candidates(batch_id, txn_id);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_match_candidates_batch_pay ON match_candidates(batch_id, pay_id);")
+    conn.commit()
+
+def create_match_id_indexes(conn: sqlite3.Connection) -> None:
+    """Lookups into matches by record id alone; ledger matches sit under a later batch than the record."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_txn ON matches(txn_id);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_pay ON matches(pay_id);")
+    conn.commit()
+
+def create_match_inputs_table(conn: sqlite3.Connection) -> None:
+    """Snapshot of the matching inputs per record, used to detect changed facts."""
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS match_inputs ("
+        " record_type TEXT,"  # 'txn' or 'pay'
+        " record_id TEXT,"
+        " batch_id TEXT,"
+        " vendor_id TEXT,"
+        " vendor_canonical TEXT,"
+        " date TEXT,"
+        " amount_cents INTEGER,"
+        " PRIMARY KEY (record_type, record_id)"
+        ");"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_match_inputs_batch ON match_inputs(batch_id);")
+    conn.commit()
+
+def create_exception_lifecycle_table(conn: sqlite3.Connection) -> None:
+    """One row per exception_id ever raised: when it was first/last seen and when it was resolved."""
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS exception_lifecycle ("
+        " exception_id TEXT PRIMARY KEY,"
+        " batch_id TEXT,"
+        " record_type TEXT,"
+        " record_id TEXT,"
+        " exception_code TEXT,"
+        " first_seen_utc TEXT,"
+        " last_seen_utc TEXT,"
+        " resolved_at_utc TEXT,"  # NULL while open
+        " resolved_by_batch_id TEXT,"
+        " last_change TEXT,"  # 'new', 'updated', 'reopened', 'absorbed' or 'resolved'
+        " changed_at_utc TEXT"
+        ");"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_exception_lifecycle_batch ON exception_lifecycle(batch_id, resolved_at_utc);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_exception_lifecycle_record ON exception_lifecycle(record_type, record_id);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_exceptions_id ON exceptions(exception_id);")
+    conn.commit()
+
+def create_exception_rollups_table(conn: sqlite3.Connection) -> None:
+    """Per-batch summary of exception codes stored as one rolled-up row instead of one row per record."""
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS exception_rollups ("
+        " batch_id TEXT,"
+        " exception_code TEXT,"
+        " record_types TEXT,"  # comma-separated record types covered
+        " severity TEXT,"
+        " exception_count INTEGER,"
+        " amount_cents_sum INTEGER,"
+        " vendor_count INTEGER,"
+        " top_vendor_canonical TEXT,"
+        " top_vendor_count INTEGER,"
+        " date_min TEXT,"
+        " date_max TEXT,"
+        " sample_message TEXT,"
+        " created_at_utc TEXT"
+        ");"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_exception_rollups_batch ON exception_rollups(batch_id, exception_code);")
+    conn.commit()
+
+def create_report_state_tables(conn: sqlite3.Connection) -> None:
+    """Per-transaction mart contributions and the queue of keys whose marts are stale."""
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS rpt_txn_state ("
+        " txn_id TEXT PRIMARY KEY,"
+        " batch_id TEXT,"
+        " month TEXT,"
+        " vendor_canonical TEXT,"
+        " amount_cents INTEGER,"
+        " is_matched INTEGER"
+        ");"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rpt_txn_state_batch ON rpt_txn_state(batch_id);")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS rpt_pending ("
+        " batch_id TEXT,"
+        " kind TEXT,"  # 'batch' (rebuild everything), 'txn' / 'pay' (one record) or 'exceptions'
+        " record_id TEXT"
+        ");"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rpt_pending_batch ON rpt_pending(batch_id, kind);")
+    conn.commit()
+
+def create_report_indexes(conn: sqlite3.Connection) -> None:
+    """Covering indexes for the reporting GROUP BYs, so they never touch the base rows."""
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_fact_tx_batch_month_vendor"
+        " ON fact_transactions(batch_id, month, vendor_canonical, txn_id, amount_cents);"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_exceptions_batch_code ON exceptions(batch_id, exception_code, severity, record_type);")
+    conn.commit()
+
+def create_spend_cube_table(conn: sqlite3.Connection) -> None:
+    """Pre-aggregated facts of every batch for cross-batch trends; one slice per batch, replaced as a unit."""
+    if table_exists(conn, "rpt_spend_cube") and "source_file" not in get_columns(conn, "rpt_spend_cube"):
+        # Cube from before source_file was a key: derived data, so drop it and let backfill re-slice.
+        conn.execute("DROP TABLE rpt_spend_cube;")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS rpt_spend_cube ("
+        " batch_id TEXT,"
+        " month TEXT,"  # '' when the record has no parsed date
+        " vendor_id TEXT,"
+        " vendor_canonical TEXT,"  # attribute of vendor_id, kept for display
+        " source TEXT,"  # 'transactions' or 'vendor_payments'
+        " source_file TEXT,"  # '' when unknown; re-ingests of a file count once in trends
+        " matched INTEGER,"
+        " currency TEXT,"
+        " record_count INTEGER,"
+        " amount_cents INTEGER,"
+        " refreshed_at_utc TEXT,"
+        " PRIMARY KEY (batch_id, month, vendor_id, source, source_file, matched, currency)"
+        ");"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rpt_spend_cube_month ON rpt_spend_cube(month, source, currency);")
+    # Slice batch_id counted records as matched by matches stored under matched_in_batch_id (ledger carry-overs).
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS rpt_spend_cube_links ("
+        " batch_id TEXT,"
+        " matched_in_batch_id TEXT,"
+        " PRIMARY KEY (batch_id, matched_in_batch_id)"
+        ");"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rpt_spend_cube_links_match ON rpt_spend_cube_links(matched_in_batch_id);")
+    conn.commit()
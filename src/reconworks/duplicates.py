@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import sqlite3
+
+import pandas as pd
+
+from .db import create_fact_duplicate_indexes, table_exists
+
+# record_type -> (fact table, id column)
+_FACTS = {
+    "transactions": ("fact_transactions", "txn_id"),
+    "vendor_payments": ("fact_vendor_payments", "pay_id"),
+}
+
+def _load_batch_order(conn: sqlite3.Connection) -> None:
+    # First ingest time per batch; re-modeling a batch rewrites its fact rowids but not this.
+    conn.execute("DROP TABLE IF EXISTS temp._batch_load_order;")
+    conn.execute("CREATE TEMP TABLE _batch_load_order (batch_id TEXT PRIMARY KEY, loaded_at TEXT);")
+    if table_exists(conn, "ingest_files"):
+        conn.execute(
+            "INSERT INTO _batch_load_order SELECT batch_id, MIN(ingested_at_utc) FROM ingest_files"
+            " WHERE batch_id IS NOT NULL GROUP BY batch_id;"
+        )
+
+def cross_batch_duplicate_flags(conn: sqlite3.Connection, batch_id: str, created_at: str) -> pd.DataFrame:
+    """DUPLICATE_CROSS_BATCH flags for batch rows whose (vendor_id, date, amount_cents) already exist in an earlier batch.
+
+    Each batch row is one probe of the persistent ``(vendor_id, date,
+    amount_cents)`` index over all batches, so the cost follows the batch size,
+    not the history size. Only batches loaded before this one count (by first
+    ingest time, or fact rowid for batches without ingest records), so a pair
+    is flagged once, on the later side, whichever batch is re-checked. A row
+    re-loaded from the same ``source_file`` is the same record, not a
+    duplicate. Each row is flagged once, naming the earliest loaded duplicate.
+    """
+    create_fact_duplicate_indexes(conn)
+    _load_batch_order(conn)
+    row = conn.execute("SELECT loaded_at FROM _batch_load_order WHERE batch_id = ?;", (batch_id,)).fetchone()
+    loaded_at = row[0] if row else None
+    frames = []
+    for rtype, (table, id_col) in _FACTS.items():
+        frames.append(pd.read_sql_query(
+            f"""
+            WITH hits AS (
+                SELECT f.rowid AS f_row, (
+                    SELECT h.rowid FROM {table} h
+                    LEFT JOIN _batch_load_order o ON o.batch_id = h.batch_id
+                    WHERE h.vendor_id = f.vendor_id AND h.date = f.date AND h.amount_cents = f.amount_cents
+                      AND h.batch_id != f.batch_id AND h.source_file IS NOT f.source_file
+                      AND CASE
+                          WHEN o.loaded_at IS NULL OR :loaded IS NULL THEN h.rowid < f.rowid
+                          ELSE o.loaded_at < :loaded OR (o.loaded_at = :loaded AND h.batch_id < :b)
+                      END
+                    ORDER BY o.loaded_at, h.rowid LIMIT 1
+                ) AS h_row
+                FROM {table} f
+                WHERE f.batch_id = :b
+            )
+            SELECT
+                f.batch_id AS batch_id,
+                :rtype AS record_type,
+                f.{id_col} AS record_id,
+                'DUPLICATE_CROSS_BATCH' AS flag_code,
+                'warning' AS severity,
+                'Potential duplicate of ' || h.{id_col} || ' in batch ' || h.batch_id || ': same vendor, date, and amount.' AS message,
+                f.vendor_canonical, f.vendor_id, f.date, f.amount_cents, f.source_file, f.source_row_number, f.row_hash,
+                :created AS created_at_utc
+            FROM hits
+            JOIN {table} f ON f.rowid = hits.f_row
+            JOIN {table} h ON h.rowid = hits.h_row
+            ORDER BY f.rowid;
+            """,
+            conn,
+            params={"b": batch_id, "loaded": loaded_at, "rtype": rtype, "created": created_at},
+        ))
+    return pd.concat(frames, ignore_index=True)
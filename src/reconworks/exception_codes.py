@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+import hashlib
+from typing import List
+
+from .util import sha256_text
+
+QA_ACTION = "Review and correct source data or mapping/normalization rules."
+UNMATCHED_TX_MESSAGE = "No matching vendor payment found."
+UNMATCHED_TX_ACTION = "Investigate: missing payment, timing difference, amount mismatch, or vendor normalization gap."
+UNMATCHED_PAY_MESSAGE = "No matching transaction found."
+UNMATCHED_PAY_ACTION = "Investigate: missing transaction feed, timing difference, amount mismatch, or vendor normalization gap."
+LOW_CONFIDENCE_ACTION = "Review candidate details; confirm or adjust matching thresholds/rules."
+
+def mk_exception_id(batch_id: str, record_type: str, record_id: str, code: str, related: str = "") -> str:
+    return sha256_text(f"{batch_id}|{record_type}|{record_id}|{code}|{related}")
+
+def exception_ids(batch_id: str, record_types, record_ids, codes, related=None) -> List[str]:
+    """Batched ``mk_exception_id``: one id per position of the given sequences (or scalars)."""
+    n = len(record_ids)
+    def seq(v):
+        return [v] * n if isinstance(v, str) else list(v)
+    related = [""] * n if related is None else seq(related)
+    return [
+        hashlib.sha256(f"{batch_id}|{t}|{r}|{c}|{x}".encode("utf-8")).hexdigest()
+        for t, r, c, x in zip(seq(record_types), record_ids, seq(codes), related)
+    ]
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import Dict
+
+import pandas as pd
+
+from .db import create_exception_lifecycle_table, create_open_items_table, delete_where_batch
+
+STAGE_TABLE = "_exceptions_stage"
+# Ids folded into a rollup row this run (filled by exception_rollups).
+ABSORBED_TABLE = "_exceptions_absorbed"
+
+# Everything the analyst sees; created_at_utc is left out so re-runs compare equal.
+_CONTENT_COLUMNS = (
+    "record_type", "record_id", "related_record_id", "exception_code", "severity", "message",
+    "recommended_action", "vendor_canonical", "vendor_id", "date", "amount_cents",
+)
+_EXCEPTION_COLUMNS = ("batch_id", "exception_id") + _CONTENT_COLUMNS + ("created_at_utc",)
+
+# Ledger record_type -> (exception record_type, unmatched exception_code)
+_LEDGER_CODES = {
+    "txn": ("transactions", "UNMATCHED_TRANSACTION"),
+    "pay": ("vendor_payments", "UNMATCHED_VENDOR_PAYMENT"),
+}
+
+def create_exceptions_stage(conn: sqlite3.Connection) -> None:
+    """Empty temp table shaped like ``exceptions`` for this run's computed rows.
+
+    Column affinities are copied, so both engines stage identical values.
+    """
+    conn.execute(f"DROP TABLE IF EXISTS temp.{STAGE_TABLE};")
+    conn.execute(f"CREATE TEMP TABLE {STAGE_TABLE} AS SELECT * FROM exceptions WHERE 0;")
+    conn.execute(f"DROP TABLE IF EXISTS temp.{ABSORBED_TABLE};")
+    conn.execute(
+        f"CREATE TEMP TABLE {ABSORBED_TABLE} ("
+        " exception_id TEXT, batch_id TEXT, record_type TEXT, record_id TEXT, exception_code TEXT);"
+    )
+
+def stage_exceptions(conn: sqlite3.Connection, exc: pd.DataFrame) -> None:
+    """Append a ``build_exceptions`` frame to the stage table."""
+    if exc.empty:
+        return
+    cols = [c for c in _EXCEPTION_COLUMNS if c in exc.columns]
+    values = [[None if pd.isna(v) else v for v in exc[c].tolist()] for c in cols]
+    conn.executemany(
+        f"INSERT INTO {STAGE_TABLE} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))});",
+        list(zip(*values)),
+    )
+
+def _closed_by_sql(alias: str) -> str:
+    """Batch that closed the ledger item behind an unmatched exception row ``alias`` (NULL if still open)."""
+    whens = " ".join(f"WHEN '{code}' THEN '{lt}'" for lt, (_, code) in _LEDGER_CODES.items())
+    return (
+        f"SELECT o.closed_by_batch_id FROM open_items o"
+        f" WHERE o.record_type = (CASE {alias}.exception_code {whens} END)"
+        f" AND o.record_id = {alias}.record_id AND o.batch_id = {alias}.batch_id"
+        f" AND o.closed_by_batch_id IS NOT NULL AND o.closed_by_batch_id <> {alias}.batch_id"
+    )
+
+def drop_ledger_closed(conn: sqlite3.Connection) -> None:
+    """Remove staged unmatched rows whose ledger item another batch already closed."""
+    create_open_items_table(conn)
+    conn.execute(f"DELETE FROM {STAGE_TABLE} WHERE EXISTS ({_closed_by_sql(STAGE_TABLE)});")
+
+def apply_exception_delta(conn: sqlite3.Connection, batch_id: str, now: str) -> Dict[str, int]:
+    """Bring ``exceptions`` and ``exception_lifecycle`` in line with the staged rows, writing only the delta.
+
+    Staged ids are classified against the lifecycle store as new, reopened,
+    updated (content differs from the current ``exceptions`` row) or unchanged; open ids of the batch that
+    were not staged are resolved, as are unmatched exceptions of other batches
+    whose record the open-items ledger closed in this batch. Ledger closures
+    are sticky: a re-run of the record's own batch still sees it unmatched in
+    its own matches, so such rows are dropped from the stage first and the
+    exception stays resolved by the closing batch. Ids folded into a rollup
+    stay open: new or reopened as usual, ``absorbed`` when their individual
+    row leaves ``exceptions`` for the rollup row, else unchanged. Only new,
+    reopened and updated staged rows are (re)inserted into ``exceptions``;
+    resolved and absorbed ones are removed. Unchanged rows only get ``last_seen_utc`` bumped. The per-run
+    delta stays in temp table ``_exceptions_delta`` for ``exception_delta_frame``.
+    """
+    create_exception_lifecycle_table(conn)
+
+    tracked = conn.execute("SELECT 1 FROM exception_lifecycle WHERE batch_id = ? LIMIT 1;", (batch_id,)).fetchone()
+    if tracked is None:
+        # First tracked run for the batch: drop rows left by a full rewrite.
+        delete_where_batch(conn, "exceptions", batch_id)
+
+    drop_ledger_closed(conn)
+
+    conn.execute(f"CREATE INDEX IF NOT EXISTS temp.idx_{STAGE_TABLE}_id ON {STAGE_TABLE}(exception_id);")
+    conn.execute("DROP TABLE IF EXISTS temp._exceptions_delta;")
+    conn.execute(
+        "CREATE TEMP TABLE _exceptions_delta ("
+        " exception_id TEXT PRIMARY KEY, change TEXT,"
+        " batch_id TEXT, record_type TEXT, record_id TEXT, exception_code TEXT, resolved_by TEXT);"
+    )
+    params = {"b": batch_id, "now": now}
+    changed = " OR ".join(f"e.{c} IS NOT s.{c}" for c in _CONTENT_COLUMNS)
+    # Duplicate ids keep their first staged row.
+    conn.execute(
+        f"""
+        INSERT OR IGNORE INTO _exceptions_delta
+        SELECT s.exception_id,
+               CASE WHEN l.exception_id IS NULL THEN 'new'
+                    WHEN l.resolved_at_utc IS NOT NULL THEN 'reopened'
+                    WHEN e.rowid IS NULL OR {changed} THEN 'updated'
+                    ELSE 'unchanged' END,
+               s.batch_id, s.record_type, s.record_id, s.exception_code, NULL
+        FROM {STAGE_TABLE} s
+        LEFT JOIN exception_lifecycle l ON l.exception_id = s.exception_id
+        LEFT JOIN exceptions e ON e.rowid = (SELECT MIN(x.rowid) FROM exceptions x WHERE x.exception_id = s.exception_id)
+        ORDER BY s.rowid;
+        """
+    )
+    conn.execute(
+        f"""
+        INSERT OR IGNORE INTO _exceptions_delta
+        SELECT a.exception_id,
+               CASE WHEN l.exception_id IS NULL THEN 'new'
+                    WHEN l.resolved_at_utc IS NOT NULL THEN 'reopened'
+                    WHEN EXISTS (SELECT 1 FROM exceptions x WHERE x.exception_id = a.exception_id) THEN 'absorbed'
+                    ELSE 'unchanged' END,
+               a.batch_id, a.record_type, a.record_id, a.exception_code, NULL
+        FROM {ABSORBED_TABLE} a
+        LEFT JOIN exception_lifecycle l ON l.exception_id = a.exception_id
+        ORDER BY a.rowid;
+        """
+    )
+    conn.execute(
+        f"""
+        INSERT OR IGNORE INTO _exceptions_delta
+        SELECT l.exception_id, 'resolved', l.batch_id, l.record_type, l.record_id, l.exception_code,
+               COALESCE(({_closed_by_sql("l")}), :b)
+        FROM exception_lifecycle l
+        WHERE l.batch_id = :b AND l.resolved_at_utc IS NULL
+          AND NOT EXISTS (SELECT 1 FROM {STAGE_TABLE} s WHERE s.exception_id = l.exception_id);
+        """,
+        params,
+    )
+    for ledger_type, (record_type, code) in _LEDGER_CODES.items():
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO _exceptions_delta
+            SELECT l.exception_id, 'resolved', l.batch_id, l.record_type, l.record_id, l.exception_code, :b
+            FROM open_items o
+            JOIN exception_lifecycle l ON l.record_type = :rtype AND l.record_id = o.record_id
+            WHERE o.record_type = :ltype AND o.closed_by_batch_id = :b AND o.batch_id <> :b
+              AND l.exception_code = :code AND l.resolved_at_utc IS NULL;
+            """,
+            {**params, "rtype": record_type, "ltype": ledger_type, "code": code},
+        )
+
+    conn.execute(
+        "DELETE FROM exceptions WHERE exception_id IN"
+        " (SELECT exception_id FROM _exceptions_delta WHERE change <> 'unchanged');"
+    )
+    cols = ", ".join(_EXCEPTION_COLUMNS)
+    conn.execute(
+        f"INSERT INTO exceptions ({cols}) SELECT {cols} FROM {STAGE_TABLE} s"
+        " WHERE s.exception_id IN (SELECT exception_id FROM _exceptions_delta WHERE change IN ('new', 'reopened', 'updated'))"
+        " ORDER BY s.rowid;"
+    )
+    conn.execute(
+        """
+        INSERT INTO exception_lifecycle (
+            exception_id, batch_id, record_type, record_id, exception_code,
+            first_seen_utc, last_seen_utc, resolved_at_utc, resolved_by_batch_id, last_change, changed_at_utc
+        )
+        SELECT exception_id, batch_id, record_type, record_id, exception_code,
+               :now, :now, NULL, NULL, change, :now
+        FROM _exceptions_delta WHERE change <> 'resolved'
+        ON CONFLICT (exception_id) DO UPDATE SET
+            last_seen_utc = excluded.last_seen_utc,
+            resolved_at_utc = NULL,
+            resolved_by_batch_id = NULL,
+            last_change = CASE WHEN excluded.last_change = 'unchanged' THEN last_change ELSE excluded.last_change END,
+            changed_at_utc = CASE WHEN excluded.last_change = 'unchanged' THEN changed_at_utc ELSE excluded.changed_at_utc END;
+        """,
+        params,
+    )
+    conn.execute(
+        "UPDATE exception_lifecycle SET resolved_at_utc = :now,"
+        " resolved_by_batch_id = (SELECT d.resolved_by FROM _exceptions_delta d WHERE d.exception_id = exception_lifecycle.exception_id),"
+        " last_change = 'resolved', changed_at_utc = :now"
+        " WHERE exception_id IN (SELECT exception_id FROM _exceptions_delta WHERE change = 'resolved');",
+        params,
+    )
+    conn.commit()
+
+    counts = dict(conn.execute("SELECT change, COUNT(*) FROM _exceptions_delta GROUP BY change;").fetchall())
+    return {f"exceptions_{k}": int(counts.get(k, 0)) for k in ("new", "updated", "reopened", "absorbed", "resolved", "unchanged")}
+
+def exception_delta_frame(conn: sqlite3.Connection) -> pd.DataFrame:
+    """This run's changes (not the unchanged rows): lifecycle columns plus the current exception row, if any."""
+    return pd.read_sql_query(
+        """
+        SELECT d.change, l.exception_id, l.batch_id, l.record_type, l.record_id, l.exception_code,
+               e.related_record_id, e.severity, e.message, e.recommended_action,
+               e.vendor_canonical, e.vendor_id, e.date, e.amount_cents,
+               l.first_seen_utc, l.last_seen_utc, l.resolved_at_utc, l.resolved_by_batch_id
+        FROM _exceptions_delta d
+        JOIN exception_lifecycle l ON l.exception_id = d.exception_id
+        LEFT JOIN exceptions e ON e.exception_id = d.exception_id
+        WHERE d.change <> 'unchanged'
+        ORDER BY d.rowid;
+        """,
+        conn,
+    )
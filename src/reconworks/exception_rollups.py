@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import Dict, List, Mapping
+
+import pandas as pd
+
+from .db import create_exception_rollups_table, delete_where_batch
+from .exception_codes import mk_exception_id
+from .exception_lifecycle import ABSORBED_TABLE, STAGE_TABLE
+from .sql_exceptions import insert_exceptions_sql
+
+ROLLUP_RECORD_TYPE = "rollup"
+
+def codes_to_roll_up(conn: sqlite3.Connection, batch_id: str, threshold: int, code_thresholds: Mapping[str, int]) -> List[str]:
+    """Staged exception codes whose row count is above their threshold (0 = never roll up)."""
+    counts = conn.execute(
+        f"SELECT exception_code, COUNT(*) FROM {STAGE_TABLE} WHERE batch_id = ? GROUP BY exception_code ORDER BY exception_code;",
+        (batch_id,),
+    ).fetchall()
+    out = []
+    for code, n in counts:
+        limit = int(code_thresholds.get(code, threshold))
+        if limit > 0 and n > limit:
+            out.append(code)
+    return out
+
+def rollup_exceptions(
+    conn: sqlite3.Connection,
+    batch_id: str,
+    threshold: int,
+    code_thresholds: Mapping[str, int],
+    created_at: str,
+) -> Dict[str, int]:
+    """Replace the staged rows of high-volume codes with one summary row per severity.
+
+    Thresholds apply to the code's total count; count, amount sum, vendor
+    spread and date range per rolled-up (code, severity) go to
+    ``exception_rollups`` and the stage keeps a single ``record_type = 'rollup'``
+    row for each (amount_cents = the sum) so exports and the Excel sheet stay
+    small. The folded ids are listed in ``ABSORBED_TABLE`` so lifecycle
+    tracking keeps them open. ``drilldown_exceptions`` rebuilds the individual
+    rows on demand.
+    """
+    create_exception_rollups_table(conn)
+    delete_where_batch(conn, "exception_rollups", batch_id)
+    conn.execute(f"DELETE FROM {ABSORBED_TABLE} WHERE batch_id = ?;", (batch_id,))
+    codes = codes_to_roll_up(conn, batch_id, threshold, code_thresholds)
+    rolled = 0
+    groups = 0
+    for code in codes:
+        severities = [r[0] for r in conn.execute(
+            f"SELECT DISTINCT severity FROM {STAGE_TABLE} WHERE batch_id = ? AND exception_code = ? ORDER BY severity;",
+            (batch_id, code),
+        ).fetchall()]
+        for severity in severities:
+            params = (batch_id, code, severity)
+            where = "batch_id = ?1 AND exception_code = ?2 AND severity IS ?3"
+            n, amount, vendors, date_min, date_max, record_types = conn.execute(
+                f"SELECT COUNT(*), SUM(amount_cents), COUNT(DISTINCT vendor_id), MIN(date), MAX(date),"
+                f" (SELECT GROUP_CONCAT(record_type, ',') FROM (SELECT DISTINCT record_type FROM {STAGE_TABLE}"
+                f"  WHERE {where} ORDER BY record_type))"
+                f" FROM {STAGE_TABLE} WHERE {where};",
+                params,
+            ).fetchone()
+            message, action = conn.execute(
+                f"SELECT message, recommended_action FROM {STAGE_TABLE} WHERE {where} ORDER BY rowid LIMIT 1;",
+                params,
+            ).fetchone()
+            top = conn.execute(
+                f"SELECT vendor_canonical, COUNT(*) FROM {STAGE_TABLE}"
+                f" WHERE {where} AND vendor_canonical IS NOT NULL"
+                " GROUP BY vendor_canonical ORDER BY COUNT(*) DESC, vendor_canonical LIMIT 1;",
+                params,
+            ).fetchone() or (None, None)
+            conn.execute(
+                "INSERT INTO exception_rollups (batch_id, exception_code, record_types, severity, exception_count,"
+                " amount_cents_sum, vendor_count, top_vendor_canonical, top_vendor_count, date_min, date_max,"
+                " sample_message, created_at_utc) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
+                (batch_id, code, record_types, severity, n, amount, vendors, top[0], top[1], date_min, date_max, message, created_at),
+            )
+            conn.execute(
+                f"INSERT INTO {ABSORBED_TABLE} (exception_id, batch_id, record_type, record_id, exception_code)"
+                f" SELECT exception_id, batch_id, record_type, record_id, exception_code FROM {STAGE_TABLE}"
+                f" WHERE {where} ORDER BY rowid;",
+                params,
+            )
+            conn.execute(f"DELETE FROM {STAGE_TABLE} WHERE {where};", params)
+            span = f", {date_min} to {date_max}" if date_min else ""
+            conn.execute(
+                f"INSERT INTO {STAGE_TABLE} (batch_id, exception_id, record_type, record_id, related_record_id, exception_code,"
+                " severity, message, recommended_action, vendor_canonical, vendor_id, date, amount_cents, created_at_utc)"
+                " VALUES (?, ?, ?, ?, '', ?, ?, ?, ?, NULL, NULL, NULL, ?, ?);",
+                (
+                    # The severity goes into the id so each (code, severity) rollup row is distinct.
+                    batch_id, mk_exception_id(batch_id, ROLLUP_RECORD_TYPE, code, code, severity or ""),
+                    ROLLUP_RECORD_TYPE, code, code, severity,
+                    f"{n} {code} {severity} exceptions rolled up ({vendors} vendors{span}); drill down by code for the records.",
+                    action, amount, created_at,
+                ),
+            )
+            rolled += n
+            groups += 1
+    conn.commit()
+    return {"exceptions_rolled_up": int(rolled), "exception_rollups": groups}
+
+def drilldown_exceptions(conn: sqlite3.Connection, batch_id: str, code: str, low_conf_threshold: float, created_at: str) -> pd.DataFrame:
+    """The individual exception rows behind one code, rebuilt from the batch's source tables."""
+    conn.execute("DROP TABLE IF EXISTS temp._exceptions_drilldown;")
+    conn.execute("CREATE TEMP TABLE _exceptions_drilldown AS SELECT * FROM exceptions WHERE 0;")
+    insert_exceptions_sql(conn, batch_id, low_conf_threshold, created_at, table="_exceptions_drilldown", code=code)
+    return pd.read_sql_query("SELECT * FROM _exceptions_drilldown ORDER BY rowid;", conn)
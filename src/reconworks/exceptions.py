@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Set
 
 import pandas as pd
 
@@ -11,13 +11,67 @@ from .db import (
     latest_batch_id,
     create_exceptions_runs_table,
     create_exceptions_table,
+    create_exception_rollups_table,
     insert_exception_run,
     delete_where_batch,
 )
-from .util import utc_now_iso, sha256_text, ensure_dir
+from .exception_codes import (
+    LOW_CONFIDENCE_ACTION,
+    QA_ACTION,
+    UNMATCHED_PAY_ACTION,
+    UNMATCHED_PAY_MESSAGE,
+    UNMATCHED_TX_ACTION,
+    UNMATCHED_TX_MESSAGE,
+    exception_ids,
+)
+from .exception_rollups import drilldown_exceptions, rollup_exceptions
+from .exception_lifecycle import (
+    STAGE_TABLE,
+    apply_exception_delta,
+    create_exceptions_stage,
+    exception_delta_frame,
+    stage_exceptions,
+)
+from .open_items import closed_elsewhere
+from .report_marts import mark_reports_stale
+from .sql_exceptions import insert_exceptions_sql
+from .util import utc_now_iso, ensure_dir
+
+_RECORD_COLUMNS = ("vendor_canonical", "vendor_id", "date", "amount_cents")
+
+def _text(df: pd.DataFrame, name: str, default: str) -> List[str]:
+    # str(value or default), as the per-row code did: None and "" fall back, NaN does not.
+    values = df[name].tolist() if name in df.columns else [None] * len(df)
+    return [str(v or default) for v in values]
 
-def _mk_exception_id(batch_id: str, record_type: str, record_id: str, code: str, related: str = "") -> str:
-    return sha256_text(f"{batch_id}|{record_type}|{record_id}|{code}|{related}")
+def _column(df: pd.DataFrame, name: str):
+    return df[name].to_numpy(dtype=object) if name in df.columns else None
+
+def _exception_frame(
+    batch_id: str,
+    record_type,
+    record_ids: List[str],
+    codes,
+    severity,
+    message,
+    action: str,
+    source: Optional[pd.DataFrame],
+    created_at: str,
+    related: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    return pd.DataFrame({
+        "batch_id": batch_id,
+        "exception_id": exception_ids(batch_id, record_type, record_ids, codes, related),
+        "record_type": record_type,
+        "record_id": record_ids,
+        "related_record_id": "" if related is None else related,
+        "exception_code": codes,
+        "severity": severity,
+        "message": message,
+        "recommended_action": action,
+        **{c: (None if source is None else _column(source, c)) for c in _RECORD_COLUMNS},
+        "created_at_utc": created_at,
+    }, index=pd.RangeIndex(len(record_ids)))
 
 def build_exceptions(
     batch_id: str,
@@ -26,111 +80,69 @@ def build_exceptions(
     fact_vendor_payments: pd.DataFrame,
     matches: pd.DataFrame,
     low_conf_threshold: float,
+    ledger_closed_txn: Optional[Set[str]] = None,
+    ledger_closed_pay: Optional[Set[str]] = None,
 ) -> pd.DataFrame:
     created_at = utc_now_iso()
-    rows = []
+    frames: List[pd.DataFrame] = []
 
     # 1) QA flags -> exceptions
     if qa_flags is not None and not qa_flags.empty:
-        for _, r in qa_flags.iterrows():
-            rid = str(r.get("record_id") or "")
-            rtype = str(r.get("record_type") or "")
-            code = str(r.get("flag_code") or "QA_FLAG")
-            exid = _mk_exception_id(batch_id, rtype, rid, code, "")
-            rows.append({
-                "batch_id": batch_id,
-                "exception_id": exid,
-                "record_type": rtype,
-                "record_id": rid,
-                "related_record_id": "",
-                "exception_code": code,
-                "severity": str(r.get("severity") or "warning"),
-                "message": str(r.get("message") or ""),
-                "recommended_action": "Review and correct source data or mapping/normalization rules.",
-                "vendor_canonical": r.get("vendor_canonical"),
-                "vendor_id": r.get("vendor_id"),
-                "date": r.get("date"),
-                "amount_cents": r.get("amount_cents"),
-                "created_at_utc": created_at,
-            })
+        frames.append(_exception_frame(
+            batch_id,
+            record_type=_text(qa_flags, "record_type", ""),
+            record_ids=_text(qa_flags, "record_id", ""),
+            codes=_text(qa_flags, "flag_code", "QA_FLAG"),
+            severity=_text(qa_flags, "severity", "warning"),
+            message=_text(qa_flags, "message", ""),
+            action=QA_ACTION,
+            source=qa_flags,
+            created_at=created_at,
+        ))
 
     matched_txn = set(matches["txn_id"].tolist()) if matches is not None and not matches.empty else set()
     matched_pay = set(matches["pay_id"].tolist()) if matches is not None and not matches.empty else set()
+    # Records another batch matched through the open-items ledger; that match is stored under the other batch.
+    matched_txn |= set(ledger_closed_txn or ())
+    matched_pay |= set(ledger_closed_pay or ())
 
     # 2) Unmatched transaction facts
     if fact_transactions is not None and not fact_transactions.empty:
-        um_tx = fact_transactions[~fact_transactions["txn_id"].isin(matched_txn)].copy()
-        for _, r in um_tx.iterrows():
-            rid = str(r["txn_id"])
-            code = "UNMATCHED_TRANSACTION"
-            exid = _mk_exception_id(batch_id, "transactions", rid, code, "")
-            rows.append({
-                "batch_id": batch_id,
-                "exception_id": exid,
-                "record_type": "transactions",
-                "record_id": rid,
-                "related_record_id": "",
-                "exception_code": code,
-                "severity": "warning",
-                "message": "No matching vendor payment found.",
-                "recommended_action": "Investigate: missing payment, timing difference, amount mismatch, or vendor normalization gap.",
-                "vendor_canonical": r.get("vendor_canonical"),
-                "vendor_id": r.get("vendor_id"),
-                "date": r.get("date"),
-                "amount_cents": r.get("amount_cents"),
-                "created_at_utc": created_at,
-            })
+        um_tx = fact_transactions[~fact_transactions["txn_id"].isin(matched_txn)]
+        if not um_tx.empty:
+            frames.append(_exception_frame(
+                batch_id, "transactions", [str(v) for v in um_tx["txn_id"].tolist()], "UNMATCHED_TRANSACTION", "warning",
+                UNMATCHED_TX_MESSAGE, UNMATCHED_TX_ACTION,
+                um_tx, created_at,
+            ))
 
     # 3) Unmatched payments
     if fact_vendor_payments is not None and not fact_vendor_payments.empty:
-        um_pay = fact_vendor_payments[~fact_vendor_payments["pay_id"].isin(matched_pay)].copy()
-        for _, r in um_pay.iterrows():
-            rid = str(r["pay_id"])
-            code = "UNMATCHED_VENDOR_PAYMENT"
-            exid = _mk_exception_id(batch_id, "vendor_payments", rid, code, "")
-            rows.append({
-                "batch_id": batch_id,
-                "exception_id": exid,
-                "record_type": "vendor_payments",
-                "record_id": rid,
-                "related_record_id": "",
-                "exception_code": code,
-                "severity": "warning",
-                "message": "No matching transaction found.",
-                "recommended_action": "Investigate: missing transaction feed, timing difference, amount mismatch, or vendor normalization gap.",
-                "vendor_canonical": r.get("vendor_canonical"),
-                "vendor_id": r.get("vendor_id"),
-                "date": r.get("date"),
-                "amount_cents": r.get("amount_cents"),
-                "created_at_utc": created_at,
-            })
+        um_pay = fact_vendor_payments[~fact_vendor_payments["pay_id"].isin(matched_pay)]
+        if not um_pay.empty:
+            frames.append(_exception_frame(
+                batch_id, "vendor_payments", [str(v) for v in um_pay["pay_id"].tolist()], "UNMATCHED_VENDOR_PAYMENT", "warning",
+                UNMATCHED_PAY_MESSAGE, UNMATCHED_PAY_ACTION,
+                um_pay, created_at,
+            ))
 
     # 4) Low-confidence matches
     if matches is not None and not matches.empty:
-        low = matches[matches["match_score"].astype(float) < float(low_conf_threshold)].copy()
-        for _, r in low.iterrows():
-            rid = str(r["txn_id"])
-            related = str(r["pay_id"])
-            code = "LOW_CONFIDENCE_MATCH"
-            exid = _mk_exception_id(batch_id, "transactions", rid, code, related)
-            rows.append({
-                "batch_id": batch_id,
-                "exception_id": exid,
-                "record_type": "transactions",
-                "record_id": rid,
-                "related_record_id": related,
-                "exception_code": code,
-                "severity": "warning",
-                "message": f"Matched but low confidence (score={float(r['match_score']):.3f}).",
-                "recommended_action": "Review candidate details; confirm or adjust matching thresholds/rules.",
-                "vendor_canonical": None,
-                "vendor_id": None,
-                "date": None,
-                "amount_cents": None,
-                "created_at_utc": created_at,
-            })
-
-    return pd.DataFrame(rows)
+        scores = matches["match_score"].astype(float)
+        low = matches[scores < float(low_conf_threshold)]
+        if not low.empty:
+            frames.append(_exception_frame(
+                batch_id, "transactions", [str(v) for v in low["txn_id"].tolist()], "LOW_CONFIDENCE_MATCH", "warning",
+                [f"Matched but low confidence (score={v:.3f})." for v in scores[low.index].tolist()],
+                LOW_CONFIDENCE_ACTION,
+                None, created_at, related=[str(v) for v in low["pay_id"].tolist()],
+            ))
+
+    if not frames:
+        return pd.DataFrame()
+    # The low-confidence frame has no vendor/date/amount values, so those columns concat as object;
+    # infer_objects gives them concrete dtypes again before to_sql.
+    return pd.concat(frames, ignore_index=True).infer_objects()
 
 def exceptions_all(repo_root: Path, cfg: ProjectConfig, batch_id: Optional[str] = None, export_csv: bool = False) -> Dict[str, int]:
     out_dir = repo_root / cfg.output_dir
@@ -146,34 +158,90 @@ def exceptions_all(repo_root: Path, cfg: ProjectConfig, batch_id: Optional[str]
         conn.close()
         return {"exceptions": 0}
 
-    qa = pd.read_sql_query("SELECT * FROM qa_flags WHERE batch_id=?", conn, params=(b,))
-    ft = pd.read_sql_query("SELECT * FROM fact_transactions WHERE batch_id=?", conn, params=(b,))
-    fp = pd.read_sql_query("SELECT * FROM fact_vendor_payments WHERE batch_id=?", conn, params=(b,))
-    matches = pd.read_sql_query("SELECT * FROM matches WHERE batch_id=?", conn, params=(b,))
-
-    exc = build_exceptions(
-        batch_id=b,
-        qa_flags=qa,
-        fact_transactions=ft,
-        fact_vendor_payments=fp,
-        matches=matches,
-        low_conf_threshold=cfg.matching.low_confidence_threshold,
-    )
-
-    delete_where_batch(conn, "exceptions", b)
+    engine = cfg.exceptions.engine
+    if engine not in ("pandas", "sql"):
+        conn.close()
+        raise ValueError(f"Unknown exceptions engine: {engine!r} (expected 'pandas' or 'sql')")
+
+    # Lifecycle tracking and rollups work on a temp stage of the run's rows before anything is written.
+    ecfg = cfg.exceptions
+    rollups = ecfg.rollup_threshold > 0 or any(v > 0 for v in ecfg.rollup_thresholds.values())
+    staged = ecfg.lifecycle or rollups
+    target = STAGE_TABLE if staged else "exceptions"
+    if staged:
+        create_exceptions_stage(conn)
+    if not ecfg.lifecycle:
+        delete_where_batch(conn, "exceptions", b)
     delete_where_batch(conn, "exception_runs", b)
 
-    if not exc.empty:
-        exc.to_sql("exceptions", conn, if_exists="append", index=False)
-
+    now = utc_now_iso()
+    if engine == "sql":
+        count = insert_exceptions_sql(conn, b, cfg.matching.low_confidence_threshold, now, table=target)
+        exc = None
+    else:
+        # rowid order keeps the output independent of which index the planner picks.
+        qa = pd.read_sql_query("SELECT * FROM qa_flags WHERE batch_id=? ORDER BY rowid", conn, params=(b,))
+        ft = pd.read_sql_query("SELECT * FROM fact_transactions WHERE batch_id=? ORDER BY rowid", conn, params=(b,))
+        fp = pd.read_sql_query("SELECT * FROM fact_vendor_payments WHERE batch_id=? ORDER BY rowid", conn, params=(b,))
+        matches = pd.read_sql_query("SELECT * FROM matches WHERE batch_id=? ORDER BY rowid", conn, params=(b,))
+
+        exc = build_exceptions(
+            batch_id=b,
+            qa_flags=qa,
+            fact_transactions=ft,
+            fact_vendor_payments=fp,
+            matches=matches,
+            low_conf_threshold=cfg.matching.low_confidence_threshold,
+            ledger_closed_txn=closed_elsewhere(conn, "txn", b),
+            ledger_closed_pay=closed_elsewhere(conn, "pay", b),
+        )
+        if staged:
+            stage_exceptions(conn, exc)
+        elif not exc.empty:
+            exc.to_sql("exceptions", conn, if_exists="append", index=False)
+        count = int(len(exc))
+
+    summary = {"exceptions": count}
+    if rollups:
+        summary.update(rollup_exceptions(conn, b, ecfg.rollup_threshold, ecfg.rollup_thresholds, now))
+        exc = None
+    else:
+        create_exception_rollups_table(conn)
+        delete_where_batch(conn, "exception_rollups", b)
+    if ecfg.lifecycle:
+        summary.update(apply_exception_delta(conn, b, now))
+    elif staged:
+        conn.execute(f"INSERT INTO exceptions SELECT * FROM {STAGE_TABLE} ORDER BY rowid;")
+        conn.commit()
+
+    mark_reports_stale(conn, b, "exceptions")
     insert_exception_run(conn, {
         "created_at_utc": utc_now_iso(),
         "batch_id": b,
-        "exception_count": int(len(exc)),
+        "exception_count": count,
     })
 
     if export_csv:
+        if exc is None:
+            exc = pd.read_sql_query(f"SELECT * FROM {target} WHERE batch_id=? ORDER BY rowid", conn, params=(b,))
         exc.to_csv(out_dir / "csv" / "exceptions.csv", index=False)
+        if rollups:
+            pd.read_sql_query("SELECT * FROM exception_rollups WHERE batch_id=?", conn, params=(b,)).to_csv(
+                out_dir / "csv" / "exception_rollups.csv", index=False)
+        if ecfg.lifecycle:
+            exception_delta_frame(conn).to_csv(out_dir / "csv" / "exceptions_delta.csv", index=False)
+
+    conn.close()
+    return summary
 
+def exception_drilldown(repo_root: Path, cfg: ProjectConfig, code: str, batch_id: Optional[str] = None) -> pd.DataFrame:
+    """Individual rows behind a rolled-up exception code (or any code), rebuilt on demand."""
+    conn = connect(repo_root / cfg.database_path)
+    create_exceptions_table(conn)
+    b = batch_id or latest_batch_id(conn)
+    if not b:
+        conn.close()
+        return pd.DataFrame()
+    rows = drilldown_exceptions(conn, b, code, cfg.matching.low_confidence_threshold, utc_now_iso())
     conn.close()
-    return {"exceptions": int(len(exc))}
+    return rows
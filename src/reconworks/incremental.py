@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from .config import ProjectConfig
+from .db import (
+    connect,
+    latest_batch_id,
+    create_fact_range_indexes,
+    create_match_candidates_table,
+    create_match_candidate_summary_table,
+    create_match_inputs_table,
+    create_match_lookup_indexes,
+    create_matches_table,
+    create_matching_runs_table,
+    insert_matching_run,
+)
+from .report_marts import mark_reports_stale
+from .util import utc_now_iso
+
+# record_type -> (fact table, id column)
+_FACTS: Dict[str, Tuple[str, str]] = {
+    "txn": ("fact_transactions", "txn_id"),
+    "pay": ("fact_vendor_payments", "pay_id"),
+}
+_INPUT_COLUMNS = ("vendor_id", "vendor_canonical", "date", "amount_cents")
+
+def snapshot_inputs(conn: sqlite3.Connection, batch_id: str, record_type: Optional[str] = None,
+                    ids: Optional[Iterable[str]] = None) -> None:
+    """Record the matching inputs of a batch (or of ``ids`` only) in ``match_inputs``."""
+    create_match_inputs_table(conn)
+    cols = ", ".join(_INPUT_COLUMNS)
+    for rtype, (table, id_col) in _FACTS.items():
+        if record_type is not None and rtype != record_type:
+            continue
+        if ids is None:
+            conn.execute("DELETE FROM match_inputs WHERE batch_id = ? AND record_type = ?;", (batch_id, rtype))
+            conn.execute(
+                f"INSERT INTO match_inputs (record_type, record_id, batch_id, {cols})"
+                f" SELECT ?, {id_col}, batch_id, {cols} FROM {table} WHERE batch_id = ?;",
+                (rtype, batch_id),
+            )
+            continue
+        _load_ids(conn, ids)
+        conn.execute(
+            "DELETE FROM match_inputs WHERE record_type = ? AND record_id IN (SELECT record_id FROM _rematch_ids);",
+            (rtype,),
+        )
+        conn.execute(
+            f"INSERT INTO match_inputs (record_type, record_id, batch_id, {cols})"
+            f" SELECT ?, {id_col}, batch_id, {cols} FROM {table}"
+            f" WHERE batch_id = ? AND {id_col} IN (SELECT record_id FROM _rematch_ids);",
+            (rtype, batch_id),
+        )
+    conn.commit()
+
+def _load_ids(conn: sqlite3.Connection, ids: Iterable[str]) -> None:
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _rematch_ids (record_id TEXT PRIMARY KEY);")
+    conn.execute("DELETE FROM _rematch_ids;")
+    conn.executemany("INSERT OR IGNORE INTO _rematch_ids VALUES (?);", [(str(x),) for x in ids])
+
+def changed_records(conn: sqlite3.Connection, batch_id: str, record_type: str) -> Tuple[List[str], List[str]]:
+    """(added or changed ids, deleted ids) of one side since the last snapshot."""
+    table, id_col = _FACTS[record_type]
+    differs = " OR ".join(f"s.{c} IS NOT f.{c}" for c in _INPUT_COLUMNS)
+    changed = conn.execute(
+        f"SELECT f.{id_col} FROM {table} f LEFT JOIN match_inputs s"
+        f" ON s.record_type = ? AND s.record_id = f.{id_col}"
+        f" WHERE f.batch_id = ? AND (s.record_id IS NULL OR {differs}) ORDER BY f.rowid;",
+        (record_type, batch_id),
+    ).fetchall()
+    deleted = conn.execute(
+        f"SELECT s.record_id FROM match_inputs s WHERE s.record_type = ? AND s.batch_id = ?"
+        f" AND NOT EXISTS (SELECT 1 FROM {table} f WHERE f.{id_col} = s.record_id AND f.batch_id = s.batch_id);",
+        (record_type, batch_id),
+    ).fetchall()
+    return [r[0] for r in changed], [r[0] for r in deleted]
+
+def _keys(conn: sqlite3.Connection, record_type: str, batch_id: str, ids: Iterable[str], from_snapshot: bool = False) -> List[tuple]:
+    """Distinct (amount_cents, date) keys of records, from the facts or from the snapshot."""
+    ids = list(ids)
+    if not ids:
+        return []
+    _load_ids(conn, ids)
+    # CROSS JOIN keeps the id list as the outer loop, so each id is a primary-key probe.
+    if from_snapshot:
+        sql = ("SELECT DISTINCT s.amount_cents, s.date FROM _rematch_ids r CROSS JOIN match_inputs s"
+               " ON s.record_type = ? AND s.record_id = r.record_id WHERE s.batch_id = ?")
+        params: tuple = (record_type, batch_id)
+    else:
+        table, id_col = _FACTS[record_type]
+        sql = (f"SELECT DISTINCT f.amount_cents, f.date FROM _rematch_ids r CROSS JOIN {table} f"
+               f" ON f.{id_col} = r.record_id WHERE f.batch_id = ?")
+        params = (batch_id,)
+    return [r for r in conn.execute(sql, params).fetchall() if r[0] is not None and r[1] is not None]
+
+def neighbours(conn: sqlite3.Connection, record_type: str, batch_id: str, keys: List[tuple],
+               date_window_days: int, amount_tolerance_cents: int) -> Set[str]:
+    """Ids of ``record_type`` facts within the blocking window of any (amount_cents, date) key."""
+    if not keys or amount_tolerance_cents < 0:
+        return set()
+    table, id_col = _FACTS[record_type]
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _rematch_keys (amount_cents INTEGER, date TEXT);")
+    conn.execute("DELETE FROM _rematch_keys;")
+    conn.executemany("INSERT INTO _rematch_keys VALUES (?, ?);", [(int(a), str(d)) for a, d in keys])
+    w = int(date_window_days)
+    date_clause = ""
+    params: list = [batch_id, int(amount_tolerance_cents), int(amount_tolerance_cents)]
+    if w > 0:
+        date_clause = " AND f.date BETWEEN date(k.date, ?) AND date(k.date, ?)"
+        params += [f"-{w} days", f"+{w} days"]
+    rows = conn.execute(
+        f"SELECT DISTINCT f.{id_col} FROM _rematch_keys k JOIN {table} f ON f.batch_id = ?"
+        f" AND f.amount_cents BETWEEN k.amount_cents - ? AND k.amount_cents + ?{date_clause};",
+        params,
+    ).fetchall()
+    return {r[0] for r in rows}
+
+def _partners(conn: sqlite3.Connection, batch_id: str, txn_ids: Set[str], pay_ids: Set[str]) -> Tuple[Set[str], Set[str]]:
+    """Current match partners of the given records."""
+    out_t: Set[str] = set()
+    out_p: Set[str] = set()
+    for col, ids, other, out in (("txn_id", txn_ids, "pay_id", out_p), ("pay_id", pay_ids, "txn_id", out_t)):
+        if not ids:
+            continue
+        _load_ids(conn, ids)
+        rows = conn.execute(
+            f"SELECT m.{other} FROM _rematch_ids r CROSS JOIN matches m ON m.batch_id = ? AND m.{col} = r.record_id;",
+            (batch_id,),
+        ).fetchall()
+        out.update(r[0] for r in rows)
+    return out_t, out_p
+
+def affected_neighbourhood(
+    conn: sqlite3.Connection,
+    batch_id: str,
+    changed_tx: Set[str],
+    changed_pay: Set[str],
+    deleted_tx: Set[str],
+    deleted_pay: Set[str],
+    date_window_days: int,
+    amount_tolerance_cents: int,
+    hops: int = 2,
+) -> Tuple[Set[str], Set[str]]:
+    """Records whose assignment can change after the given edits.
+
+    Starts from the changed records and the former partners of changed or
+    deleted ones, then ``hops`` times adds the opposite-side records inside the
+    blocking window (of old and new values) and their current match partners.
+    """
+    tx_set = set(changed_tx)
+    pay_set = set(changed_pay)
+    # Former partners of changed or deleted records lose their match.
+    pt, pp = _partners(conn, batch_id, tx_set | deleted_tx, pay_set | deleted_pay)
+    tx_set |= pt
+    pay_set |= pp
+
+    tx_keys = _keys(conn, "txn", batch_id, changed_tx | deleted_tx, from_snapshot=True)
+    pay_keys = _keys(conn, "pay", batch_id, changed_pay | deleted_pay, from_snapshot=True)
+    frontier_tx, frontier_pay = set(tx_set), set(pay_set)
+    for _ in range(max(1, int(hops))):
+        tx_keys = tx_keys + _keys(conn, "txn", batch_id, frontier_tx)
+        pay_keys = pay_keys + _keys(conn, "pay", batch_id, frontier_pay)
+        new_pay = neighbours(conn, "pay", batch_id, tx_keys, date_window_days, amount_tolerance_cents) - pay_set
+        new_tx = neighbours(conn, "txn", batch_id, pay_keys, date_window_days, amount_tolerance_cents) - tx_set
+        pt, pp = _partners(conn, batch_id, new_tx, new_pay)
+        new_tx |= pt - tx_set
+        new_pay |= pp - pay_set
+        tx_set |= new_tx
+        pay_set |= new_pay
+        frontier_tx, frontier_pay = new_tx, new_pay
+        tx_keys, pay_keys = [], []
+        if not frontier_tx and not frontier_pay:
+            break
+    return tx_set - deleted_tx, pay_set - deleted_pay
+
+def _load_facts(conn: sqlite3.Connection, record_type: str, batch_id: str, ids: Set[str]) -> pd.DataFrame:
+    table, id_col = _FACTS[record_type]
+    _load_ids(conn, ids)
+    # rowid order keeps the same tie-breaking as a full run over the batch.
+    return pd.read_sql_query(
+        f"SELECT f.* FROM _rematch_ids r CROSS JOIN {table} f ON f.{id_col} = r.record_id"
+        f" WHERE f.batch_id = ? ORDER BY f.rowid;",
+        conn, params=(batch_id,),
+    )
+
+def _delete_for(conn: sqlite3.Connection, table: str, batch_id: str, col: str, ids: Set[str]) -> None:
+    if ids:
+        _load_ids(conn, ids)
+        conn.execute(f"DELETE FROM {table} WHERE batch_id = ? AND {col} IN (SELECT record_id FROM _rematch_ids);", (batch_id,))
+
+def rematch_incremental(
+    repo_root: Path,
+    cfg: ProjectConfig,
+    batch_id: Optional[str] = None,
+    txn_ids: Optional[Iterable[str]] = None,
+    pay_ids: Optional[Iterable[str]] = None,
+) -> Dict[str, int]:
+    """Re-match only the neighbourhood of added, changed or deleted fact rows.
+
+    Changed rows are detected against the ``match_inputs`` snapshot written by
+    the last ``match`` run, unless ``txn_ids`` / ``pay_ids`` are given. Matches
+    and candidates of the affected records are replaced; all other matches are
+    left untouched. A batch that was never matched gets a full ``match_all``.
+    """
+    from .matching import match_all, match_frames, summarize_candidates
+    from .similarity import VendorSimilarityCache
+
+    mcfg = cfg.matching
+    if mcfg.open_items_ledger:
+        raise ValueError("incremental rematch does not support open_items_ledger; run a full match")
+
+    conn = connect(repo_root / cfg.database_path)
+    for create in (create_match_candidates_table, create_match_candidate_summary_table, create_matches_table,
+                   create_matching_runs_table, create_match_inputs_table):
+        create(conn)
+    b = batch_id or latest_batch_id(conn)
+    if not b:
+        conn.close()
+        return {"matches": 0, "unmatched_transactions": 0, "unmatched_vendor_payments": 0}
+    if conn.execute("SELECT COUNT(1) FROM match_inputs WHERE batch_id = ?;", (b,)).fetchone()[0] == 0:
+        conn.close()
+        return match_all(repo_root, cfg, batch_id=b)
+
+    create_fact_range_indexes(conn)
+    create_match_lookup_indexes(conn)
+
+    if txn_ids is None and pay_ids is None:
+        changed_tx, deleted_tx = changed_records(conn, b, "txn")
+        changed_pay, deleted_pay = changed_records(conn, b, "pay")
+    else:
+        changed_tx, changed_pay = list(txn_ids or []), list(pay_ids or [])
+        deleted_tx, deleted_pay = [], []
+
+    tx_set, pay_set = affected_neighbourhood(
+        conn, b, set(changed_tx), set(changed_pay), set(deleted_tx), set(deleted_pay),
+        mcfg.date_window_days, mcfg.amount_tolerance_cents, hops=mcfg.rematch_hops,
+    )
+    ft = _load_facts(conn, "txn", b, tx_set)
+    fp = _load_facts(conn, "pay", b, pay_set)
+
+    sim_cache = VendorSimilarityCache(conn, max_rows=mcfg.similarity_cache_max_rows) if mcfg.similarity_cache else None
+    _, candidates, matches = match_frames(b, ft, fp, mcfg, similarity_cache=sim_cache)
+
+    # Records whose match status or facts may change, for the incremental report marts and spend cube.
+    partner_tx, _ = _partners(conn, b, set(), pay_set | set(deleted_pay))
+    mark_reports_stale(conn, b, "txn", tx_set | set(deleted_tx) | partner_tx)
+    mark_reports_stale(conn, b, "pay", pay_set | set(deleted_pay))
+
+    # Replace the affected records' rows (deleted records included) and nothing else.
+    for table in ("matches", "match_candidates"):
+        _delete_for(conn, table, b, "txn_id", tx_set | set(deleted_tx))
+        _delete_for(conn, table, b, "pay_id", pay_set | set(deleted_pay))
+    _delete_for(conn, "match_candidate_summary", b, "txn_id", tx_set | set(deleted_tx))
+    if mcfg.candidate_storage == "all" and not candidates.empty:
+        candidates.to_sql("match_candidates", conn, if_exists="append", index=False)
+    elif mcfg.candidate_storage == "summary" and not candidates.empty:
+        summarize_candidates(candidates).to_sql("match_candidate_summary", conn, if_exists="append", index=False)
+    if not matches.empty:
+        matches.to_sql("matches", conn, if_exists="append", index=False)
+    conn.commit()
+
+    for rtype, changed, deleted in (("txn", changed_tx, deleted_tx), ("pay", changed_pay, deleted_pay)):
+        if deleted:
+            _load_ids(conn, deleted)
+            conn.execute("DELETE FROM match_inputs WHERE record_type = ? AND record_id IN (SELECT record_id FROM _rematch_ids);", (rtype,))
+        if changed:
+            snapshot_inputs(conn, b, rtype, changed)
+
+    total = int(conn.execute("SELECT COUNT(1) FROM matches WHERE batch_id = ?;", (b,)).fetchone()[0])
+    unmatched = {}
+    for rtype, (table, id_col) in _FACTS.items():
+        unmatched[rtype] = int(conn.execute(
+            f"SELECT COUNT(1) FROM {table} f WHERE f.batch_id = ? AND NOT EXISTS ("
+            f" SELECT 1 FROM matches m WHERE m.batch_id = f.batch_id AND m.{id_col} = f.{id_col});",
+            (b,),
+        ).fetchone()[0])
+    insert_matching_run(conn, {
+        "matched_at_utc": utc_now_iso(),
+        "batch_id": b,
+        "date_window_days": mcfg.date_window_days,
+        "amount_tolerance_cents": mcfg.amount_tolerance_cents,
+        "min_score": mcfg.min_score,
+        "match_count": total,
+        "unmatched_tx_count": unmatched["txn"],
+        "unmatched_pay_count": unmatched["pay"],
+    })
+    conn.close()
+    return {
+        "matches": total,
+        "unmatched_transactions": unmatched["txn"],
+        "unmatched_vendor_payments": unmatched["pay"],
+        "changed_transactions": len(changed_tx) + len(deleted_tx),
+        "changed_vendor_payments": len(changed_pay) + len(deleted_pay),
+        "rematched_transactions": len(tx_set),
+        "rematched_vendor_payments": len(pay_set),
+        "new_matches": int(len(matches)),
+    }
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+from typing import Iterator, Tuple
+
+import numpy as np
+
+# Transactions are expanded in blocks so peak memory tracks the block, not the batch.
+DEFAULT_BLOCK_SIZE = 65536
+
+def _expand_ranges(starts: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Expand per-row [start, start+count) ranges into flat (owner, position) arrays."""
+    total = int(counts.sum())
+    if total == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    owner = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+    offsets = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, starts[owner] + offsets
+
+def iter_interval_join(
+    tx_amount: np.ndarray,
+    tx_day: np.ndarray,
+    pay_amount: np.ndarray,
+    pay_day: np.ndarray,
+    date_window_days: int,
+    amount_tolerance_cents: int,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Yield (tx_pos, pay_pos) index arrays for every pair inside the blocking window.
+
+    Semantics follow the original per-row filter in ``matching.build_candidates``:
+    - ``date_window_days <= 0`` disables the date filter, otherwise |pay_day - tx_day| <= window.
+    - ``amount_tolerance_cents == 0`` requires equal amounts, otherwise |diff| <= tolerance.
+
+    One chunk is yielded per block of consecutive transactions, sorted by
+    (tx_pos, pay_pos), so concatenating the chunks gives the global order and
+    every candidate of a transaction arrives in the same chunk.
+    Cost is O((n + m) log m + candidates).
+    """
+    tx_amount = np.asarray(tx_amount, dtype=np.int64)
+    tx_day = np.asarray(tx_day, dtype=np.int64)
+    pay_amount = np.asarray(pay_amount, dtype=np.int64)
+    pay_day = np.asarray(pay_day, dtype=np.int64)
+
+    if len(tx_amount) == 0 or len(pay_amount) == 0 or amount_tolerance_cents < 0:
+        return
+
+    use_dates = date_window_days > 0
+    w = int(date_window_days)
+    tol = int(amount_tolerance_cents)
+
+    if tol == 0 and use_dates:
+        # Composite (amount, day) key: one sorted array answers both bounds exactly.
+        day_min = int(min(tx_day.min(), pay_day.min()))
+        span = int(max(tx_day.max(), pay_day.max())) - day_min + 1
+        pay_key = pay_amount * span + (pay_day - day_min)
+        order = np.argsort(pay_key, kind="stable")
+        sorted_key = pay_key[order]
+    elif use_dates:
+        # Sort both ways; each transaction scans whichever window is narrower.
+        order = np.argsort(pay_amount, kind="stable")
+        sorted_amount = pay_amount[order]
+        order_day = np.argsort(pay_day, kind="stable")
+        sorted_day = pay_day[order_day]
+    else:
+        order = np.argsort(pay_amount, kind="stable")
+        sorted_amount = pay_amount[order]
+
+    for start in range(0, len(tx_amount), max(1, int(block_size))):
+        stop = min(start + max(1, int(block_size)), len(tx_amount))
+        a = tx_amount[start:stop]
+        d = tx_day[start:stop]
+
+        if tol == 0 and use_dates:
+            lo_off = np.clip(d - w - day_min, 0, span - 1)
+            hi_off = np.clip(d + w - day_min, 0, span - 1)
+            lo = np.searchsorted(sorted_key, a * span + lo_off, side="left")
+            hi = np.searchsorted(sorted_key, a * span + hi_off, side="right")
+            owner, pos = _expand_ranges(lo, hi - lo)
+            pay_idx = order[pos]
+        elif use_dates:
+            a_lo = np.searchsorted(sorted_amount, a - tol, side="left")
+            a_hi = np.searchsorted(sorted_amount, a + tol, side="right")
+            d_lo = np.searchsorted(sorted_day, d - w, side="left")
+            d_hi = np.searchsorted(sorted_day, d + w, side="right")
+            by_amount = (a_hi - a_lo) <= (d_hi - d_lo)
+
+            owner_a, pos_a = _expand_ranges(a_lo[by_amount], (a_hi - a_lo)[by_amount])
+            owner_a = np.flatnonzero(by_amount)[owner_a]
+            idx_a = order[pos_a]
+            keep = np.abs(pay_day[idx_a] - d[owner_a]) <= w
+
+            owner_d, pos_d = _expand_ranges(d_lo[~by_amount], (d_hi - d_lo)[~by_amount])
+            owner_d = np.flatnonzero(~by_amount)[owner_d]
+            idx_d = order_day[pos_d]
+            keep_d = np.abs(pay_amount[idx_d] - a[owner_d]) <= tol
+
+            owner = np.concatenate([owner_a[keep], owner_d[keep_d]])
+            pay_idx = np.concatenate([idx_a[keep], idx_d[keep_d]])
+        else:
+            if tol == 0:
+                lo = np.searchsorted(sorted_amount, a, side="left")
+                hi = np.searchsorted(sorted_amount, a, side="right")
+            else:
+                lo = np.searchsorted(sorted_amount, a - tol, side="left")
+                hi = np.searchsorted(sorted_amount, a + tol, side="right")
+            owner, pos = _expand_ranges(lo, hi - lo)
+            pay_idx = order[pos]
+
+        tx_pos = owner + start
+        # Deterministic (transaction, payment) order of the original loop.
+        sort = np.lexsort((pay_idx, tx_pos))
+        yield tx_pos[sort], pay_idx[sort]
+
+def interval_join(
+    tx_amount: np.ndarray,
+    tx_day: np.ndarray,
+    pay_amount: np.ndarray,
+    pay_day: np.ndarray,
+    date_window_days: int,
+    amount_tolerance_cents: int,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """All pairs from ``iter_interval_join`` as two arrays in (tx_pos, pay_pos) order."""
+    tx_parts = []
+    pay_parts = []
+    for tx_pos, pay_pos in iter_interval_join(
+        tx_amount, tx_day, pay_amount, pay_day, date_window_days, amount_tolerance_cents, block_size,
+    ):
+        tx_parts.append(tx_pos)
+        pay_parts.append(pay_pos)
+    if not tx_parts:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    return np.concatenate(tx_parts), np.concatenate(pay_parts)
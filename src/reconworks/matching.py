@@ -5,25 +5,53 @@ from datetime import datetime
 from pathlib import Path
 from typing import Dict, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 from rapidfuzz import fuzz
 
-from .config import ProjectConfig
+from .config import MatchingConfig, ProjectConfig
 from .db import (
     connect,
     latest_batch_id,
     create_match_candidates_table,
+    create_match_candidate_summary_table,
     create_matches_table,
     create_matching_runs_table,
     delete_where_batch,
     insert_matching_run,
 )
+from .assignment import greedy_assign, greedy_order, optimal_assign
+from .incremental import snapshot_inputs
+from .interval_join import iter_interval_join
+from .open_items import closed_elsewhere, load_open_items, reset_batch, update_ledger
+from .report_marts import mark_reports_stale
+from .parallel_matching import build_candidates_parallel
+from .pruning import top_k_mask
+from .scoring import match_type_arrays, score_arrays
+from .split_matching import split_payment_matches
+from .sql_matching import match_batch_sql
+from .similarity import VendorSimilarityCache, vendor_similarity_bulk
 from .util import utc_now_iso, ensure_dir
 
 def _to_dt(s: pd.Series) -> pd.Series:
     # Expect ISO date YYYY-MM-DD
     return pd.to_datetime(s, errors="coerce")
 
+def _to_day(s: pd.Series) -> np.ndarray:
+    # Whole days since epoch, for integer date arithmetic
+    return s.to_numpy().astype("datetime64[D]").astype(np.int64)
+
+def _vendor_array(df: pd.DataFrame) -> np.ndarray:
+    # Same stringification as str(row.get("vendor_canonical", "")) per row
+    if "vendor_canonical" not in df.columns:
+        return np.full(len(df), "", dtype=object)
+    return np.array([str(v) for v in df["vendor_canonical"].tolist()], dtype=object)
+
+def _vendor_id_array(df: pd.DataFrame) -> np.ndarray:
+    if "vendor_id" not in df.columns:
+        return np.full(len(df), "", dtype=object)
+    return np.array([v if isinstance(v, str) else "" for v in df["vendor_id"].tolist()], dtype=object)
+
 def _vendor_similarity(a: str, b: str) -> float:
     a = (a or "").strip()
     b = (b or "").strip()
@@ -56,6 +84,8 @@ def _match_type(vendor_sim: float, date_diff_days: int, amount_diff_cents: int)
         return "vendor_fuzzy"
     return "weak"
 
+CANDIDATE_COLUMNS = ["batch_id","txn_id","pay_id","vendor_sim","date_diff_days","amount_diff_cents","score"]
+
 def build_candidates(
     batch_id: str,
     fact_transactions: pd.DataFrame,
@@ -65,11 +95,19 @@ def build_candidates(
     w_vendor: float,
     w_date: float,
     w_amount: float,
+    similarity_workers: int = -1,
+    similarity_cache: Optional[VendorSimilarityCache] = None,
+    top_k: int = 0,
+    score_floor: float = 0.0,
 ) -> pd.DataFrame:
+    """Generate and score candidate pairs inside the date/amount blocking window.
+
+    Pruning happens block by block as pairs are generated: pairs below
+    ``score_floor`` are dropped, and with ``top_k > 0`` only the ``top_k``
+    best candidates per transaction and per payment are kept.
+    """
     if fact_transactions.empty or fact_vendor_payments.empty:
-        return pd.DataFrame(columns=[
-            "batch_id","txn_id","pay_id","vendor_sim","date_diff_days","amount_diff_cents","score"
-        ])
+        return pd.DataFrame(columns=CANDIDATE_COLUMNS)
 
     tx = fact_transactions.copy()
     pay = fact_vendor_payments.copy()
@@ -77,85 +115,243 @@ def build_candidates(
     tx["date_dt"] = _to_dt(tx["date"])
     pay["date_dt"] = _to_dt(pay["date"])
 
-    tx = tx.dropna(subset=["date_dt", "amount_cents"])
-    pay = pay.dropna(subset=["date_dt", "amount_cents"])
-
-    rows = []
-    for _, t in tx.iterrows():
-        t_amount = int(t["amount_cents"])
-        t_date = t["date_dt"]
-        # blocking filter
-        p = pay
-        if date_window_days > 0:
-            lo = t_date - pd.Timedelta(days=date_window_days)
-            hi = t_date + pd.Timedelta(days=date_window_days)
-            p = p[(p["date_dt"] >= lo) & (p["date_dt"] <= hi)]
-        if amount_tolerance_cents == 0:
-            p = p[p["amount_cents"].astype(int) == t_amount]
-        else:
-            p = p[(p["amount_cents"].astype(int) - t_amount).abs() <= amount_tolerance_cents]
+    tx = tx.dropna(subset=["date_dt", "amount_cents"]).reset_index(drop=True)
+    pay = pay.dropna(subset=["date_dt", "amount_cents"]).reset_index(drop=True)
+
+    tx_amount = tx["amount_cents"].astype("int64").to_numpy()
+    pay_amount = pay["amount_cents"].astype("int64").to_numpy()
+    tx_day = _to_day(tx["date_dt"])
+    pay_day = _to_day(pay["date_dt"])
 
-        if p.empty:
+    tx_vendor = _vendor_array(tx)
+    pay_vendor = _vendor_array(pay)
+    tx_vendor_id = _vendor_id_array(tx)
+    pay_vendor_id = _vendor_id_array(pay)
+
+    kept = {"ti": [], "pi": [], "vendor_sim": [], "date_diff": [], "amount_diff": [], "score": []}
+    # blocking filter: sorted interval join instead of one DataFrame scan per transaction
+    for ti, pi in iter_interval_join(tx_amount, tx_day, pay_amount, pay_day, date_window_days, amount_tolerance_cents):
+        if len(ti) == 0:
             continue
+        date_diff = pay_day[pi] - tx_day[ti]
+        amount_diff = pay_amount[pi] - tx_amount[ti]
+        vendor_sim = vendor_similarity_bulk(
+            tx_vendor[ti], pay_vendor[pi], workers=similarity_workers,
+            ids_a=tx_vendor_id[ti], ids_b=pay_vendor_id[pi], cache=similarity_cache,
+        )
+        score = score_arrays(vendor_sim, date_diff, amount_diff, date_window_days, amount_tolerance_cents, w_vendor, w_date, w_amount)
+
+        # A transaction's candidates all arrive in one block, so per-txn pruning is final here.
+        keep = score >= float(score_floor)
+        if top_k > 0:
+            keep &= top_k_mask(ti, score, vendor_sim, top_k)
+        for name, arr in (("ti", ti), ("pi", pi), ("vendor_sim", vendor_sim),
+                          ("date_diff", date_diff), ("amount_diff", amount_diff), ("score", score)):
+            kept[name].append(arr[keep])
+
+        if top_k > 0:
+            # Payments span blocks: re-rank what is kept so far and fold it into one chunk.
+            merged = {name: np.concatenate(parts) for name, parts in kept.items()}
+            keep = top_k_mask(merged["pi"], merged["score"], merged["vendor_sim"], top_k)
+            kept = {name: [arr[keep]] for name, arr in merged.items()}
+
+    out = {name: np.concatenate(parts) for name, parts in kept.items()} if kept["ti"] else {}
+    if not out or len(out["ti"]) == 0:
+        return pd.DataFrame(columns=CANDIDATE_COLUMNS)
+
+    return pd.DataFrame({
+        "batch_id": batch_id,
+        "txn_id": tx["txn_id"].to_numpy()[out["ti"]],
+        "pay_id": pay["pay_id"].to_numpy()[out["pi"]],
+        "vendor_sim": out["vendor_sim"],
+        "date_diff_days": out["date_diff"],
+        "amount_diff_cents": out["amount_diff"],
+        "score": out["score"],
+    })
+
+def summarize_candidates(candidates: pd.DataFrame) -> pd.DataFrame:
+    """One row per transaction: candidate count, best pay_id/score and runner-up score."""
+    cols = ["batch_id","txn_id","candidate_count","best_pay_id","best_score","runner_up_score"]
+    if candidates.empty:
+        return pd.DataFrame(columns=cols)
+    order = greedy_order(candidates["score"].to_numpy(dtype=np.float64), candidates["vendor_sim"].to_numpy(dtype=np.float64))
+    ranked = candidates.iloc[order]
+    rank = ranked.groupby(["batch_id","txn_id"], sort=False).cumcount()
+    best = ranked[rank == 0].set_index(["batch_id","txn_id"])
+    runner_up = ranked[rank == 1].set_index(["batch_id","txn_id"])["score"]
+    counts = ranked.groupby(["batch_id","txn_id"], sort=False).size()
+    out = pd.DataFrame({
+        "candidate_count": counts.reindex(best.index),
+        "best_pay_id": best["pay_id"],
+        "best_score": best["score"],
+        "runner_up_score": runner_up.reindex(best.index),
+    })
+    return out.reset_index()[cols]
+
+MATCH_COLUMNS = [
+    "batch_id","txn_id","pay_id","match_score","match_type","vendor_sim","date_diff_days","amount_diff_cents","matched_at_utc"
+]
+
+def exact_key_matches(
+    batch_id: str,
+    fact_transactions: pd.DataFrame,
+    fact_vendor_payments: pd.DataFrame,
+    w_vendor: float,
+    w_date: float,
+    w_amount: float,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """First-pass hash join on (vendor_id, date, amount_cents).
+
+    Only keys that occur exactly once on each side are resolved, so the pair is
+    unambiguous. Returns (matches, residual_transactions, residual_payments).
+    """
+    key = ["vendor_id", "date", "amount_cents"]
+    if fact_transactions.empty or fact_vendor_payments.empty:
+        return pd.DataFrame(columns=MATCH_COLUMNS), fact_transactions, fact_vendor_payments
+
+    def unique_keys(df: pd.DataFrame, idcol: str) -> pd.DataFrame:
+        base = df[[idcol] + key].dropna(subset=key)
+        base = base[(base["vendor_id"].astype(str).str.strip() != "") & (base["date"].astype(str).str.strip() != "")]
+        return base[~base.duplicated(subset=key, keep=False)]
+
+    tx = unique_keys(fact_transactions, "txn_id")
+    pay = unique_keys(fact_vendor_payments, "pay_id")
+    pairs = tx.merge(pay[["pay_id"] + key], on=key, how="inner")
+    if pairs.empty:
+        return pd.DataFrame(columns=MATCH_COLUMNS), fact_transactions, fact_vendor_payments
 
-        for _, pr in p.iterrows():
-            vendor_sim = _vendor_similarity(str(t.get("vendor_canonical","")), str(pr.get("vendor_canonical","")))
-            date_diff = int((pr["date_dt"] - t_date).days)
-            amount_diff = int(int(pr["amount_cents"]) - t_amount)
-            score = _score(vendor_sim, date_diff, date_window_days, amount_diff, amount_tolerance_cents, w_vendor, w_date, w_amount)
-            rows.append({
-                "batch_id": batch_id,
-                "txn_id": t["txn_id"],
-                "pay_id": pr["pay_id"],
-                "vendor_sim": vendor_sim,
-                "date_diff_days": date_diff,
-                "amount_diff_cents": amount_diff,
-                "score": score,
-            })
-
-    return pd.DataFrame(rows)
+    score = _score(1.0, 0, 0, 0, 0, w_vendor, w_date, w_amount)
+    matches = pd.DataFrame({
+        "batch_id": batch_id,
+        "txn_id": pairs["txn_id"].to_numpy(),
+        "pay_id": pairs["pay_id"].to_numpy(),
+        "match_score": score,
+        "match_type": "exact",
+        "vendor_sim": 1.0,
+        "date_diff_days": 0,
+        "amount_diff_cents": 0,
+        "matched_at_utc": utc_now_iso(),
+    })
+    residual_tx = fact_transactions[~fact_transactions["txn_id"].isin(matches["txn_id"])]
+    residual_pay = fact_vendor_payments[~fact_vendor_payments["pay_id"].isin(matches["pay_id"])]
+    return matches, residual_tx, residual_pay
 
 def choose_matches(
     candidates: pd.DataFrame,
     min_score: float,
+    assignment_mode: str = "greedy",
+    optimal_max_component_size: int = 500,
 ) -> pd.DataFrame:
     if candidates.empty:
-        return pd.DataFrame(columns=[
-            "batch_id","txn_id","pay_id","match_score","match_type","vendor_sim","date_diff_days","amount_diff_cents","matched_at_utc"
-        ])
-
-    cand = candidates.sort_values(["score","vendor_sim"], ascending=[False, False]).reset_index(drop=True)
-    used_txn = set()
-    used_pay = set()
-    chosen = []
-    matched_at = utc_now_iso()
-
-    for _, r in cand.iterrows():
-        if float(r["score"]) < float(min_score):
-            break
-        txn_id = r["txn_id"]
-        pay_id = r["pay_id"]
-        if txn_id in used_txn or pay_id in used_pay:
-            continue
-        used_txn.add(txn_id)
-        used_pay.add(pay_id)
-
-        vendor_sim = float(r["vendor_sim"])
-        date_diff = int(r["date_diff_days"])
-        amount_diff = int(r["amount_diff_cents"])
-        chosen.append({
-            "batch_id": r["batch_id"],
-            "txn_id": txn_id,
-            "pay_id": pay_id,
-            "match_score": float(r["score"]),
-            "match_type": _match_type(vendor_sim, date_diff, amount_diff),
-            "vendor_sim": vendor_sim,
-            "date_diff_days": date_diff,
-            "amount_diff_cents": amount_diff,
-            "matched_at_utc": matched_at,
-        })
-
-    return pd.DataFrame(chosen)
+        return pd.DataFrame(columns=MATCH_COLUMNS)
+
+    txn_codes, _ = pd.factorize(candidates["txn_id"])
+    pay_codes, _ = pd.factorize(candidates["pay_id"])
+    score = candidates["score"].to_numpy(dtype=np.float64)
+    vendor_sim = candidates["vendor_sim"].to_numpy(dtype=np.float64)
+    if assignment_mode == "optimal":
+        idx = optimal_assign(txn_codes, pay_codes, score, vendor_sim, min_score, max_component_size=optimal_max_component_size)
+    elif assignment_mode == "greedy":
+        idx = greedy_assign(txn_codes, pay_codes, score, vendor_sim, min_score)
+    else:
+        raise ValueError("assignment_mode must be 'greedy' or 'optimal'")
+    if len(idx) == 0:
+        return pd.DataFrame(columns=MATCH_COLUMNS)
+
+    date_diff = candidates["date_diff_days"].to_numpy(dtype=np.int64)[idx]
+    amount_diff = candidates["amount_diff_cents"].to_numpy(dtype=np.int64)[idx]
+    return pd.DataFrame({
+        "batch_id": candidates["batch_id"].to_numpy()[idx],
+        "txn_id": candidates["txn_id"].to_numpy()[idx],
+        "pay_id": candidates["pay_id"].to_numpy()[idx],
+        "match_score": score[idx],
+        "match_type": match_type_arrays(vendor_sim[idx], date_diff, amount_diff),
+        "vendor_sim": vendor_sim[idx],
+        "date_diff_days": date_diff,
+        "amount_diff_cents": amount_diff,
+        "matched_at_utc": utc_now_iso(),
+    })
+
+def match_frames(
+    batch_id: str,
+    ft: pd.DataFrame,
+    fp: pd.DataFrame,
+    mcfg: MatchingConfig,
+    similarity_cache: Optional[VendorSimilarityCache] = None,
+    stats: Optional[Dict[str, int]] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Exact pass, candidate generation and assignment (no DB I/O besides the cache).
+
+    Returns (exact_matches, candidates, matches); ``matches`` includes the exact
+    ones and, with ``split_matching``, the many-to-one rows.
+    """
+    exact = pd.DataFrame(columns=MATCH_COLUMNS)
+    residual_tx, residual_pay = ft, fp
+    if mcfg.exact_fast_path:
+        exact, residual_tx, residual_pay = exact_key_matches(
+            batch_id, ft, fp, w_vendor=mcfg.vendor_weight, w_date=mcfg.date_weight, w_amount=mcfg.amount_weight,
+        )
+
+    if mcfg.parallel_workers > 1:
+        candidates = build_candidates_parallel(
+            batch_id=batch_id,
+            fact_transactions=residual_tx,
+            fact_vendor_payments=residual_pay,
+            date_window_days=mcfg.date_window_days,
+            amount_tolerance_cents=mcfg.amount_tolerance_cents,
+            w_vendor=mcfg.vendor_weight,
+            w_date=mcfg.date_weight,
+            w_amount=mcfg.amount_weight,
+            n_workers=mcfg.parallel_workers,
+            amount_bucket_cents=mcfg.parallel_amount_bucket_cents,
+            date_block_days=mcfg.parallel_date_block_days,
+            similarity_cache=similarity_cache,
+            top_k=mcfg.candidate_top_k,
+            score_floor=mcfg.candidate_min_score,
+        )
+    else:
+        candidates = build_candidates(
+            batch_id=batch_id,
+            fact_transactions=residual_tx,
+            fact_vendor_payments=residual_pay,
+            date_window_days=mcfg.date_window_days,
+            amount_tolerance_cents=mcfg.amount_tolerance_cents,
+            w_vendor=mcfg.vendor_weight,
+            w_date=mcfg.date_weight,
+            w_amount=mcfg.amount_weight,
+            similarity_workers=mcfg.similarity_workers,
+            similarity_cache=similarity_cache,
+            top_k=mcfg.candidate_top_k,
+            score_floor=mcfg.candidate_min_score,
+        )
+    matches = choose_matches(
+        candidates,
+        min_score=mcfg.min_score,
+        assignment_mode=mcfg.assignment_mode,
+        optimal_max_component_size=mcfg.optimal_max_component_size,
+    )
+    if not exact.empty:
+        matches = pd.concat([exact, matches], ignore_index=True) if not matches.empty else exact
+
+    if mcfg.split_matching:
+        split = split_payment_matches(
+            batch_id,
+            ft[~ft["txn_id"].isin(matches["txn_id"])] if not ft.empty else ft,
+            fp[~fp["pay_id"].isin(matches["pay_id"])] if not fp.empty else fp,
+            date_window_days=mcfg.split_date_window_days,
+            amount_tolerance_cents=mcfg.split_amount_tolerance_cents,
+            max_group_size=mcfg.split_max_group_size,
+            max_nodes=mcfg.split_max_nodes,
+            time_budget_ms=mcfg.split_time_budget_ms,
+            w_vendor=mcfg.vendor_weight,
+            w_date=mcfg.date_weight,
+            w_amount=mcfg.amount_weight,
+            stats=stats,
+        )
+        if not split.empty:
+            matches = pd.concat([matches, split], ignore_index=True) if not matches.empty else split
+
+    return exact, candidates, matches
 
 def match_all(repo_root: Path, cfg: ProjectConfig, batch_id: Optional[str] = None, export_csv: bool = False) -> Dict[str, int]:
     out_dir = repo_root / cfg.output_dir
@@ -164,6 +360,7 @@ def match_all(repo_root: Path, cfg: ProjectConfig, batch_id: Optional[str] = Non
 
     conn = connect(repo_root / cfg.database_path)
     create_match_candidates_table(conn)
+    create_match_candidate_summary_table(conn)
     create_matches_table(conn)
     create_matching_runs_table(conn)
 
@@ -171,35 +368,72 @@ def match_all(repo_root: Path, cfg: ProjectConfig, batch_id: Optional[str] = Non
     if not b:
         conn.close()
         return {"matches": 0, "unmatched_transactions": 0, "unmatched_vendor_payments": 0}
-
-    ft = pd.read_sql_query("SELECT * FROM fact_transactions WHERE batch_id=?", conn, params=(b,))
-    fp = pd.read_sql_query("SELECT * FROM fact_vendor_payments WHERE batch_id=?", conn, params=(b,))
+    mark_reports_stale(conn, b)
 
     mcfg = cfg.matching
-    candidates = build_candidates(
-        batch_id=b,
-        fact_transactions=ft,
-        fact_vendor_payments=fp,
-        date_window_days=mcfg.date_window_days,
-        amount_tolerance_cents=mcfg.amount_tolerance_cents,
-        w_vendor=mcfg.vendor_weight,
-        w_date=mcfg.date_weight,
-        w_amount=mcfg.amount_weight,
-    )
-    matches = choose_matches(candidates, min_score=mcfg.min_score)
+    if mcfg.engine == "sql":
+        # Out-of-core: the batch is never loaded as DataFrames.
+        summary = match_batch_sql(conn, b, mcfg, csv_dir=out_dir / "csv" if export_csv else None)
+        conn.close()
+        return summary
+    if mcfg.engine != "memory":
+        conn.close()
+        raise ValueError("engine must be 'memory' or 'sql'")
+
+    # rowid order: with the range/duplicate indexes present the planner may otherwise return
+    # rows in (amount_cents, date) order, which changes greedy tie-breaks.
+    ft = pd.read_sql_query("SELECT * FROM fact_transactions WHERE batch_id=? ORDER BY rowid", conn, params=(b,))
+    fp = pd.read_sql_query("SELECT * FROM fact_vendor_payments WHERE batch_id=? ORDER BY rowid", conn, params=(b,))
+
+    own_tx, own_pay = ft, fp
+    ledger_tx = ft.iloc[:0]
+    ledger_pay = fp.iloc[:0]
+    if mcfg.open_items_ledger:
+        # Match against open items carried over from earlier batches, within the same window.
+        reset_batch(conn, b)
+        own_tx = ft[~ft["txn_id"].isin(closed_elsewhere(conn, "txn", b))]
+        own_pay = fp[~fp["pay_id"].isin(closed_elsewhere(conn, "pay", b))]
+        ledger_tx = load_open_items(conn, "txn", b, own_pay, mcfg.date_window_days, mcfg.amount_tolerance_cents)
+        ledger_pay = load_open_items(conn, "pay", b, own_tx, mcfg.date_window_days, mcfg.amount_tolerance_cents)
+        if not ledger_tx.empty:
+            ft = pd.concat([own_tx, ledger_tx], ignore_index=True)
+        else:
+            ft = own_tx
+        if not ledger_pay.empty:
+            fp = pd.concat([own_pay, ledger_pay], ignore_index=True)
+        else:
+            fp = own_pay
+
+    sim_cache = VendorSimilarityCache(conn, max_rows=mcfg.similarity_cache_max_rows) if mcfg.similarity_cache else None
+    split_stats: Dict[str, int] = {}
+    exact, candidates, matches = match_frames(b, ft, fp, mcfg, similarity_cache=sim_cache, stats=split_stats)
 
     matched_txn = set(matches["txn_id"].tolist()) if not matches.empty else set()
     matched_pay = set(matches["pay_id"].tolist()) if not matches.empty else set()
-    unmatched_tx = ft[~ft["txn_id"].isin(matched_txn)].copy() if not ft.empty else ft
-    unmatched_pay = fp[~fp["pay_id"].isin(matched_pay)].copy() if not fp.empty else fp
+    unmatched_tx = own_tx[~own_tx["txn_id"].isin(matched_txn)].copy() if not own_tx.empty else own_tx
+    unmatched_pay = own_pay[~own_pay["pay_id"].isin(matched_pay)].copy() if not own_pay.empty else own_pay
+    ledger_matches = 0
+    if not matches.empty:
+        ledger_matches = int((matches["txn_id"].isin(ledger_tx["txn_id"]) | matches["pay_id"].isin(ledger_pay["pay_id"])).sum())
 
     # Idempotent per batch
     delete_where_batch(conn, "match_candidates", b)
+    delete_where_batch(conn, "match_candidate_summary", b)
     delete_where_batch(conn, "matches", b)
     delete_where_batch(conn, "matching_runs", b)
 
-    if not candidates.empty:
-        candidates.to_sql("match_candidates", conn, if_exists="append", index=False)
+    # Candidate storage: "all" (possibly pruned) pairs, per-transaction "summary", or "none"
+    stored = candidates
+    if mcfg.candidate_storage == "summary":
+        stored = summarize_candidates(candidates)
+    elif mcfg.candidate_storage == "none":
+        stored = candidates.iloc[:0]
+    elif mcfg.candidate_storage != "all":
+        raise ValueError("candidate_storage must be 'all', 'summary' or 'none'")
+    stored_table = "match_candidate_summary" if mcfg.candidate_storage == "summary" else "match_candidates"
+
+    if not stored.empty:
+        stored.to_sql(stored_table, conn, if_exists="append", index=False)
     if not matches.empty:
         matches.to_sql("matches", conn, if_exists="append", index=False)
 
@@ -214,8 +448,14 @@ def match_all(repo_root: Path, cfg: ProjectConfig, batch_id: Optional[str] = Non
         "unmatched_pay_count": int(len(unmatched_pay)),
     })
 
+    if mcfg.open_items_ledger:
+        update_ledger(conn, b, matches, unmatched_tx, unmatched_pay)
+    # Inputs as matched, so an incremental rematch can tell what changed since.
+    snapshot_inputs(conn, b)
+
     if export_csv:
-        candidates.to_csv(out_dir / "csv" / "match_candidates.csv", index=False)
+        if mcfg.candidate_storage != "none":
+            stored.to_csv(out_dir / "csv" / f"{stored_table}.csv", index=False)
         matches.to_csv(out_dir / "csv" / "matches.csv", index=False)
         unmatched_tx.to_csv(out_dir / "csv" / "unmatched_transactions.csv", index=False)
         unmatched_pay.to_csv(out_dir / "csv" / "unmatched_vendor_payments.csv", index=False)
@@ -226,4 +466,9 @@ def match_all(repo_root: Path, cfg: ProjectConfig, batch_id: Optional[str] = Non
         "unmatched_transactions": int(len(unmatched_tx)),
         "unmatched_vendor_payments": int(len(unmatched_pay)),
         "candidates": int(len(candidates)),
+        "exact_matches": int(len(exact)),
+        "ledger_matches": ledger_matches,
+        **split_stats,
+        "similarity_cache_hits": int(sim_cache.hits) if sim_cache else 0,
+        "similarity_cache_misses": int(sim_cache.misses) if sim_cache else 0,
     }
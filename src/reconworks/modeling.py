@@ -15,6 +15,7 @@ from .db import (
     create_modeling_runs_table,
     insert_modeling_run,
 )
+from .report_marts import mark_reports_stale
 from .util import utc_now_iso, sha256_text, ensure_dir
 
 def _ensure_dim_vendor(conn) -> None:
@@ -131,6 +132,7 @@ def model_all(repo_root: Path, cfg: ProjectConfig, export_csv: bool = False, bat
     conn.execute("DELETE FROM fact_vendor_payments WHERE batch_id = ?", (batch_id,))
     conn.execute("DELETE FROM modeling_runs WHERE batch_id = ?", (batch_id,))
     conn.commit()
+    mark_reports_stale(conn, batch_id)
 
     # Preload dim_vendor mapping
     def refresh_vendor_map() -> Dict[str, str]:
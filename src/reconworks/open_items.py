@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import Dict, Set, Tuple
+
+import pandas as pd
+
+from .db import create_open_items_table
+from .util import utc_now_iso
+
+# record_type -> (fact table, id column)
+_FACTS: Dict[str, Tuple[str, str]] = {
+    "txn": ("fact_transactions", "txn_id"),
+    "pay": ("fact_vendor_payments", "pay_id"),
+}
+
+def reset_batch(conn: sqlite3.Connection, batch_id: str) -> None:
+    """Undo a previous ledger update by ``batch_id`` so the batch can be re-matched.
+
+    Items the batch closed are reopened and the batch's own open items removed.
+    Its items that a later batch already closed stay closed.
+    """
+    create_open_items_table(conn)
+    conn.execute(
+        "UPDATE open_items SET closed_by_batch_id = NULL, closed_at_utc = NULL WHERE closed_by_batch_id = ?;",
+        (batch_id,),
+    )
+    conn.execute("DELETE FROM open_items WHERE batch_id = ? AND closed_by_batch_id IS NULL;", (batch_id,))
+    conn.commit()
+
+def closed_elsewhere(conn: sqlite3.Connection, record_type: str, batch_id: str) -> Set[str]:
+    """Ids from ``batch_id`` that already matched while sitting in the ledger."""
+    create_open_items_table(conn)
+    rows = conn.execute(
+        "SELECT record_id FROM open_items WHERE record_type = ? AND batch_id = ?"
+        " AND closed_by_batch_id IS NOT NULL AND closed_by_batch_id <> ?;",
+        (record_type, batch_id, batch_id),
+    ).fetchall()
+    return {r[0] for r in rows}
+
+def load_open_items(
+    conn: sqlite3.Connection,
+    record_type: str,
+    batch_id: str,
+    near: pd.DataFrame,
+    date_window_days: int,
+    amount_tolerance_cents: int,
+) -> pd.DataFrame:
+    """Fact rows of open ledger items (from other batches) that can pair with ``near``.
+
+    ``near`` holds the opposite side of the current batch; only its distinct
+    (amount_cents, date) keys are sent to SQLite, and each key probes the
+    partial (record_type, amount_cents, date) index with an amount range and,
+    when ``date_window_days > 0``, a date range.
+    """
+    table, id_col = _FACTS[record_type]
+    create_open_items_table(conn)
+    empty = pd.read_sql_query(f"SELECT * FROM {table} WHERE 0", conn)
+    if near.empty or amount_tolerance_cents < 0:
+        return empty
+
+    keys = near[["amount_cents", "date"]].dropna().drop_duplicates()
+    if keys.empty:
+        return empty
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _open_item_keys (amount_cents INTEGER, date TEXT);")
+    conn.execute("DELETE FROM _open_item_keys;")
+    conn.executemany(
+        "INSERT INTO _open_item_keys VALUES (?, ?);",
+        [(int(a), str(d)) for a, d in keys.itertuples(index=False)],
+    )
+
+    tol = int(amount_tolerance_cents)
+    w = int(date_window_days)
+    date_clause = ""
+    params: list = [record_type, tol, tol]
+    if w > 0:
+        date_clause = " AND o.date BETWEEN date(k.date, ?) AND date(k.date, ?)"
+        params += [f"-{w} days", f"+{w} days"]
+    params.append(batch_id)
+    sql = (
+        f"SELECT f.* FROM {table} f WHERE f.{id_col} IN ("
+        " SELECT o.record_id FROM _open_item_keys k JOIN open_items o"
+        " ON o.record_type = ? AND o.closed_by_batch_id IS NULL"
+        " AND o.amount_cents BETWEEN k.amount_cents - ? AND k.amount_cents + ?"
+        f"{date_clause}"
+        " WHERE o.batch_id <> ?"
+        f") ORDER BY f.batch_id, f.{id_col};"
+    )
+    out = pd.read_sql_query(sql, conn, params=params)
+    conn.execute("DELETE FROM _open_item_keys;")
+    conn.commit()
+    return out
+
+def update_ledger(
+    conn: sqlite3.Connection,
+    batch_id: str,
+    matches: pd.DataFrame,
+    unmatched_tx: pd.DataFrame,
+    unmatched_pay: pd.DataFrame,
+) -> Dict[str, int]:
+    """Close ledger items matched by ``batch_id`` and add the batch's unmatched records."""
+    create_open_items_table(conn)
+    now = utc_now_iso()
+    closed = 0
+    if not matches.empty:
+        for record_type, col in (("txn", "txn_id"), ("pay", "pay_id")):
+            cur = conn.executemany(
+                "UPDATE open_items SET closed_by_batch_id = ?, closed_at_utc = ?"
+                " WHERE record_type = ? AND record_id = ? AND closed_by_batch_id IS NULL;",
+                [(batch_id, now, record_type, str(x)) for x in matches[col].tolist()],
+            )
+            closed += cur.rowcount
+
+    added = 0
+    for record_type, frame in (("txn", unmatched_tx), ("pay", unmatched_pay)):
+        if frame.empty:
+            continue
+        _, id_col = _FACTS[record_type]
+        rows = [
+            (record_type, str(r[0]), batch_id, r[1], r[2], None if pd.isna(r[3]) else int(r[3]), now)
+            for r in frame[[id_col, "vendor_id", "date", "amount_cents"]].itertuples(index=False)
+        ]
+        conn.executemany(
+            "INSERT OR REPLACE INTO open_items"
+            " (record_type, record_id, batch_id, vendor_id, date, amount_cents, added_at_utc, closed_by_batch_id, closed_at_utc)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, NULL, NULL);",
+            rows,
+        )
+        added += len(rows)
+    conn.commit()
+    return {"closed": int(closed), "added": int(added)}
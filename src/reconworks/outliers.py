@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import math
+import sqlite3
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from .db import create_vendor_amount_sketch_table
+from .qa_checks import flag_frame
+
+_SIDES = (("transactions", "txn_id"), ("vendor_payments", "pay_id"))
+
+def _known_vendor(df: pd.DataFrame) -> pd.Series:
+    # Unmapped vendors are modeled as vendor_id "" (or NULL); pooling them into one sketch would mix vendors.
+    return df["vendor_id"].fillna("").astype(str).str.strip() != ""
+
+def _gamma(relative_accuracy: float) -> float:
+    return (1 + relative_accuracy) / (1 - relative_accuracy)
+
+def sketch_buckets(amounts: np.ndarray, relative_accuracy: float) -> np.ndarray:
+    """Log-scale bucket of each positive amount; bucket i holds (gamma^(i-1), gamma^i]."""
+    return np.ceil(np.log(np.asarray(amounts, dtype=float)) / math.log(_gamma(relative_accuracy))).astype(np.int64)
+
+def bucket_upper_bound(buckets, relative_accuracy: float):
+    return _gamma(relative_accuracy) ** np.asarray(buckets, dtype=float)
+
+def update_vendor_sketch(conn: sqlite3.Connection, batch_id: str, record_type: str, df: pd.DataFrame,
+                         relative_accuracy: float) -> int:
+    """Replace this batch's bucket counts in the per-vendor amount sketch; returns rows written.
+
+    Sketches are kept per batch, so re-running QA for a batch is idempotent and
+    the history sketch of a vendor is just the sum over batches. Rows without
+    a vendor_id (NULL or blank) are not sketched.
+    """
+    create_vendor_amount_sketch_table(conn)
+    conn.execute(
+        "DELETE FROM vendor_amount_sketch WHERE batch_id = ? AND record_type = ? AND relative_accuracy = ?;",
+        (batch_id, record_type, relative_accuracy),
+    )
+    if df.empty:
+        conn.commit()
+        return 0
+    amounts = pd.to_numeric(df["amount_cents"], errors="coerce")
+    keep = _known_vendor(df) & (amounts > 0)
+    counts = (
+        pd.DataFrame({"vendor_id": df.loc[keep, "vendor_id"].to_numpy(dtype=object),
+                      "bucket": sketch_buckets(amounts[keep].to_numpy(), relative_accuracy)})
+        .groupby(["vendor_id", "bucket"], sort=True).size()
+    )
+    conn.executemany(
+        "INSERT INTO vendor_amount_sketch (record_type, relative_accuracy, vendor_id, batch_id, bucket, count)"
+        " VALUES (?, ?, ?, ?, ?, ?);",
+        [(record_type, relative_accuracy, v, batch_id, int(b), int(c)) for (v, b), c in counts.items()],
+    )
+    conn.commit()
+    return int(len(counts))
+
+def vendor_thresholds(conn: sqlite3.Connection, record_type: str, vendor_ids: Iterable[str], quantile: float,
+                      min_count: int, relative_accuracy: float) -> pd.DataFrame:
+    """Per-vendor quantile bucket over all sketched batches: vendor_id, bucket, threshold_cents, count.
+
+    Vendors with fewer than ``min_count`` sketched amounts are left out.
+    ``threshold_cents`` is the upper bound of the quantile's bucket.
+    """
+    create_vendor_amount_sketch_table(conn)
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _sketch_vendors (vendor_id TEXT PRIMARY KEY);")
+    conn.execute("DELETE FROM _sketch_vendors;")
+    conn.executemany("INSERT OR IGNORE INTO _sketch_vendors VALUES (?);", [(str(v),) for v in vendor_ids])
+    merged = pd.read_sql_query(
+        "SELECT s.vendor_id, s.bucket, SUM(s.count) AS count FROM _sketch_vendors v"
+        " CROSS JOIN vendor_amount_sketch s ON s.record_type = ? AND s.relative_accuracy = ? AND s.vendor_id = v.vendor_id"
+        " GROUP BY s.vendor_id, s.bucket ORDER BY s.vendor_id, s.bucket;",
+        conn, params=(record_type, relative_accuracy),
+    )
+    if merged.empty:
+        return pd.DataFrame(columns=["vendor_id", "bucket", "threshold_cents", "count"])
+    g = merged.groupby("vendor_id", sort=False)["count"]
+    merged["total"] = g.transform("sum")
+    merged["cum"] = g.cumsum()
+    merged = merged[merged["total"] >= max(1, int(min_count))]
+    # Nearest-rank quantile: the first bucket whose cumulative count passes rank q * (n - 1).
+    hit = merged[merged["cum"] > quantile * (merged["total"] - 1)]
+    out = hit.groupby("vendor_id", sort=False).first().reset_index()
+    out["threshold_cents"] = np.floor(bucket_upper_bound(out["bucket"], relative_accuracy)).astype(np.int64)
+    return out[["vendor_id", "bucket", "threshold_cents", "total"]].rename(columns={"total": "count"})
+
+def vendor_outlier_flags(
+    conn: sqlite3.Connection,
+    batch_id: str,
+    fact_transactions: pd.DataFrame,
+    fact_vendor_payments: pd.DataFrame,
+    quantile: float,
+    min_count: int,
+    relative_accuracy: float,
+    created_at: str,
+) -> pd.DataFrame:
+    """VENDOR_AMOUNT_OUTLIER flags against each vendor's own amount history.
+
+    The batch is merged into the persistent sketches first, then every amount
+    whose bucket lies above its vendor's ``quantile`` bucket is flagged. Rows
+    without a vendor_id have no history of their own and are never flagged.
+    """
+    frames = []
+    for (rtype, id_col), df in zip(_SIDES, (fact_transactions, fact_vendor_payments)):
+        update_vendor_sketch(conn, batch_id, rtype, df, relative_accuracy)
+        if df.empty:
+            continue
+        known = _known_vendor(df)
+        thresholds = vendor_thresholds(conn, rtype, df.loc[known, "vendor_id"].unique(), quantile, min_count, relative_accuracy)
+        if thresholds.empty:
+            continue
+        amounts = pd.to_numeric(df["amount_cents"], errors="coerce")
+        t = df[["vendor_id"]].merge(thresholds, on="vendor_id", how="left").set_index(df.index)
+        positive = amounts > 0
+        bucket = pd.Series(pd.NA, index=df.index, dtype="Int64")
+        bucket[positive] = sketch_buckets(amounts[positive].to_numpy(), relative_accuracy)
+        cond = (bucket > t["bucket"]).fillna(False).astype(bool) & known
+        label = f"p{quantile * 100:g}"
+        message = (
+            f"Amount is unusually high for this vendor ({label} threshold: "
+            + t["threshold_cents"].astype("Int64").astype(str)
+            + " cents over "
+            + t["count"].astype("Int64").astype(str)
+            + " records)."
+        )
+        frame = flag_frame(df, batch_id, rtype, id_col, cond, "VENDOR_AMOUNT_OUTLIER", "warning", message, created_at)
+        if frame is not None:
+            frames.append(frame)
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .pruning import prune_per_payment
+from .similarity import MemorySimilarityCache, VendorSimilarityCache
+
+# Mixes amount bucket and date block into one partition key.
+_KEY_STRIDE = 1_000_003
+
+def _offsets(value: np.ndarray, bucket: np.ndarray, width: int, origin: int, reach: int) -> List[Tuple[int, np.ndarray]]:
+    """Bucket offsets (-1, 0, +1) a value must be copied to so any partner within ``reach`` shares a bucket."""
+    lo_edge = origin + bucket * width
+    return [
+        (0, np.ones(len(value), dtype=bool)),
+        (-1, (value - reach) < lo_edge),
+        (1, (value + reach) >= lo_edge + width),
+    ]
+
+def partition_tasks(
+    tx_amount: np.ndarray,
+    tx_day: np.ndarray,
+    pay_amount: np.ndarray,
+    pay_day: np.ndarray,
+    date_window_days: int,
+    amount_tolerance_cents: int,
+    n_tasks: int,
+    amount_bucket_cents: int = 10000,
+    date_block_days: int = 31,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Assign records to independent matching tasks.
+
+    Every transaction lands in exactly one (amount bucket, date block) partition.
+    Payments are also copied into the neighbouring partition when the amount
+    tolerance or date window reaches across a boundary, so each blocking-window
+    pair meets in exactly one task.
+
+    Returns (tx_task, pay_idx, pay_task): the task of each transaction and the
+    de-duplicated (payment, task) assignments.
+    """
+    tx_amount = np.asarray(tx_amount, dtype=np.int64)
+    tx_day = np.asarray(tx_day, dtype=np.int64)
+    pay_amount = np.asarray(pay_amount, dtype=np.int64)
+    pay_day = np.asarray(pay_day, dtype=np.int64)
+    n_tasks = max(1, int(n_tasks))
+    tol = max(0, int(amount_tolerance_cents))
+    w = int(date_window_days)
+
+    if tol == 0:
+        # Equal amounts only: the amount itself is the bucket and nothing crosses over.
+        amount_width = 1
+    else:
+        amount_width = max(int(amount_bucket_cents), 2 * tol + 1)
+    tx_ab = np.floor_divide(tx_amount, amount_width)
+    pay_ab = np.floor_divide(pay_amount, amount_width)
+    amount_moves = [(0, np.ones(len(pay_amount), dtype=bool))]
+    if tol > 0:
+        amount_moves = _offsets(pay_amount, pay_ab, amount_width, 0, tol)
+
+    day0 = int(min(tx_day.min(), pay_day.min()))
+    if w > 0:
+        block = max(int(date_block_days), 2 * w + 1)
+        tx_db = np.floor_divide(tx_day - day0, block)
+        pay_db = np.floor_divide(pay_day - day0, block)
+        date_moves = _offsets(pay_day, pay_db, block, day0, w)
+    else:
+        # No date filter: dates cannot split the work.
+        tx_db = np.zeros(len(tx_day), dtype=np.int64)
+        pay_db = np.zeros(len(pay_day), dtype=np.int64)
+        date_moves = [(0, np.ones(len(pay_day), dtype=bool))]
+
+    def task_of(ab: np.ndarray, db: np.ndarray) -> np.ndarray:
+        return np.mod(ab * _KEY_STRIDE + db, n_tasks)
+
+    tx_task = task_of(tx_ab, tx_db)
+    pay_idx_parts = []
+    pay_task_parts = []
+    for da, amask in amount_moves:
+        for dd, dmask in date_moves:
+            m = np.flatnonzero(amask & dmask)
+            pay_idx_parts.append(m)
+            pay_task_parts.append(task_of(pay_ab[m] + da, pay_db[m] + dd))
+    pay_idx = np.concatenate(pay_idx_parts)
+    pay_task = np.concatenate(pay_task_parts)
+    # Neighbouring partitions can hash to the same task; keep one copy.
+    keep = np.unique(pay_idx * n_tasks + pay_task, return_index=True)[1]
+    return tx_task, pay_idx[keep], pay_task[keep]
+
+# Per-process similarity snapshot, installed once by the pool initializer.
+_worker_known: Optional[Dict[Tuple[str, str], float]] = None
+
+def _init_worker(known: Optional[Dict[Tuple[str, str], float]]) -> None:
+    global _worker_known
+    _worker_known = known
+
+def _task_candidates(args) -> Tuple[pd.DataFrame, Dict[Tuple[str, str], float], Set[Tuple[str, str]]]:
+    from .matching import build_candidates
+
+    batch_id, tx, pay, params = args
+    cache = MemorySimilarityCache(dict(_worker_known)) if _worker_known is not None else None
+    cand = build_candidates(
+        batch_id=batch_id,
+        fact_transactions=tx,
+        fact_vendor_payments=pay,
+        similarity_workers=1,  # the process pool already uses the cores
+        similarity_cache=cache,
+        **params,
+    )
+    if cache is None:
+        return cand, {}, set()
+    return cand, cache.added, cache.used
+
+def build_candidates_parallel(
+    batch_id: str,
+    fact_transactions: pd.DataFrame,
+    fact_vendor_payments: pd.DataFrame,
+    date_window_days: int,
+    amount_tolerance_cents: int,
+    w_vendor: float,
+    w_date: float,
+    w_amount: float,
+    n_workers: int,
+    amount_bucket_cents: int = 10000,
+    date_block_days: int = 31,
+    similarity_cache: Optional[VendorSimilarityCache] = None,
+    top_k: int = 0,
+    score_floor: float = 0.0,
+) -> pd.DataFrame:
+    """``matching.build_candidates`` split into independent blocks on a process pool.
+
+    Results are merged back into the serial (transaction, payment) order, so the
+    output is identical to the single-process path. With a similarity cache, the
+    cached pairs for this batch's vendors are shipped to each worker once; the
+    workers never touch SQLite and the parent writes back new pairs.
+    """
+    from .matching import _to_day, _to_dt, build_candidates
+
+    params = dict(
+        date_window_days=date_window_days,
+        amount_tolerance_cents=amount_tolerance_cents,
+        w_vendor=w_vendor,
+        w_date=w_date,
+        w_amount=w_amount,
+        top_k=top_k,
+        score_floor=score_floor,
+    )
+    if fact_transactions.empty or fact_vendor_payments.empty or n_workers <= 1:
+        return build_candidates(batch_id, fact_transactions, fact_vendor_payments,
+                                similarity_cache=similarity_cache, **params)
+
+    tx = fact_transactions[_to_dt(fact_transactions["date"]).notna() & fact_transactions["amount_cents"].notna()]
+    pay = fact_vendor_payments[_to_dt(fact_vendor_payments["date"]).notna() & fact_vendor_payments["amount_cents"].notna()]
+    if tx.empty or pay.empty:
+        return build_candidates(batch_id, tx, pay, **params)
+
+    n_tasks = int(n_workers) * 4
+    tx_task, pay_idx, pay_task = partition_tasks(
+        tx["amount_cents"].astype("int64").to_numpy(), _to_day(_to_dt(tx["date"])),
+        pay["amount_cents"].astype("int64").to_numpy(), _to_day(_to_dt(pay["date"])),
+        date_window_days, amount_tolerance_cents, n_tasks,
+        amount_bucket_cents=amount_bucket_cents, date_block_days=date_block_days,
+    )
+
+    jobs = []
+    for task in range(n_tasks):
+        t_rows = np.flatnonzero(tx_task == task)
+        p_rows = np.sort(pay_idx[pay_task == task])
+        if len(t_rows) and len(p_rows):
+            jobs.append((batch_id, tx.iloc[t_rows], pay.iloc[p_rows], params))
+
+    known = None
+    if similarity_cache is not None:
+        known = similarity_cache.snapshot(
+            tx["vendor_id"].dropna().unique() if "vendor_id" in tx.columns else [],
+            pay["vendor_id"].dropna().unique() if "vendor_id" in pay.columns else [],
+        )
+
+    parts = []
+    added: Dict[Tuple[str, str], float] = {}
+    used: Set[Tuple[str, str]] = set()
+    with ProcessPoolExecutor(max_workers=int(n_workers), initializer=_init_worker, initargs=(known,)) as pool:
+        for cand, new_pairs, hit_pairs in pool.map(_task_candidates, jobs):
+            if not cand.empty:
+                parts.append(cand)
+            added.update(new_pairs)
+            used.update(hit_pairs)
+
+    if similarity_cache is not None:
+        similarity_cache.hits += len(used)
+        similarity_cache.misses += len(added)
+        similarity_cache.touch(sorted(used))
+        if added:
+            keys = sorted(added)
+            similarity_cache.store(
+                np.array([k[0] for k in keys], dtype=object),
+                np.array([k[1] for k in keys], dtype=object),
+                np.array([added[k] for k in keys], dtype=np.float64),
+            )
+    if not parts:
+        return build_candidates(batch_id, tx.iloc[:0], pay.iloc[:0], **params)
+
+    # Deterministic merge: restore the serial (transaction, payment) order.
+    merged = pd.concat(parts, ignore_index=True)
+    tx_pos = pd.Index(tx["txn_id"]).get_indexer(merged["txn_id"])
+    pay_pos = pd.Index(pay["pay_id"]).get_indexer(merged["pay_id"])
+    merged = merged.iloc[np.lexsort((pay_pos, tx_pos))].reset_index(drop=True)
+    # A payment can sit in several tasks, so its top-K is only final after the merge.
+    return prune_per_payment(merged, top_k)
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
 
 from .config import load_config
 from .ingest import ingest_all
@@ -9,10 +11,12 @@ from .mapping import map_all
 from .cleaning import clean_all
 from .normalization import normalize_all
 from .modeling import model_all
-from .qa_stage import qa_all
+from .qa_stage import qa_all, qa_metrics_summary
 from .matching import match_all
-from .exceptions import exceptions_all
+from .incremental import rematch_incremental
+from .exceptions import exception_drilldown, exceptions_all
 from .reporting import reports_all
+from .spend_cube import spend_trends_all
 from .excel_dashboard import build_excel
 
 def run_ingest(repo_root: Path, config_path: Path, export_csv: bool = False) -> Dict[str, int]:
@@ -39,18 +43,52 @@ def run_qa(repo_root: Path, config_path: Path, batch_id: Optional[str] = None, e
     cfg = load_config(config_path)
     return qa_all(repo_root=repo_root, cfg=cfg, batch_id=batch_id, export_csv=export_csv)
 
+def run_qa_metrics(repo_root: Path, config_path: Path, batch_id: Optional[str] = None) -> pd.DataFrame:
+    cfg = load_config(config_path)
+    return qa_metrics_summary(repo_root=repo_root, cfg=cfg, batch_id=batch_id)
+
 def run_match(repo_root: Path, config_path: Path, batch_id: Optional[str] = None, export_csv: bool = False) -> Dict[str, int]:
     cfg = load_config(config_path)
     return match_all(repo_root=repo_root, cfg=cfg, batch_id=batch_id, export_csv=export_csv)
 
+def run_rematch(
+    repo_root: Path,
+    config_path: Path,
+    batch_id: Optional[str] = None,
+    txn_ids: Optional[List[str]] = None,
+    pay_ids: Optional[List[str]] = None,
+) -> Dict[str, int]:
+    cfg = load_config(config_path)
+    return rematch_incremental(repo_root=repo_root, cfg=cfg, batch_id=batch_id, txn_ids=txn_ids, pay_ids=pay_ids)
+
 def run_exceptions(repo_root: Path, config_path: Path, batch_id: Optional[str] = None, export_csv: bool = False) -> Dict[str, int]:
     cfg = load_config(config_path)
     return exceptions_all(repo_root=repo_root, cfg=cfg, batch_id=batch_id, export_csv=export_csv)
 
+def run_exception_drilldown(repo_root: Path, config_path: Path, code: str, batch_id: Optional[str] = None) -> pd.DataFrame:
+    cfg = load_config(config_path)
+    return exception_drilldown(repo_root=repo_root, cfg=cfg, code=code, batch_id=batch_id)
+
 def run_reports(repo_root: Path, config_path: Path, batch_id: Optional[str] = None, export_csv: bool = False) -> Dict[str, int]:
     cfg = load_config(config_path)
     return reports_all(repo_root=repo_root, cfg=cfg, batch_id=batch_id, export_csv=export_csv)
 
+def run_spend_trends(
+    repo_root: Path,
+    config_path: Path,
+    by: Sequence[str] = ("month", "source", "currency"),
+    start_month: Optional[str] = None,
+    end_month: Optional[str] = None,
+    source: Optional[str] = None,
+    currency: Optional[str] = None,
+    vendor_id: Optional[str] = None,
+) -> pd.DataFrame:
+    cfg = load_config(config_path)
+    return spend_trends_all(
+        repo_root=repo_root, cfg=cfg, by=by, start_month=start_month, end_month=end_month,
+        source=source, currency=currency, vendor_id=vendor_id,
+    )
+
 def run_excel(repo_root: Path, config_path: Path, batch_id: Optional[str] = None) -> Dict[str, str]:
     cfg = load_config(config_path)
     return build_excel(repo_root=repo_root, cfg=cfg, batch_id=batch_id)
@@ -0,0 +1,374 @@
+from __future__ import annotations
+
+import math
+import re
+import sqlite3
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+if TYPE_CHECKING:
+    from .qa_checks import PolicyRule
+
+COMPARE_OPS = (">", ">=", "<", "<=", "==", "!=")
+VALUE_SEPARATOR = "|"  # separates 'in' members and 'between' bounds in the value column
+_SQL_OPS = {">": ">", ">=": ">=", "<": "<", "<=": "<=", "==": "=", "!=": "!="}
+_SIDES = (
+    ("transactions", "fact_transactions", "txn_id"),
+    ("vendor_payments", "fact_vendor_payments", "pay_id"),
+)
+_RECORD_COLUMNS = ("vendor_canonical", "vendor_id", "date", "amount_cents", "source_file", "source_row_number", "row_hash")
+_FLAG_COLUMNS = ("batch_id", "record_type", "record_id", "flag_code", "severity", "message") + _RECORD_COLUMNS + ("created_at_utc",)
+
+@dataclass(frozen=True)
+class VendorValue:
+    vendor_id: str
+    low: float  # threshold, or lower bound for 'between'
+    high: float  # upper bound for 'between', NaN otherwise
+    message: str
+
+@dataclass(frozen=True)
+class CompiledRule:
+    """A policy rule with its value parsed once; per-vendor rules are folded into one."""
+    flag_code: str
+    field: str
+    op: str
+    severity: str
+    applies_to: str
+    message: str
+    text: str = ""  # raw value, for string compares
+    low: float = math.nan  # numeric value or lower bound; NaN when not numeric
+    high: float = math.nan
+    items: Tuple[str, ...] = ()  # 'in' members
+    item_numbers: Tuple[float, ...] = ()  # 'in' members as numbers, empty unless all are numeric
+    pattern: Optional[str] = None  # 'regex'
+    has_default: bool = True  # False when the rule only has vendor-specific values
+    vendors: Tuple[VendorValue, ...] = ()
+
+def _number(value: str) -> float:
+    return float(pd.to_numeric(pd.Series([value]), errors="coerce").iloc[0])
+
+def _default_message(rule: "PolicyRule") -> str:
+    return rule.message or f"Policy rule hit: {rule.field} {rule.op} {rule.value}"
+
+def _bounds(rule: "PolicyRule") -> Tuple[float, float]:
+    if rule.op == "between":
+        parts = rule.value.split(VALUE_SEPARATOR)
+        low, high = (_number(p) for p in parts) if len(parts) == 2 else (math.nan, math.nan)
+        if math.isnan(low) or math.isnan(high):
+            raise ValueError(f"Policy rule {rule.flag_code}: 'between' expects 'low{VALUE_SEPARATOR}high', got {rule.value!r}")
+        return low, high
+    return _number(rule.value), math.nan
+
+def _compile_one(rule: "PolicyRule") -> CompiledRule:
+    base = dict(flag_code=rule.flag_code, field=rule.field, op=rule.op, severity=rule.severity,
+                applies_to=rule.applies_to, message=_default_message(rule), text=rule.value)
+    if rule.op in COMPARE_OPS:
+        return CompiledRule(**base, low=_number(rule.value))
+    if rule.op == "in":
+        items = tuple(v.strip() for v in rule.value.split(VALUE_SEPARATOR))
+        numbers = tuple(_number(v) for v in items)
+        return CompiledRule(**base, items=items, item_numbers=() if any(math.isnan(n) for n in numbers) else numbers)
+    if rule.op == "between":
+        low, high = _bounds(rule)
+        return CompiledRule(**base, low=low, high=high)
+    if rule.op == "regex":
+        try:
+            re.compile(rule.value)
+        except re.error as e:
+            raise ValueError(f"Policy rule {rule.flag_code}: invalid regex {rule.value!r}: {e}") from e
+        return CompiledRule(**base, pattern=rule.value)
+    # Unknown operators never fire, as before.
+    return CompiledRule(**base)
+
+def compile_policy_rules(rules: Sequence["PolicyRule"]) -> List[CompiledRule]:
+    """Parse a rule set once.
+
+    Rules that share flag code, field, operator, severity and scope but carry a
+    ``vendor_id`` are folded into one rule with a threshold per vendor; a rule
+    of the same group without ``vendor_id`` is the default for other vendors.
+    The folded rule takes the position of the group's first rule.
+    """
+    def key(r: "PolicyRule") -> tuple:
+        return (r.flag_code, r.field, r.op, r.severity, r.applies_to)
+
+    per_vendor = {key(r) for r in rules if r.vendor_id}
+    out: List[Union[CompiledRule, tuple]] = []
+    groups: Dict[tuple, Dict[str, "PolicyRule"]] = {}
+    for r in rules:
+        k = key(r)
+        if k not in per_vendor:
+            out.append(_compile_one(r))
+            continue
+        if r.op not in COMPARE_OPS + ("between",):
+            raise ValueError(f"Policy rule {r.flag_code}: vendor_id needs a numeric comparison or 'between', got {r.op!r}")
+        if k not in groups:
+            groups[k] = {}
+            out.append(k)
+        if r.vendor_id in groups[k]:
+            raise ValueError(f"Policy rule {r.flag_code}: more than one value for vendor_id {r.vendor_id!r}")
+        groups[k][r.vendor_id] = r
+
+    compiled: List[CompiledRule] = []
+    for item in out:
+        if isinstance(item, CompiledRule):
+            compiled.append(item)
+            continue
+        members = groups[item]
+        vendors = []
+        for vendor_id, r in members.items():
+            low, high = _bounds(r)
+            if math.isnan(low):
+                raise ValueError(f"Policy rule {r.flag_code}: per-vendor value must be numeric, got {r.value!r}")
+            if vendor_id:
+                vendors.append(VendorValue(vendor_id=vendor_id, low=low, high=high, message=_default_message(r)))
+        default = members.get("")
+        first = next(iter(members.values()))
+        low, high = _bounds(default) if default is not None else (math.nan, math.nan)
+        compiled.append(CompiledRule(
+            flag_code=first.flag_code, field=first.field, op=first.op, severity=first.severity,
+            applies_to=first.applies_to, message=_default_message(default) if default is not None else "",
+            low=low, high=high, has_default=default is not None, vendors=tuple(vendors),
+        ))
+    return compiled
+
+class FieldCache:
+    """Numeric and text conversions of a frame's columns, computed once per field."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._numbers: Dict[str, pd.Series] = {}
+        self._texts: Dict[str, pd.Series] = {}
+        self._any_number: Dict[str, bool] = {}
+
+    def number(self, field: str) -> pd.Series:
+        if field not in self._numbers:
+            self._numbers[field] = pd.to_numeric(self.df[field], errors="coerce")
+        return self._numbers[field]
+
+    def text(self, field: str) -> pd.Series:
+        if field not in self._texts:
+            self._texts[field] = self.df[field].astype(str)
+        return self._texts[field]
+
+    def any_number(self, field: str) -> bool:
+        if field not in self._any_number:
+            self._any_number[field] = bool(self.number(field).notna().any())
+        return self._any_number[field]
+
+def _numeric_compare(s: pd.Series, op: str, v) -> pd.Series:
+    if op == ">": return s > v
+    if op == ">=": return s >= v
+    if op == "<": return s < v
+    if op == "<=": return s <= v
+    if op == "==": return s == v
+    return s != v
+
+def evaluate_rule(rule: CompiledRule, cache: FieldCache) -> Tuple[pd.Series, Union[str, pd.Series]]:
+    """(hit mask, message) of one rule over the cached frame; per-vendor rules give a message per row."""
+    df = cache.df
+    none = pd.Series(False, index=df.index)
+    if rule.vendors:
+        vendor = df["vendor_id"] if "vendor_id" in df.columns else pd.Series(None, index=df.index, dtype=object)
+        low = vendor.map({v.vendor_id: v.low for v in rule.vendors}).astype(float)
+        high = vendor.map({v.vendor_id: v.high for v in rule.vendors}).astype(float)
+        message = vendor.map({v.vendor_id: v.message for v in rule.vendors}).astype(object)
+        if rule.has_default:
+            unlisted = low.isna()
+            low, high = low.where(~unlisted, rule.low), high.where(~unlisted, rule.high)
+            message = message.where(~unlisted, rule.message)
+        s = cache.number(rule.field)
+        if rule.op == "between":
+            hit = (s >= low) & (s <= high)
+        else:
+            hit = _numeric_compare(s, rule.op, low)
+        return low.notna() & hit, message
+
+    if rule.op in COMPARE_OPS:
+        # Numeric compare if possible, else string compare (== and != only).
+        if not math.isnan(rule.low) and cache.any_number(rule.field):
+            return _numeric_compare(cache.number(rule.field), rule.op, rule.low), rule.message
+        if rule.op == "==":
+            return cache.text(rule.field) == rule.text, rule.message
+        if rule.op == "!=":
+            return cache.text(rule.field) != rule.text, rule.message
+        return none, rule.message
+    if rule.op == "in":
+        if rule.item_numbers and cache.any_number(rule.field):
+            return cache.number(rule.field).isin(rule.item_numbers), rule.message
+        return cache.text(rule.field).isin(rule.items), rule.message
+    if rule.op == "between":
+        return cache.number(rule.field).between(rule.low, rule.high), rule.message
+    if rule.op == "regex":
+        values = df[rule.field]
+        return values.notna() & cache.text(rule.field).str.contains(rule.pattern, regex=True, na=False), rule.message
+    return none, rule.message
+
+def _sql_number(value):
+    """SQLite counterpart of ``pd.to_numeric(errors="coerce")`` for one value."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str) and "_" not in value:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+def _sql_regexp(pattern: str, value) -> int:
+    return 0 if value is None else int(re.search(pattern, str(value)) is not None)
+
+def register_sql_functions(conn: sqlite3.Connection) -> None:
+    """Deterministic helpers used by the generated SQL (``reconworks_num`` and ``REGEXP``)."""
+    conn.create_function("reconworks_num", 1, _sql_number, deterministic=True)
+    conn.create_function("regexp", 2, _sql_regexp, deterministic=True)
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def policy_flags_sql(
+    conn: sqlite3.Connection,
+    rules: Sequence[CompiledRule],
+    batch_id: str,
+    created_at: str,
+    rule_hits: Optional[Dict[Tuple[str, int], int]] = None,
+) -> Tuple[Optional[str], Dict[str, object]]:
+    """One ``SELECT`` evaluating every rule inside SQLite.
+
+    Each fact table is crossed with the list of rules that apply to it and a
+    ``CASE`` on the rule number picks that rule's condition. Besides the
+    ``qa_flags`` columns each row carries ``side``, ``rule_no`` and
+    ``row_no``; ordering by them gives the pandas path's order (transactions
+    first, then rule order, then fact row order). ``rule_hits``, when given,
+    gets a 0 entry per evaluated (record_type, rule_no). Returns (None, {})
+    when no rule applies.
+    """
+    params: Dict[str, object] = {"batch_id": batch_id, "created_at": created_at}
+
+    def bind(value) -> str:
+        name = f"p{len(params)}"
+        params[name] = value
+        return f":{name}"
+
+    any_number_cache: Dict[Tuple[str, str], bool] = {}
+    selects = []
+    for side, (rtype, table, id_col) in enumerate(_SIDES):
+        columns = {row[1]: (row[2] or "").upper() for row in conn.execute(f"PRAGMA table_info({table});")}
+        if not columns:
+            continue
+
+        def number(field: str) -> str:
+            if columns[field] in ("INTEGER", "REAL"):
+                return f"f.{_quote(field)}"
+            return f"reconworks_num(f.{_quote(field)})"
+
+        def text(field: str) -> str:
+            return f"CAST(f.{_quote(field)} AS TEXT)"
+
+        def any_number(field: str) -> bool:
+            k = (table, field)
+            if k not in any_number_cache:
+                any_number_cache[k] = bool(conn.execute(
+                    f"SELECT EXISTS (SELECT 1 FROM {table} f WHERE f.batch_id = ? AND {number(field)} IS NOT NULL);",
+                    (batch_id,),
+                ).fetchone()[0])
+            return any_number_cache[k]
+
+        def by_vendor(rule: CompiledRule, attr: str, default) -> str:
+            fallback = bind(default) if rule.has_default else "NULL"
+            if "vendor_id" not in columns:
+                return fallback
+            whens = " ".join(f"WHEN {bind(v.vendor_id)} THEN {bind(getattr(v, attr))}" for v in rule.vendors)
+            return f"(CASE f.vendor_id {whens} ELSE {fallback} END)"
+
+        branches = []  # (rule number, condition, message expression)
+        for n, rule in enumerate(rules):
+            if rule.applies_to not in ("both", rtype) or rule.field not in columns or not rule.op:
+                continue
+            s = number(rule.field)
+            message = bind(rule.message)
+            if rule.vendors:
+                low = by_vendor(rule, "low", rule.low)
+                message = by_vendor(rule, "message", rule.message)
+                if rule.op == "between":
+                    cond = f"{low} IS NOT NULL AND {s} BETWEEN {low} AND {by_vendor(rule, 'high', rule.high)}"
+                elif rule.op == "!=":
+                    cond = f"{low} IS NOT NULL AND ({s} IS NULL OR {s} != {low})"
+                else:
+                    cond = f"{s} {_SQL_OPS[rule.op]} {low}"
+            elif rule.op in COMPARE_OPS:
+                if not math.isnan(rule.low) and any_number(rule.field):
+                    v = bind(rule.low)
+                    cond = f"({s} IS NULL OR {s} != {v})" if rule.op == "!=" else f"{s} {_SQL_OPS[rule.op]} {v}"
+                elif rule.op == "==":
+                    cond = f"{text(rule.field)} = {bind(rule.text)}"
+                elif rule.op == "!=":
+                    cond = f"{text(rule.field)} IS NOT {bind(rule.text)}"
+                else:
+                    continue
+            elif rule.op == "in":
+                if rule.item_numbers and any_number(rule.field):
+                    cond = f"{s} IN ({', '.join(bind(v) for v in rule.item_numbers)})"
+                else:
+                    cond = f"{text(rule.field)} IN ({', '.join(bind(v) for v in rule.items)})"
+            elif rule.op == "between":
+                cond = f"{s} BETWEEN {bind(rule.low)} AND {bind(rule.high)}"
+            elif rule.op == "regex":
+                cond = f"f.{_quote(rule.field)} REGEXP {bind(rule.pattern)}"
+            else:
+                continue
+            branches.append((n, rule, cond, message))
+            if rule_hits is not None:
+                rule_hits[(rtype, n)] = 0
+        if not branches:
+            continue
+
+        def case(expr: Callable[[int, CompiledRule, str, str], str]) -> str:
+            return "CASE r.column1 " + " ".join(f"WHEN {b[0]} THEN {expr(*b)}" for b in branches) + " END"
+
+        record = ", ".join(f"{'f.' + _quote(c) if c in columns else 'NULL'} AS {c}" for c in _RECORD_COLUMNS)
+        rule_list = ", ".join(f"({b[0]})" for b in branches)
+        selects.append(
+            f"SELECT :batch_id AS batch_id, '{rtype}' AS record_type, f.{_quote(id_col)} AS record_id,"
+            f" {case(lambda n, rule, cond, msg: bind(rule.flag_code))} AS flag_code,"
+            f" {case(lambda n, rule, cond, msg: bind(rule.severity))} AS severity,"
+            f" {case(lambda n, rule, cond, msg: msg)} AS message,"
+            f" {record}, :created_at AS created_at_utc, {side} AS side, r.column1 AS rule_no, f.rowid AS row_no"
+            f" FROM {table} f CROSS JOIN (VALUES {rule_list}) r"
+            f" WHERE f.batch_id = :batch_id AND ({case(lambda n, rule, cond, msg: cond)})"
+        )
+    if not selects:
+        return None, {}
+    return " UNION ALL ".join(selects), params
+
+def insert_policy_flags(
+    conn: sqlite3.Connection,
+    rules: Sequence[CompiledRule],
+    batch_id: str,
+    created_at: str,
+    rule_hits: Optional[Dict[Tuple[str, int], int]] = None,
+) -> int:
+    """Evaluate the compiled rules for one batch inside SQLite; returns the number of flags written.
+
+    The flags go straight to ``qa_flags`` in one ``INSERT ... SELECT``. When
+    ``rule_hits`` is given it is filled with the hits per (record_type,
+    rule_no), zeros included, by a second read-only ``GROUP BY`` over the
+    same rule conditions.
+    """
+    register_sql_functions(conn)
+    hits: Dict[Tuple[str, int], int] = {}
+    sql, params = policy_flags_sql(conn, rules, batch_id, created_at, rule_hits=hits)
+    if sql is None:
+        return 0
+    cols = ", ".join(_FLAG_COLUMNS)
+    n = conn.execute(
+        f"INSERT INTO qa_flags ({cols}) SELECT {cols} FROM ({sql}) ORDER BY side, rule_no, row_no;", params
+    ).rowcount
+    if rule_hits is not None:
+        for rtype, rule_no, count in conn.execute(
+            f"SELECT record_type, rule_no, COUNT(*) FROM ({sql}) GROUP BY record_type, rule_no;", params
+        ).fetchall():
+            hits[(rtype, int(rule_no))] = int(count)
+        rule_hits.update(hits)
+    return int(n)
@@ -22,6 +22,8 @@ DEFAULT_DATASETS = (
     "unmatched_transactions.csv",
     "unmatched_vendor_payments.csv",
     "exceptions.csv",
+    "exceptions_delta.csv",
+    "exception_rollups.csv",
     "rpt_spend_by_month_vendor.csv",
     "rpt_match_rate_by_month.csv",
     "rpt_exceptions_by_code.csv",
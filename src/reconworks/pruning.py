@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from .assignment import greedy_order
+
+def top_k_mask(keys: np.ndarray, score: np.ndarray, vendor_sim: np.ndarray, k: int) -> np.ndarray:
+    """True for candidates ranked in the top ``k`` of their key (txn or pay).
+
+    Ranking is the greedy walk order: score desc, vendor_sim desc, input order.
+    """
+    n = len(keys)
+    if k <= 0 or n == 0:
+        return np.ones(n, dtype=bool)
+    order = greedy_order(score, vendor_sim)
+    order = order[np.argsort(np.asarray(keys)[order], kind="stable")]
+    grouped = np.asarray(keys)[order]
+    new_group = np.ones(n, dtype=bool)
+    new_group[1:] = grouped[1:] != grouped[:-1]
+    group_start = np.maximum.accumulate(np.where(new_group, np.arange(n), 0))
+    mask = np.zeros(n, dtype=bool)
+    mask[order] = (np.arange(n) - group_start) < k
+    return mask
+
+def prune_per_payment(candidates: pd.DataFrame, k: int) -> pd.DataFrame:
+    """Keep the top ``k`` candidates per pay_id (frame order is preserved)."""
+    if k <= 0 or candidates.empty:
+        return candidates
+    codes, _ = pd.factorize(candidates["pay_id"])
+    keep = top_k_mask(
+        codes,
+        candidates["score"].to_numpy(dtype=np.float64),
+        candidates["vendor_sim"].to_numpy(dtype=np.float64),
+        k,
+    )
+    return candidates[keep].reset_index(drop=True)
@@ -1,13 +1,17 @@
 from __future__ import annotations
 
 import csv
+import time
+import tracemalloc
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Optional, Union
 
 import numpy as np
 import pandas as pd
 
+from .policy_compiler import FieldCache, compile_policy_rules, evaluate_rule
 from .util import utc_now_iso
 
 @dataclass(frozen=True)
@@ -19,6 +23,7 @@ class PolicyRule:
     severity: str
     message: str
     applies_to: str  # "transactions", "vendor_payments", or "both"
+    vendor_id: str = ""  # set for a per-vendor threshold
 
 def load_policy_rules(path: Path) -> List[PolicyRule]:
     if not path.exists():
@@ -37,63 +42,129 @@ def load_policy_rules(path: Path) -> List[PolicyRule]:
                 severity=(row.get("severity") or "warning").strip(),
                 message=(row.get("message") or "").strip(),
                 applies_to=(row.get("applies_to") or "both").strip(),
+                vendor_id=(row.get("vendor_id") or "").strip(),
             ))
     return rules
 
 def _to_num(s: pd.Series) -> pd.Series:
     return pd.to_numeric(s, errors="coerce")
 
-def _compare(series: pd.Series, op: str, value: str) -> pd.Series:
-    # Numeric compare if possible
-    s_num = _to_num(series)
-    v_num = pd.to_numeric(pd.Series([value]), errors="coerce").iloc[0]
-    if not np.isnan(v_num) and s_num.notna().any():
-        if op == ">": return s_num > v_num
-        if op == ">=": return s_num >= v_num
-        if op == "<": return s_num < v_num
-        if op == "<=": return s_num <= v_num
-        if op == "==": return s_num == v_num
-        if op == "!=": return s_num != v_num
-    # Fallback string compare
-    s = series.astype(str)
-    v = str(value)
-    if op == "==": return s == v
-    if op == "!=": return s != v
-    return pd.Series([False] * len(series), index=series.index)
+# Record columns copied onto every flag, in qa_flags column order.
+_FLAG_RECORD_COLUMNS = ("vendor_canonical", "vendor_id", "date", "amount_cents", "source_file", "source_row_number", "row_hash")
+
+class QAProfiler:
+    """Per-check evaluation time, rows scanned, hits and (optionally) memory delta.
+
+    With ``trace_memory`` each check runs under tracemalloc and
+    ``memory_delta_bytes`` is the peak traced allocation above the level at the
+    start of the check. Tracing slows checks down, so it is off by default.
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.metrics: List[Dict[str, Any]] = []
+        self._current: Optional[Dict[str, Any]] = None
+
+    @contextmanager
+    def check(self, check_name: str, check_kind: str, record_type: str, rows_scanned: int,
+              rule_no: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        entry: Dict[str, Any] = {
+            "check_name": check_name,
+            "check_kind": check_kind,
+            "rule_no": rule_no,
+            "record_type": record_type,
+            "rows_scanned": int(rows_scanned),
+            "hits": 0,
+            "elapsed_ms": 0.0,
+            "memory_delta_bytes": None,
+        }
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        self._current = entry
+        t0 = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            entry["elapsed_ms"] = (time.perf_counter() - t0) * 1000.0
+            if self.trace_memory:
+                entry["memory_delta_bytes"] = int(tracemalloc.get_traced_memory()[1] - base)
+                if started_tracing:
+                    tracemalloc.stop()
+            self._current = None
+            self.metrics.append(entry)
+
+    def record(self, check_name: str, check_kind: str, record_type: str, rows_scanned: int, hits: int,
+               rule_no: Optional[int] = None) -> None:
+        """A metrics row for a check that was not timed on its own (elapsed and memory stay empty)."""
+        self.metrics.append({
+            "check_name": check_name,
+            "check_kind": check_kind,
+            "rule_no": rule_no,
+            "record_type": record_type,
+            "rows_scanned": int(rows_scanned),
+            "hits": int(hits),
+            "elapsed_ms": None,
+            "memory_delta_bytes": None,
+        })
+
+    def add_hits(self, n: int) -> None:
+        if self._current is not None:
+            self._current["hits"] += int(n)
+
+def flag_frame(
+    df: pd.DataFrame,
+    batch_id: str,
+    record_type: str,
+    id_col: str,
+    cond: pd.Series,
+    code: str,
+    severity: str,
+    message: Union[str, pd.Series],
+    created_at: str,
+) -> Optional[pd.DataFrame]:
+    """qa_flags rows for the rows of ``df`` where ``cond`` holds, or None when there are none."""
+    if df.empty:
+        return None
+    mask = cond.fillna(False)
+    hit = df[mask]
+    if hit.empty:
+        return None
+    def col(name: str):
+        return hit[name].to_numpy(dtype=object) if name in hit.columns else None
+    return pd.DataFrame({
+        "batch_id": batch_id,
+        "record_type": record_type,
+        "record_id": col(id_col),
+        "flag_code": code,
+        "severity": severity,
+        "message": message if isinstance(message, str) else message[mask].to_numpy(dtype=object),
+        **{name: col(name) for name in _FLAG_RECORD_COLUMNS},
+        "created_at_utc": created_at,
+    }, index=pd.RangeIndex(len(hit)))
 
 def run_qa_for_batch(
     batch_id: str,
     fact_transactions: pd.DataFrame,
     fact_vendor_payments: pd.DataFrame,
     policy_rules: List[PolicyRule],
+    created_at: Optional[str] = None,
+    profiler: Optional[QAProfiler] = None,
 ) -> pd.DataFrame:
-    """Generate QA flags (no DB I/O)."""
-    created_at = utc_now_iso()
-    flags: List[Dict[str, Any]] = []
+    """Generate QA flags (no DB I/O); per-check metrics go to ``profiler`` when given."""
+    created_at = created_at or utc_now_iso()
+    frames: List[pd.DataFrame] = []
+    prof = profiler or QAProfiler()
 
-    def add_flags(df: pd.DataFrame, record_type: str, id_col: str, cond: pd.Series, code: str, severity: str, message: str):
-        if df.empty:
-            return
-        hit = df[cond.fillna(False)].copy()
-        if hit.empty:
-            return
-        for _, r in hit.iterrows():
-            flags.append({
-                "batch_id": batch_id,
-                "record_type": record_type,
-                "record_id": r.get(id_col),
-                "flag_code": code,
-                "severity": severity,
-                "message": message,
-                "vendor_canonical": r.get("vendor_canonical"),
-                "vendor_id": r.get("vendor_id"),
-                "date": r.get("date"),
-                "amount_cents": r.get("amount_cents"),
-                "source_file": r.get("source_file"),
-                "source_row_number": r.get("source_row_number"),
-                "row_hash": r.get("row_hash"),
-                "created_at_utc": created_at,
-            })
+    def add_flags(df: pd.DataFrame, record_type: str, id_col: str, cond: pd.Series, code: str, severity: str, message: Union[str, pd.Series]):
+        frame = flag_frame(df, batch_id, record_type, id_col, cond, code, severity, message, created_at)
+        if frame is not None:
+            frames.append(frame)
+            prof.add_hits(len(frame))
 
     # Missing field checks
     for df, rtype, idcol in [
@@ -102,9 +173,12 @@ def run_qa_for_batch(
     ]:
         if df.empty:
             continue
-        add_flags(df, rtype, idcol, df["vendor_canonical"].isna() | (df["vendor_canonical"].astype(str).str.strip() == ""), "MISSING_VENDOR", "error", "Missing vendor after normalization.")
-        add_flags(df, rtype, idcol, df["date"].isna() | (df["date"].astype(str).str.strip() == ""), "MISSING_DATE", "error", "Missing parsed date.")
-        add_flags(df, rtype, idcol, df["amount_cents"].isna(), "MISSING_AMOUNT", "error", "Missing parsed amount_cents.")
+        with prof.check("MISSING_VENDOR", "builtin", rtype, len(df)):
+            add_flags(df, rtype, idcol, df["vendor_canonical"].isna() | (df["vendor_canonical"].astype(str).str.strip() == ""), "MISSING_VENDOR", "error", "Missing vendor after normalization.")
+        with prof.check("MISSING_DATE", "builtin", rtype, len(df)):
+            add_flags(df, rtype, idcol, df["date"].isna() | (df["date"].astype(str).str.strip() == ""), "MISSING_DATE", "error", "Missing parsed date.")
+        with prof.check("MISSING_AMOUNT", "builtin", rtype, len(df)):
+            add_flags(df, rtype, idcol, df["amount_cents"].isna(), "MISSING_AMOUNT", "error", "Missing parsed amount_cents.")
 
     # Duplicate likely
     def dup(df: pd.DataFrame, rtype: str, idcol: str):
@@ -116,12 +190,15 @@ def run_qa_for_batch(
             return
         counts = base.groupby(gcols)[idcol].transform("count")
         add_flags(base, rtype, idcol, counts > 1, "DUPLICATE_LIKELY", "warning", "Potential duplicate: same vendor, date, and amount.")
-    dup(fact_transactions, "transactions", "txn_id")
-    dup(fact_vendor_payments, "vendor_payments", "pay_id")
+    with prof.check("DUPLICATE_LIKELY", "builtin", "transactions", len(fact_transactions)):
+        dup(fact_transactions, "transactions", "txn_id")
+    with prof.check("DUPLICATE_LIKELY", "builtin", "vendor_payments", len(fact_vendor_payments)):
+        dup(fact_vendor_payments, "vendor_payments", "pay_id")
 
     # Weekend
     if not fact_transactions.empty and "is_weekend" in fact_transactions.columns:
-        add_flags(fact_transactions, "transactions", "txn_id", fact_transactions["is_weekend"].astype(str) == "1", "WEEKEND_TRANSACTION", "info", "Transaction date is on a weekend.")
+        with prof.check("WEEKEND_TRANSACTION", "builtin", "transactions", len(fact_transactions)):
+            add_flags(fact_transactions, "transactions", "txn_id", fact_transactions["is_weekend"].astype(str) == "1", "WEEKEND_TRANSACTION", "info", "Transaction date is on a weekend.")
 
     # Outlier
     def outlier(df: pd.DataFrame, rtype: str, idcol: str):
@@ -132,22 +209,29 @@ def run_qa_for_batch(
             return
         thr = 200000 if len(s) < 20 else float(np.percentile(s, 99))
         add_flags(df, rtype, idcol, _to_num(df["amount_cents"]) > thr, "AMOUNT_OUTLIER", "warning", f"Amount is unusually high (threshold: {int(thr)} cents).")
-    outlier(fact_transactions, "transactions", "txn_id")
-    outlier(fact_vendor_payments, "vendor_payments", "pay_id")
+    with prof.check("AMOUNT_OUTLIER", "builtin", "transactions", len(fact_transactions)):
+        outlier(fact_transactions, "transactions", "txn_id")
+    with prof.check("AMOUNT_OUTLIER", "builtin", "vendor_payments", len(fact_vendor_payments)):
+        outlier(fact_vendor_payments, "vendor_payments", "pay_id")
 
-    # Policy rules
+    # Policy rules: parsed once, conversions cached per frame and field
+    compiled = compile_policy_rules(policy_rules)
     def apply(df: pd.DataFrame, rtype: str, idcol: str):
         if df.empty:
             return
-        for rule in policy_rules:
+        cache = FieldCache(df)
+        for n, rule in enumerate(compiled):
             if rule.applies_to not in ("both", rtype):
                 continue
             if rule.field not in df.columns or not rule.op:
                 continue
-            cond = _compare(df[rule.field], rule.op, rule.value)
-            msg = rule.message or f"Policy rule hit: {rule.field} {rule.op} {rule.value}"
-            add_flags(df, rtype, idcol, cond, rule.flag_code, rule.severity, msg)
+            with prof.check(rule.flag_code, "policy", rtype, len(df), rule_no=n):
+                cond, msg = evaluate_rule(rule, cache)
+                add_flags(df, rtype, idcol, cond, rule.flag_code, rule.severity, msg)
     apply(fact_transactions, "transactions", "txn_id")
     apply(fact_vendor_payments, "vendor_payments", "pay_id")
 
-    return pd.DataFrame(flags)
+    if not frames:
+        return pd.DataFrame()
+    # One concat at the end; object columns let pandas infer dtypes as it did per-row.
+    return pd.concat(frames, ignore_index=True).infer_objects()
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 
 import pandas as pd
 
@@ -10,10 +10,14 @@ from .db import (
     connect,
     create_qa_runs_table,
     create_qa_flags_table,
+    create_qa_rule_metrics_table,
     latest_batch_id,
     delete_where_batch,
 )
-from .qa_checks import load_policy_rules, run_qa_for_batch
+from .duplicates import cross_batch_duplicate_flags
+from .outliers import vendor_outlier_flags
+from .policy_compiler import compile_policy_rules, insert_policy_flags
+from .qa_checks import QAProfiler, load_policy_rules, run_qa_for_batch
 from .util import utc_now_iso, ensure_dir
 
 def qa_all(repo_root: Path, cfg: ProjectConfig, batch_id: Optional[str] = None, export_csv: bool = False) -> Dict[str, int]:
@@ -24,34 +28,102 @@ def qa_all(repo_root: Path, cfg: ProjectConfig, batch_id: Optional[str] = None,
     conn = connect(repo_root / cfg.database_path)
     create_qa_runs_table(conn)
     create_qa_flags_table(conn)
+    create_qa_rule_metrics_table(conn)
 
     b = batch_id or latest_batch_id(conn)
     if not b:
         conn.close()
         return {"qa_flags": 0}
 
-    ft = pd.read_sql_query("SELECT * FROM fact_transactions WHERE batch_id=?", conn, params=(b,))
-    fp = pd.read_sql_query("SELECT * FROM fact_vendor_payments WHERE batch_id=?", conn, params=(b,))
+    if cfg.qa.policy_engine not in ("pandas", "sql"):
+        conn.close()
+        raise ValueError("policy_engine must be 'pandas' or 'sql'")
+    policy_in_sql = cfg.qa.policy_engine == "sql"
+
+    ft = pd.read_sql_query("SELECT * FROM fact_transactions WHERE batch_id=? ORDER BY rowid", conn, params=(b,))
+    fp = pd.read_sql_query("SELECT * FROM fact_vendor_payments WHERE batch_id=? ORDER BY rowid", conn, params=(b,))
 
-    rules = load_policy_rules(repo_root / cfg.policy_rules_path)
+    rules = load_policy_rules(repo_root / cfg.reference.policy_rules_path)
+    created_at = utc_now_iso()
+    profiler = QAProfiler(trace_memory=cfg.qa.profile_memory)
+    batch_rows = len(ft) + len(fp)
 
-    flags = run_qa_for_batch(batch_id=b, fact_transactions=ft, fact_vendor_payments=fp, policy_rules=rules)
+    flags = run_qa_for_batch(batch_id=b, fact_transactions=ft, fact_vendor_payments=fp,
+                             policy_rules=[] if policy_in_sql else rules, created_at=created_at, profiler=profiler)
 
     # Idempotent per batch
     delete_where_batch(conn, "qa_flags", b)
     delete_where_batch(conn, "qa_runs", b)
+    delete_where_batch(conn, "qa_rule_metrics", b)
 
     if not flags.empty:
         flags.to_sql("qa_flags", conn, if_exists="append", index=False)
+    flag_count = int(len(flags))
+    if policy_in_sql:
+        # Policy flags come last, as in the pandas path; one statement covers every rule, so the
+        # 'policy_sql' row holds the time and total hits and each rule gets an untimed row of its own.
+        compiled = compile_policy_rules(rules)
+        rule_hits: Dict[Tuple[str, int], int] = {}
+        with profiler.check("policy_rules", "policy_sql", "both", batch_rows) as m:
+            m["hits"] = insert_policy_flags(conn, compiled, b, created_at, rule_hits=rule_hits)
+        scanned = {"transactions": len(ft), "vendor_payments": len(fp)}
+        for (rtype, n), hits in rule_hits.items():
+            if scanned[rtype]:  # the pandas path skips empty frames too
+                profiler.record(compiled[n].flag_code, "policy", rtype, scanned[rtype], hits, rule_no=n)
+        flag_count += m["hits"]
+    if cfg.qa.cross_batch_duplicates:
+        with profiler.check("DUPLICATE_CROSS_BATCH", "history", "both", batch_rows) as m:
+            dups = cross_batch_duplicate_flags(conn, b, created_at)
+            if not dups.empty:
+                dups.to_sql("qa_flags", conn, if_exists="append", index=False)
+            m["hits"] = int(len(dups))
+        flag_count += m["hits"]
+    if cfg.qa.vendor_outliers:
+        with profiler.check("VENDOR_AMOUNT_OUTLIER", "history", "both", batch_rows) as m:
+            outliers = vendor_outlier_flags(
+                conn, b, ft, fp,
+                quantile=cfg.qa.vendor_outlier_quantile,
+                min_count=cfg.qa.vendor_outlier_min_count,
+                relative_accuracy=cfg.qa.sketch_relative_accuracy,
+                created_at=created_at,
+            )
+            if not outliers.empty:
+                outliers.to_sql("qa_flags", conn, if_exists="append", index=False)
+            m["hits"] = int(len(outliers))
+        flag_count += m["hits"]
+
+    metrics = pd.DataFrame(profiler.metrics)
+    if not metrics.empty:
+        metrics.insert(0, "batch_id", b)
+        metrics["created_at_utc"] = created_at
+        metrics.to_sql("qa_rule_metrics", conn, if_exists="append", index=False)
 
     conn.execute(
         "INSERT INTO qa_runs (batch_id, qa_at_utc, policy_rules_path) VALUES (?, ?, ?)",
-        (b, utc_now_iso(), cfg.policy_rules_path),
+        (b, utc_now_iso(), cfg.reference.policy_rules_path),
     )
     conn.commit()
 
     if export_csv:
+        # Flags written in SQL are read back so the export stays complete and ordered.
+        if flag_count != len(flags):
+            flags = pd.read_sql_query("SELECT * FROM qa_flags WHERE batch_id=? ORDER BY rowid", conn, params=(b,))
         flags.to_csv(out_dir / "csv" / "qa_flags.csv", index=False)
 
     conn.close()
-    return {"qa_flags": int(len(flags))}
+    return {"qa_flags": flag_count}
+
+def qa_metrics_summary(repo_root: Path, cfg: ProjectConfig, batch_id: Optional[str] = None) -> pd.DataFrame:
+    """Per-check QA metrics of one batch, slowest first, with the share of scanned rows flagged."""
+    conn = connect(repo_root / cfg.database_path)
+    create_qa_rule_metrics_table(conn)
+    b = batch_id or latest_batch_id(conn)
+    df = pd.read_sql_query(
+        "SELECT check_name, check_kind, rule_no, record_type, rows_scanned, hits, elapsed_ms, memory_delta_bytes"
+        " FROM qa_rule_metrics WHERE batch_id=? ORDER BY elapsed_ms DESC",
+        conn, params=(b,),
+    )
+    conn.close()
+    df["rule_no"] = df["rule_no"].astype("Int64")
+    df.insert(df.columns.get_loc("hits") + 1, "hit_rate", (df["hits"] / df["rows_scanned"].where(df["rows_scanned"] > 0)).round(4))
+    return df
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+
+from .db import (
+    create_exception_rollups_table,
+    create_match_candidates_table,
+    create_match_lookup_indexes,
+    create_matches_table,
+    create_report_state_tables,
+    delete_where_batch,
+    table_exists,
+)
+
+GROUP_KEYS = ["batch_id", "month", "vendor_canonical"]
+MART_TABLES = ("rpt_spend_by_month_vendor", "rpt_match_rate_by_month", "rpt_exceptions_by_code", "rpt_top_vendors")
+
+_STATE_COLUMNS = ["txn_id", "batch_id", "month", "vendor_canonical", "amount_cents", "is_matched"]
+
+def mark_reports_stale(conn: sqlite3.Connection, batch_id: str, kind: str = "batch", record_ids: Optional[Iterable[str]] = None) -> None:
+    """Queue work for the next incremental mart refresh of ``batch_id``.
+
+    ``kind`` is 'batch' (rebuild everything), 'txn' / 'pay' (only
+    ``record_ids`` changed their facts or match status) or 'exceptions'.
+    The marts only follow transactions; 'pay' entries tell the spend cube
+    that the batch's payments moved.
+    """
+    create_report_state_tables(conn)
+    ids = [None] if record_ids is None else [str(x) for x in record_ids]
+    conn.executemany("INSERT INTO rpt_pending (batch_id, kind, record_id) VALUES (?, ?, ?);", [(batch_id, kind, x) for x in ids])
+    conn.commit()
+
+def pending_kinds(conn: sqlite3.Connection, batch_id: str) -> Dict[str, int]:
+    """Queued entries per kind for ``batch_id`` (empty when the marts are current)."""
+    create_report_state_tables(conn)
+    return dict(conn.execute(
+        "SELECT kind, COUNT(1) FROM rpt_pending WHERE batch_id = ? GROUP BY kind;", (batch_id,)
+    ).fetchall())
+
+def spend_groups(txns: pd.DataFrame, sign: int = 1) -> pd.DataFrame:
+    """Additive (batch_id, month, vendor_canonical) groups: txn_count, matched_count, spend_cents.
+
+    ``txns`` needs txn_id, amount_cents and is_matched. Spend is summed in
+    whole cents so that adding and removing rows later stays exact.
+    """
+    present = txns["txn_id"].notna().astype("int64") * sign
+    return (
+        txns[GROUP_KEYS]
+        .assign(
+            txn_count=present,
+            matched_count=present * txns["is_matched"].fillna(False).astype("int64"),
+            spend_cents=present * pd.to_numeric(txns["amount_cents"], errors="coerce").fillna(0).astype("int64"),
+        )
+        .groupby(GROUP_KEYS, dropna=False)[["txn_count", "matched_count", "spend_cents"]]
+        .sum()
+        .reset_index()
+    )
+
+def marts_from_groups(groups: pd.DataFrame, top_n: int) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """rpt_spend_by_month_vendor, rpt_match_rate_by_month and rpt_top_vendors from ``spend_groups`` rows."""
+    g = groups[groups["txn_count"] > 0]
+    spend = (
+        g.assign(spend_usd=g["spend_cents"] / 100.0)[GROUP_KEYS + ["txn_count", "matched_count", "spend_usd"]]
+         .sort_values(["month", "spend_usd"], ascending=[True, False])
+    )
+    match_rate = g.groupby(["batch_id", "month"])[["txn_count", "matched_count", "spend_cents"]].sum().reset_index()
+    match_rate["spend_usd"] = match_rate.pop("spend_cents") / 100.0
+    match_rate["match_rate"] = (match_rate["matched_count"] / match_rate["txn_count"]).round(4)
+    top_vendors = g.groupby(["batch_id", "vendor_canonical"])[["spend_cents", "txn_count"]].sum().reset_index()
+    top_vendors.insert(2, "spend_usd", top_vendors.pop("spend_cents") / 100.0)
+    top_vendors = top_vendors.sort_values("spend_usd", ascending=False).head(int(top_n))
+    return spend, match_rate, top_vendors
+
+def exceptions_by_code_sql(conn: sqlite3.Connection, batch_id: str) -> pd.DataFrame:
+    """rpt_exceptions_by_code straight from ``exceptions``; rollup rows count as their exception_count."""
+    create_exception_rollups_table(conn)
+    if not table_exists(conn, "exceptions"):
+        return pd.DataFrame(columns=["batch_id", "exception_code", "severity", "exception_count"])
+    return pd.read_sql_query(
+        "SELECT e.batch_id, e.exception_code, e.severity,"
+        " SUM(CASE WHEN e.record_type = 'rollup' THEN COALESCE(r.exception_count, 1) ELSE 1 END) AS exception_count"
+        " FROM exceptions e"
+        " LEFT JOIN exception_rollups r ON e.record_type = 'rollup' AND r.batch_id = e.batch_id AND r.exception_code = e.exception_code"
+        " AND r.severity IS e.severity"
+        " WHERE e.batch_id = ? AND e.exception_code IS NOT NULL AND e.severity IS NOT NULL"
+        " GROUP BY e.batch_id, e.exception_code, e.severity"
+        " ORDER BY exception_count DESC;",
+        conn, params=(batch_id,),
+    )
+
+def _contributions(conn: sqlite3.Connection, batch_id: str, ids: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Current mart inputs of the batch's transactions (all, or just ``ids``)."""
+    create_matches_table(conn)
+    create_match_candidates_table(conn)
+    create_match_lookup_indexes(conn)
+    source = "fact_transactions f"
+    if ids is not None:
+        _load_ids(conn, ids)
+        source = "_rpt_ids r CROSS JOIN fact_transactions f ON f.txn_id = r.record_id"
+    return pd.read_sql_query(
+        f"SELECT f.txn_id, f.batch_id, f.month, f.vendor_canonical, f.amount_cents,"
+        f" EXISTS (SELECT 1 FROM matches m WHERE m.batch_id = f.batch_id AND m.txn_id = f.txn_id) AS is_matched"
+        f" FROM {source} WHERE f.batch_id = ? ORDER BY f.rowid;",
+        conn, params=(batch_id,),
+    )
+
+def _load_ids(conn: sqlite3.Connection, ids: Iterable[str]) -> None:
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _rpt_ids (record_id TEXT PRIMARY KEY);")
+    conn.execute("DELETE FROM _rpt_ids;")
+    conn.executemany("INSERT OR IGNORE INTO _rpt_ids VALUES (?);", [(str(x),) for x in ids])
+
+def _write_state(conn: sqlite3.Connection, rows: pd.DataFrame) -> None:
+    values = [[None if pd.isna(v) else v for v in rows[c].tolist()] for c in _STATE_COLUMNS]
+    conn.executemany(
+        f"INSERT OR REPLACE INTO rpt_txn_state ({', '.join(_STATE_COLUMNS)}) VALUES ({', '.join('?' * len(_STATE_COLUMNS))});",
+        list(zip(*values)),
+    )
+
+def _current_groups(conn: sqlite3.Connection, batch_id: str) -> pd.DataFrame:
+    groups = pd.read_sql_query(
+        "SELECT batch_id, month, vendor_canonical, txn_count, matched_count, spend_usd FROM rpt_spend_by_month_vendor WHERE batch_id = ?;",
+        conn, params=(batch_id,),
+    )
+    groups["spend_cents"] = (groups.pop("spend_usd") * 100).round().astype("int64")
+    return groups
+
+def _replace(conn: sqlite3.Connection, table: str, batch_id: str, df: pd.DataFrame) -> None:
+    if table_exists(conn, table):
+        delete_where_batch(conn, table, batch_id)
+    if not df.empty:
+        df.to_sql(table, conn, if_exists="append", index=False)
+
+def refresh_report_marts(conn: sqlite3.Connection, batch_id: str, top_n: int) -> Dict[str, int]:
+    """Bring the batch's ``rpt_*`` marts up to date from the queued deltas.
+
+    Transactions queued by a rematch are re-read (facts plus match status),
+    their old contribution from ``rpt_txn_state`` is subtracted and the new
+    one added to the spend groups; the month and top-vendor marts are then
+    re-derived from the groups. The cost follows the number of changed
+    transactions and groups, not the batch size. Without usable state (first
+    run, or a full match/model queued 'batch') everything is rebuilt.
+    """
+    kinds = pending_kinds(conn, batch_id)
+    has_state = conn.execute("SELECT 1 FROM rpt_txn_state WHERE batch_id = ? LIMIT 1;", (batch_id,)).fetchone() is not None
+    full = "batch" in kinds or not has_state or not table_exists(conn, "rpt_spend_by_month_vendor")
+
+    changed = 0
+    if full:
+        current = _contributions(conn, batch_id)
+        conn.execute("DELETE FROM rpt_txn_state WHERE batch_id = ?;", (batch_id,))
+        _write_state(conn, current)
+        groups = spend_groups(current)
+        changed = len(current)
+    elif "txn" in kinds:
+        ids = [r[0] for r in conn.execute(
+            "SELECT DISTINCT record_id FROM rpt_pending WHERE batch_id = ? AND kind = 'txn';", (batch_id,)
+        ).fetchall()]
+        _load_ids(conn, ids)
+        old = pd.read_sql_query(
+            "SELECT s.* FROM _rpt_ids r CROSS JOIN rpt_txn_state s ON s.txn_id = r.record_id WHERE s.batch_id = ?;",
+            conn, params=(batch_id,),
+        )
+        new = _contributions(conn, batch_id, ids)
+        delta = pd.concat([spend_groups(old, sign=-1), spend_groups(new)], ignore_index=True)
+        groups = (
+            pd.concat([_current_groups(conn, batch_id), delta], ignore_index=True)
+            .groupby(GROUP_KEYS, dropna=False)[["txn_count", "matched_count", "spend_cents"]]
+            .sum()
+            .reset_index()
+        )
+        conn.execute("DELETE FROM rpt_txn_state WHERE txn_id IN (SELECT record_id FROM _rpt_ids);")
+        _write_state(conn, new)
+        changed = len(ids)
+    else:
+        groups = None
+
+    summary: Dict[str, int] = {"report_changed_transactions": int(changed)}
+    if groups is not None:
+        spend, match_rate, top_vendors = marts_from_groups(groups, top_n)
+        for table, df in (("rpt_spend_by_month_vendor", spend), ("rpt_match_rate_by_month", match_rate), ("rpt_top_vendors", top_vendors)):
+            _replace(conn, table, batch_id, df)
+            summary[table] = int(len(df))
+    if full or "exceptions" in kinds:
+        exc_by = exceptions_by_code_sql(conn, batch_id)
+        _replace(conn, "rpt_exceptions_by_code", batch_id, exc_by)
+        summary["rpt_exceptions_by_code"] = int(len(exc_by))
+
+    conn.execute("DELETE FROM rpt_pending WHERE batch_id = ?;", (batch_id,))
+    conn.commit()
+    return summary
@@ -10,9 +10,14 @@ from .db import (
     connect,
     latest_batch_id,
     create_reporting_runs_table,
+    create_exception_rollups_table,
+    create_report_state_tables,
     insert_report_run,
     delete_where_batch,
 )
+from .report_marts import MART_TABLES, marts_from_groups, pending_kinds, refresh_report_marts, spend_groups
+from .spend_cube import has_cube_slice, refresh_spend_cube
+from .sql_reporting import has_transactions, report_marts_sql
 from .util import utc_now_iso, ensure_dir
 
 def _write_table(conn, name: str, df: pd.DataFrame, batch_id: str) -> None:
@@ -35,56 +40,66 @@ def reports_all(repo_root: Path, cfg: ProjectConfig, batch_id: Optional[str] = N
         conn.close()
         return {"reports": 0}
 
-    ft = pd.read_sql_query("SELECT * FROM fact_transactions WHERE batch_id=?", conn, params=(b,))
-    matches = pd.read_sql_query("SELECT * FROM matches WHERE batch_id=?", conn, params=(b,))
-    exc = pd.read_sql_query("SELECT * FROM exceptions WHERE batch_id=?", conn, params=(b,))
-
-    if ft.empty:
+    top_n = int(cfg.reporting.top_n_vendors)
+    if cfg.reporting.incremental:
+        moved = set(pending_kinds(conn, b)) - {"exceptions"}
+        summary = refresh_report_marts(conn, b, top_n)
+        # The cube slice follows fact and match changes only (exceptions are not part of it).
+        if cfg.reporting.spend_cube and (moved or not has_cube_slice(conn, b)):
+            summary["rpt_spend_cube"] = refresh_spend_cube(conn, b)
+        delete_where_batch(conn, "report_runs", b)
+        insert_report_run(conn, {"created_at_utc": utc_now_iso(), "batch_id": b})
+        if export_csv:
+            for table_name in MART_TABLES:
+                pd.read_sql_query(f"SELECT * FROM {table_name} WHERE batch_id=?", conn, params=(b,)).to_csv(
+                    out_dir / "csv" / f"{table_name}.csv", index=False)
         conn.close()
-        return {"reports": 0}
+        return summary
 
-    ft["is_matched"] = ft["txn_id"].isin(set(matches["txn_id"].tolist())) if not matches.empty else False
-    ft["amount_usd"] = ft["amount_cents"].astype(float) / 100.0
-
-    # Spend by month + vendor
-    spend = (
-        ft.groupby(["batch_id","month","vendor_canonical"], dropna=False)
-          .agg(txn_count=("txn_id","count"),
-               matched_count=("is_matched","sum"),
-               spend_usd=("amount_usd","sum"))
-          .reset_index()
-          .sort_values(["month","spend_usd"], ascending=[True, False])
-    )
-
-    # Match rate by month
-    match_rate = (
-        ft.groupby(["batch_id","month"])
-          .agg(txn_count=("txn_id","count"),
-               matched_count=("is_matched","sum"),
-               spend_usd=("amount_usd","sum"))
-          .reset_index()
-    )
-    match_rate["match_rate"] = (match_rate["matched_count"] / match_rate["txn_count"]).round(4)
-
-    # Exceptions by code
-    exc_by = pd.DataFrame(columns=["batch_id","exception_code","severity","exception_count"])
-    if not exc.empty:
-        exc_by = (
-            exc.groupby(["batch_id","exception_code","severity"])
-               .size()
-               .reset_index(name="exception_count")
-               .sort_values(["exception_count"], ascending=False)
-        )
-
-    # Top vendors (for dashboard)
-    top_n = int(cfg.reporting.top_n_vendors)
-    top_vendors = (
-        ft.groupby(["batch_id","vendor_canonical"])
-          .agg(spend_usd=("amount_usd","sum"), txn_count=("txn_id","count"))
-          .reset_index()
-          .sort_values("spend_usd", ascending=False)
-          .head(top_n)
-    )
+    engine = cfg.reporting.engine
+    if engine not in ("pandas", "sql"):
+        conn.close()
+        raise ValueError(f"Unknown reporting engine: {engine!r} (expected 'pandas' or 'sql')")
+
+    if engine == "sql":
+        if not has_transactions(conn, b):
+            conn.close()
+            return {"reports": 0}
+        spend, match_rate, exc_by, top_vendors = report_marts_sql(conn, b, top_n)
+    else:
+        ft = pd.read_sql_query("SELECT * FROM fact_transactions WHERE batch_id=?", conn, params=(b,))
+        matches = pd.read_sql_query("SELECT * FROM matches WHERE batch_id=?", conn, params=(b,))
+        exc = pd.read_sql_query("SELECT * FROM exceptions WHERE batch_id=?", conn, params=(b,))
+        create_exception_rollups_table(conn)
+        rollups = pd.read_sql_query("SELECT exception_code, severity, exception_count FROM exception_rollups WHERE batch_id=?", conn, params=(b,))
+
+        if ft.empty:
+            conn.close()
+            return {"reports": 0}
+
+        ft["is_matched"] = ft["txn_id"].isin(set(matches["txn_id"].tolist())) if not matches.empty else False
+
+        # Spend by month + vendor, match rate by month and top vendors (for dashboard), all from the
+        # same whole-cent groups the incremental refresh maintains.
+        spend, match_rate, top_vendors = marts_from_groups(spend_groups(ft), top_n)
+
+        # Exceptions by code
+        exc_by = pd.DataFrame(columns=["batch_id","exception_code","severity","exception_count"])
+        if not exc.empty:
+            # A rolled-up summary row stands for exception_count records.
+            weight = pd.Series(1, index=exc.index, dtype="int64")
+            rolled = exc["record_type"] == "rollup"
+            if rolled.any():
+                counts = dict(zip(zip(rollups["exception_code"], rollups["severity"]), rollups["exception_count"]))
+                keys = pd.Series(list(zip(exc.loc[rolled, "exception_code"], exc.loc[rolled, "severity"])), index=exc.index[rolled])
+                weight[rolled] = keys.map(counts).fillna(1).astype("int64")
+            exc_by = (
+                exc.assign(exception_count=weight)
+                   .groupby(["batch_id","exception_code","severity"])["exception_count"]
+                   .sum()
+                   .reset_index()
+                   .sort_values(["exception_count"], ascending=False)
+            )
 
     # Idempotent: delete + write tables
     for table_name in ["rpt_spend_by_month_vendor","rpt_match_rate_by_month","rpt_exceptions_by_code","rpt_top_vendors"]:
@@ -103,6 +118,14 @@ def reports_all(repo_root: Path, cfg: ProjectConfig, batch_id: Optional[str] = N
     if not top_vendors.empty:
         top_vendors.to_sql("rpt_top_vendors", conn, if_exists="append", index=False)
 
+    # The marts were rebuilt from scratch: any incremental state for the batch is now stale.
+    create_report_state_tables(conn)
+    delete_where_batch(conn, "rpt_txn_state", b)
+    delete_where_batch(conn, "rpt_pending", b)
+
+    # This batch's slice of the cross-batch trend cube
+    cube_rows = refresh_spend_cube(conn, b) if cfg.reporting.spend_cube else 0
+
     # report_runs idempotent per batch
     delete_where_batch(conn, "report_runs", b)
     insert_report_run(conn, {"created_at_utc": utc_now_iso(), "batch_id": b})
@@ -119,4 +142,5 @@ def reports_all(repo_root: Path, cfg: ProjectConfig, batch_id: Optional[str] = N
         "rpt_match_rate_by_month": int(len(match_rate)),
         "rpt_exceptions_by_code": int(len(exc_by)),
         "rpt_top_vendors": int(len(top_vendors)),
+        "rpt_spend_cube": int(cube_rows),
     }
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import numpy as np
+
+_MATCH_TYPES = np.array(["exact", "date_window", "vendor_fuzzy", "weak"], dtype=object)
+
+def _round6(x: np.ndarray) -> np.ndarray:
+    """Round like Python's ``round(x, 6)``.
+
+    ``np.round`` scales by 1e6 and can disagree with the correctly rounded
+    builtin on values that sit on a half-way point; those few are redone in Python.
+    """
+    scaled = x * 1e6
+    out = np.round(scaled) / 1e6
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_half.any():
+        idx = np.flatnonzero(near_half)
+        out[idx] = [round(float(v), 6) for v in x[idx]]
+    return out
+
+def score_arrays(
+    vendor_sim: np.ndarray,
+    date_diff_days: np.ndarray,
+    amount_diff_cents: np.ndarray,
+    date_window_days: int,
+    amount_tolerance_cents: int,
+    w_vendor: float,
+    w_date: float,
+    w_amount: float,
+) -> np.ndarray:
+    """Array version of ``matching._score``; returns identical float64 scores."""
+    vendor_sim = np.asarray(vendor_sim, dtype=np.float64)
+    date_diff = np.asarray(date_diff_days, dtype=np.int64)
+    amount_diff = np.asarray(amount_diff_cents, dtype=np.int64)
+    if date_window_days <= 0:
+        date_sim = (date_diff == 0).astype(np.float64)
+    else:
+        date_sim = np.maximum(0.0, 1.0 - (np.abs(date_diff) / float(date_window_days)))
+    if amount_tolerance_cents <= 0:
+        amount_sim = (amount_diff == 0).astype(np.float64)
+    else:
+        amount_sim = np.maximum(0.0, 1.0 - (np.abs(amount_diff) / float(amount_tolerance_cents)))
+    score = (w_vendor * vendor_sim) + (w_date * date_sim) + (w_amount * amount_sim)
+    return _round6(score)
+
+def match_type_arrays(
+    vendor_sim: np.ndarray,
+    date_diff_days: np.ndarray,
+    amount_diff_cents: np.ndarray,
+) -> np.ndarray:
+    """Array version of ``matching._match_type``."""
+    vendor_sim = np.asarray(vendor_sim, dtype=np.float64)
+    date_diff = np.asarray(date_diff_days, dtype=np.int64)
+    amount_diff = np.asarray(amount_diff_cents, dtype=np.int64)
+    same_vendor = vendor_sim >= 0.999
+    same_amount = amount_diff == 0
+    # Assign in reverse order so earlier branches of the if-chain take precedence.
+    codes = np.full(len(vendor_sim), 3, dtype=np.int8)
+    codes[(vendor_sim >= 0.90) & same_amount] = 2
+    codes[same_vendor & same_amount & (np.abs(date_diff) <= 1)] = 1
+    codes[same_vendor & same_amount & (date_diff == 0)] = 0
+    return _MATCH_TYPES[codes]
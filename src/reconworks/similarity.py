@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+from .db import create_vendor_similarity_cache_table
+from .util import utc_now_iso
+
+# Bump when the scoring semantics change so stale cache rows are ignored.
+SIMILARITY_ALGO_VERSION = "token_set_ratio/v1"
+
+def _strip(values: np.ndarray) -> np.ndarray:
+    return np.array([(v or "").strip() for v in values], dtype=object)
+
+def unique_vendor_pairs(a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Collapse per-candidate vendor pairs to unique pairs.
+
+    Returns (first, inverse): ``first`` indexes one candidate per distinct pair
+    and ``a[first][inverse]`` rebuilds ``a``.
+    """
+    a_codes, a_uniq = pd.factorize(pd.Series(a, dtype=object))
+    b_codes, b_uniq = pd.factorize(pd.Series(b, dtype=object))
+    pair_codes = a_codes.astype(np.int64) * max(len(b_uniq), 1) + b_codes.astype(np.int64)
+    _, first, inverse = np.unique(pair_codes, return_index=True, return_inverse=True)
+    return first, inverse.reshape(-1)
+
+def pair_similarity(a: np.ndarray, b: np.ndarray, workers: int = -1) -> np.ndarray:
+    """Score aligned vendor pairs in one rapidfuzz batch call (no de-duplication)."""
+    a = _strip(a)
+    b = _strip(b)
+    out = np.zeros(len(a), dtype=np.float64)
+    if len(a) == 0:
+        return out
+    present = np.array([bool(x) and bool(y) for x, y in zip(a, b)], dtype=bool)
+    equal = present & np.array([x.lower() == y.lower() for x, y in zip(a, b)], dtype=bool)
+    out[equal] = 1.0
+    fuzzy = present & ~equal
+    if fuzzy.any():
+        # token_set_ratio is robust to extra tokens in one string
+        scores = process.cpdist(
+            a[fuzzy].tolist(), b[fuzzy].tolist(),
+            scorer=fuzz.token_set_ratio, dtype=np.float64, workers=workers,
+        )
+        out[fuzzy] = scores / 100.0
+    return out
+
+class VendorSimilarityCache:
+    """Persistent (vendor_id_a, vendor_id_b, algo_version) -> similarity store.
+
+    Lookups and writes are done in bulk. Rows carry a last-used timestamp and
+    the table is trimmed to ``max_rows`` least-recently-used first.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, max_rows: int = 200000, algo_version: str = SIMILARITY_ALGO_VERSION):
+        self.conn = conn
+        self.max_rows = int(max_rows)
+        self.algo_version = algo_version
+        self.hits = 0
+        self.misses = 0
+        create_vendor_similarity_cache_table(conn)
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS _vsim_keys (vendor_id_a TEXT, vendor_id_b TEXT);")
+
+    def lookup(self, ids_a: np.ndarray, ids_b: np.ndarray) -> np.ndarray:
+        """Return cached similarities aligned to the inputs (NaN where missing)."""
+        out = np.full(len(ids_a), np.nan, dtype=np.float64)
+        keys = [(str(x), str(y)) for x, y in zip(ids_a, ids_b)]
+        valid = [k for k in keys if k[0] and k[1]]
+        if valid:
+            self.conn.execute("DELETE FROM _vsim_keys;")
+            self.conn.executemany("INSERT INTO _vsim_keys VALUES (?, ?);", valid)
+            rows = self.conn.execute(
+                "SELECT c.vendor_id_a, c.vendor_id_b, c.similarity FROM _vsim_keys k"
+                " JOIN vendor_similarity_cache c ON c.vendor_id_a = k.vendor_id_a"
+                " AND c.vendor_id_b = k.vendor_id_b AND c.algo_version = ?;",
+                (self.algo_version,),
+            ).fetchall()
+            found = {(r[0], r[1]): float(r[2]) for r in rows}
+            out = np.array([found.get(k, np.nan) for k in keys], dtype=np.float64)
+            if found:
+                self.conn.execute(
+                    "UPDATE vendor_similarity_cache SET last_used_utc = ?"
+                    " WHERE algo_version = ? AND (vendor_id_a, vendor_id_b) IN (SELECT vendor_id_a, vendor_id_b FROM _vsim_keys);",
+                    (utc_now_iso(), self.algo_version),
+                )
+            self.conn.commit()
+        hit = int((~np.isnan(out)).sum())
+        self.hits += hit
+        self.misses += len(out) - hit
+        return out
+
+    def snapshot(self, ids_a: Iterable[str], ids_b: Iterable[str]) -> Dict[Tuple[str, str], float]:
+        """Load every cached pair between the given vendor id sets in one query."""
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS _vsim_ids_a (vendor_id TEXT PRIMARY KEY);")
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS _vsim_ids_b (vendor_id TEXT PRIMARY KEY);")
+        self.conn.execute("DELETE FROM _vsim_ids_a;")
+        self.conn.execute("DELETE FROM _vsim_ids_b;")
+        self.conn.executemany("INSERT OR IGNORE INTO _vsim_ids_a VALUES (?);", [(str(x),) for x in ids_a if x])
+        self.conn.executemany("INSERT OR IGNORE INTO _vsim_ids_b VALUES (?);", [(str(x),) for x in ids_b if x])
+        rows = self.conn.execute(
+            "SELECT c.vendor_id_a, c.vendor_id_b, c.similarity FROM vendor_similarity_cache c"
+            " JOIN _vsim_ids_a a ON a.vendor_id = c.vendor_id_a"
+            " JOIN _vsim_ids_b b ON b.vendor_id = c.vendor_id_b"
+            " WHERE c.algo_version = ?;",
+            (self.algo_version,),
+        ).fetchall()
+        self.conn.commit()
+        return {(r[0], r[1]): float(r[2]) for r in rows}
+
+    def touch(self, keys: Iterable[Tuple[str, str]]) -> None:
+        """Refresh last_used_utc for pairs that were read outside this connection."""
+        rows = [(utc_now_iso(), a, b, self.algo_version) for a, b in keys]
+        if rows:
+            self.conn.executemany(
+                "UPDATE vendor_similarity_cache SET last_used_utc = ? WHERE vendor_id_a = ? AND vendor_id_b = ? AND algo_version = ?;",
+                rows,
+            )
+            self.conn.commit()
+
+    def store(self, ids_a: np.ndarray, ids_b: np.ndarray, sims: np.ndarray) -> None:
+        now = utc_now_iso()
+        rows = [
+            (str(x), str(y), self.algo_version, float(s), now)
+            for x, y, s in zip(ids_a, ids_b, sims)
+            if str(x) and str(y)
+        ]
+        if not rows:
+            return
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO vendor_similarity_cache"
+            " (vendor_id_a, vendor_id_b, algo_version, similarity, last_used_utc) VALUES (?, ?, ?, ?, ?);",
+            rows,
+        )
+        self.conn.commit()
+        self.prune()
+
+    def prune(self) -> int:
+        count = self.conn.execute("SELECT COUNT(1) FROM vendor_similarity_cache;").fetchone()[0]
+        excess = int(count) - self.max_rows
+        if excess <= 0:
+            return 0
+        self.conn.execute(
+            "DELETE FROM vendor_similarity_cache WHERE rowid IN ("
+            " SELECT rowid FROM vendor_similarity_cache ORDER BY last_used_utc ASC LIMIT ?);",
+            (excess,),
+        )
+        self.conn.commit()
+        return excess
+
+class MemorySimilarityCache:
+    """Dict-backed cache with the lookup/store interface (no DB I/O).
+
+    Used by worker processes: seeded from ``VendorSimilarityCache.snapshot``,
+    it records the pairs it served (``used``) and scored (``added``) so the
+    parent can write them back through a single connection.
+    """
+
+    def __init__(self, known: Dict[Tuple[str, str], float]):
+        self.known = known
+        self.added: Dict[Tuple[str, str], float] = {}
+        self.used: Set[Tuple[str, str]] = set()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, ids_a: np.ndarray, ids_b: np.ndarray) -> np.ndarray:
+        out = np.full(len(ids_a), np.nan, dtype=np.float64)
+        for i, key in enumerate(zip(ids_a, ids_b)):
+            if key[0] and key[1] and key in self.known:
+                out[i] = self.known[key]
+                self.used.add(key)
+        hit = int((~np.isnan(out)).sum())
+        self.hits += hit
+        self.misses += len(out) - hit
+        return out
+
+    def store(self, ids_a: np.ndarray, ids_b: np.ndarray, sims: np.ndarray) -> None:
+        for a, b, sim in zip(ids_a, ids_b, sims):
+            if a and b:
+                self.known[(a, b)] = float(sim)
+                self.added[(a, b)] = float(sim)
+
+def vendor_similarity_bulk(
+    a: np.ndarray,
+    b: np.ndarray,
+    workers: int = -1,
+    ids_a: Optional[np.ndarray] = None,
+    ids_b: Optional[np.ndarray] = None,
+    cache: Optional[VendorSimilarityCache | MemorySimilarityCache] = None,
+) -> np.ndarray:
+    """Vectorized ``matching._vendor_similarity`` over candidate arrays.
+
+    Each distinct (a, b) pair is scored once, then mapped back to every candidate.
+    With a cache (and vendor ids), known pairs are read in bulk and only the
+    misses reach rapidfuzz.
+    """
+    if len(a) == 0:
+        return np.zeros(0, dtype=np.float64)
+    a = np.asarray(a, dtype=object)
+    b = np.asarray(b, dtype=object)
+    first, inverse = unique_vendor_pairs(a, b)
+    uniq_a, uniq_b = a[first], b[first]
+    if cache is None or ids_a is None or ids_b is None:
+        return pair_similarity(uniq_a, uniq_b, workers=workers)[inverse]
+
+    uniq_ids_a = np.asarray(ids_a, dtype=object)[first]
+    uniq_ids_b = np.asarray(ids_b, dtype=object)[first]
+    scores = cache.lookup(uniq_ids_a, uniq_ids_b)
+    miss = np.isnan(scores)
+    if miss.any():
+        scores[miss] = pair_similarity(uniq_a[miss], uniq_b[miss], workers=workers)
+        cache.store(uniq_ids_a[miss], uniq_ids_b[miss], scores[miss])
+    return scores[inverse]
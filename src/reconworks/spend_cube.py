@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import pandas as pd
+
+from .config import ProjectConfig
+from .db import (
+    connect,
+    create_match_id_indexes,
+    create_matches_table,
+    create_open_items_table,
+    create_ingest_files_table,
+    create_spend_cube_table,
+    delete_where_batch,
+    table_exists,
+)
+from .util import utc_now_iso
+
+CUBE_KEYS = ("month", "vendor_id", "source", "source_file", "matched", "currency")
+TREND_DIMENSIONS = ("month", "source", "currency", "vendor_id", "vendor_canonical", "matched")
+
+# source -> (fact table, id column); matched means the record has a row in matches, under any batch.
+_SOURCES = {
+    "transactions": ("fact_transactions", "txn_id"),
+    "vendor_payments": ("fact_vendor_payments", "pay_id"),
+}
+
+def _slice(conn: sqlite3.Connection, batch_id: str, now: str) -> int:
+    delete_where_batch(conn, "rpt_spend_cube", batch_id)
+    delete_where_batch(conn, "rpt_spend_cube_links", batch_id)
+    rows = 0
+    for source, (facts, id_col) in _SOURCES.items():
+        if not table_exists(conn, facts):
+            continue
+        params = {"b": batch_id, "source": source, "now": now}
+        rows += conn.execute(
+            f"""
+            INSERT INTO rpt_spend_cube (batch_id, {", ".join(CUBE_KEYS)}, vendor_canonical, record_count, amount_cents, refreshed_at_utc)
+            SELECT :b, COALESCE(f.month, ''), COALESCE(f.vendor_id, ''), :source, COALESCE(f.source_file, ''),
+                   EXISTS (SELECT 1 FROM matches m WHERE m.{id_col} = f.{id_col}) AS is_matched,
+                   COALESCE(f.currency, ''), MAX(f.vendor_canonical), COUNT(*), SUM(COALESCE(CAST(f.amount_cents AS INTEGER), 0)), :now
+            FROM {facts} f
+            WHERE f.batch_id = :b
+            GROUP BY 2, 3, 5, 6, 7;
+            """,
+            params,
+        ).rowcount
+        conn.execute(
+            f"""
+            INSERT OR IGNORE INTO rpt_spend_cube_links (batch_id, matched_in_batch_id)
+            SELECT DISTINCT :b, m.batch_id
+            FROM {facts} f JOIN matches m ON m.{id_col} = f.{id_col}
+            WHERE f.batch_id = :b AND m.batch_id <> :b;
+            """,
+            params,
+        )
+    return rows
+
+def refresh_spend_cube(conn: sqlite3.Connection, batch_id: str) -> int:
+    """Replace the batch's slice of ``rpt_spend_cube`` with a GROUP BY over its facts.
+
+    Only the batch's own rows are read (batch_id index on the facts, an
+    ``EXISTS`` probe per record into ``matches`` by id), so the cost does not
+    grow with the number of batches already in the cube. A record carried in
+    the open-items ledger is matched under a later batch, so slices that
+    depend on this batch's matches (last slice's links, plus batches whose
+    ledger items it closed) are re-sliced too. Returns the batch's slice row count.
+    """
+    create_spend_cube_table(conn)
+    create_matches_table(conn)
+    create_match_id_indexes(conn)
+    create_open_items_table(conn)
+
+    now = utc_now_iso()
+    rows = _slice(conn, batch_id, now)
+    dependents = [r[0] for r in conn.execute(
+        "SELECT batch_id FROM rpt_spend_cube_links WHERE matched_in_batch_id = :b"
+        " UNION SELECT batch_id FROM open_items WHERE closed_by_batch_id = :b AND batch_id <> :b"
+        " ORDER BY 1;",
+        {"b": batch_id},
+    ).fetchall()]
+    for b in dependents:
+        _slice(conn, b, now)
+    conn.commit()
+    return int(rows)
+
+def has_cube_slice(conn: sqlite3.Connection, batch_id: str) -> bool:
+    create_spend_cube_table(conn)
+    return conn.execute("SELECT 1 FROM rpt_spend_cube WHERE batch_id = ? LIMIT 1;", (batch_id,)).fetchone() is not None
+
+def backfill_spend_cube(conn: sqlite3.Connection) -> List[str]:
+    """Build the slices of batches that have facts but are not in the cube yet (reported before it existed)."""
+    create_spend_cube_table(conn)
+    selects = [f"SELECT DISTINCT batch_id FROM {facts}" for facts, _ in _SOURCES.values() if table_exists(conn, facts)]
+    if not selects:
+        return []
+    missing = [r[0] for r in conn.execute(
+        " UNION ".join(selects) + " EXCEPT SELECT DISTINCT batch_id FROM rpt_spend_cube ORDER BY 1;"
+    ).fetchall() if r[0] is not None]
+    for b in missing:
+        refresh_spend_cube(conn, b)
+    return missing
+
+def spend_trends(
+    conn: sqlite3.Connection,
+    by: Sequence[str] = ("month", "source", "currency"),
+    start_month: Optional[str] = None,
+    end_month: Optional[str] = None,
+    source: Optional[str] = None,
+    currency: Optional[str] = None,
+    vendor_id: Optional[str] = None,
+) -> pd.DataFrame:
+    """Spend and match rate per period across all batches, answered from ``rpt_spend_cube`` alone.
+
+    A source file ingested more than once counts only from the batch that
+    loaded it last (by first ingest time, then batch_id), so re-ingesting the
+    same exports does not double the months they cover. ``by`` picks the
+    grouping from ``TREND_DIMENSIONS`` (month is always included). Months
+    are 'YYYY-MM' and the range is inclusive; undated records are left out. Adds
+    spend_usd, match_rate and spend_change_pct (against the previous calendar
+    month of the same group; NaN when the group has no row for it).
+    """
+    dims = ["month"] + [d for d in by if d != "month"]
+    unknown = [d for d in dims if d not in TREND_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown trend dimension(s): {unknown} (expected some of {list(TREND_DIMENSIONS)})")
+    create_spend_cube_table(conn)
+    create_ingest_files_table(conn)
+
+    cols = ", ".join(dims)
+    trends = pd.read_sql_query(
+        f"""
+        WITH loads AS (
+            SELECT batch_id, MIN(ingested_at_utc) AS loaded_at FROM ingest_files GROUP BY batch_id
+        ),
+        latest AS (
+            SELECT batch_id, source, source_file,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY source, source_file ORDER BY l.loaded_at DESC NULLS LAST, batch_id DESC
+                   ) AS rn
+            FROM (SELECT DISTINCT batch_id, source, source_file FROM rpt_spend_cube WHERE source_file <> '')
+            LEFT JOIN loads l USING (batch_id)
+        )
+        SELECT {cols},
+               SUM(record_count) AS record_count,
+               SUM(CASE WHEN matched THEN record_count ELSE 0 END) AS matched_count,
+               SUM(amount_cents) AS amount_cents
+        FROM rpt_spend_cube c
+        WHERE month <> ''
+          AND (c.source_file = '' OR EXISTS (
+              SELECT 1 FROM latest t
+              WHERE t.rn = 1 AND t.batch_id = c.batch_id AND t.source = c.source AND t.source_file = c.source_file
+          ))
+          AND (:start IS NULL OR month >= :start) AND (:end IS NULL OR month <= :end)
+          AND (:source IS NULL OR source = :source)
+          AND (:currency IS NULL OR currency = :currency)
+          AND (:vendor IS NULL OR vendor_id = :vendor)
+        GROUP BY {cols}
+        ORDER BY {cols};
+        """,
+        conn,
+        params={"start": start_month, "end": end_month, "source": source, "currency": currency, "vendor": vendor_id},
+    )
+    trends["spend_usd"] = trends.pop("amount_cents") / 100.0
+    trends["match_rate"] = (trends["matched_count"] / trends["record_count"]).round(4)
+    others = dims[1:]
+    shifted = trends.groupby(others, dropna=False)[["month", "spend_usd"]].shift() if others else trends[["month", "spend_usd"]].shift()
+    # Only the calendar month before counts; a group with no spend that month gets no change.
+    month_before = (pd.to_datetime(trends["month"], format="%Y-%m", errors="coerce") - pd.offsets.MonthBegin(1)).dt.strftime("%Y-%m")
+    prev = shifted["spend_usd"].where((shifted["month"] == month_before) & (shifted["spend_usd"] != 0))
+    trends["spend_change_pct"] = ((trends["spend_usd"] - prev) / prev.abs() * 100).round(2)
+    return trends
+
+def spend_trends_all(
+    repo_root: Path,
+    cfg: ProjectConfig,
+    by: Sequence[str] = ("month", "source", "currency"),
+    start_month: Optional[str] = None,
+    end_month: Optional[str] = None,
+    source: Optional[str] = None,
+    currency: Optional[str] = None,
+    vendor_id: Optional[str] = None,
+) -> pd.DataFrame:
+    """``spend_trends`` on the project database, after slicing any batch the cube has not seen."""
+    conn = connect(repo_root / cfg.database_path)
+    backfill_spend_cube(conn)
+    trends = spend_trends(conn, by=by, start_month=start_month, end_month=end_month, source=source, currency=currency, vendor_id=vendor_id)
+    conn.close()
+    return trends
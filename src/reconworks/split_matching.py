@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import math
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from .util import utc_now_iso
+
+def _subset_sums(amounts: np.ndarray) -> tuple:
+    """Sums and sizes of every subset; bit i of the position selects item i."""
+    sums = np.zeros(1, dtype=np.int64)
+    sizes = np.zeros(1, dtype=np.int64)
+    for a in amounts.tolist():
+        sums = np.concatenate([sums, sums + a])
+        sizes = np.concatenate([sizes, sizes + 1])
+    return sums, sizes
+
+def subset_sum_mitm(amounts: np.ndarray, target: int, tolerance: int = 0, min_items: int = 2) -> Optional[np.ndarray]:
+    """Meet-in-the-middle subset sum: positions of a subset summing to ``target`` ± ``tolerance``.
+
+    Both halves are enumerated (2^(n/2) subsets each), one side is sorted and
+    every sum of the other side is probed with a binary search. Among hits the
+    closest total wins, then the fewest items, then the lowest positions.
+    Returns None when no subset of at least ``min_items`` items fits.
+    """
+    amounts = np.asarray(amounts, dtype=np.int64)
+    n = len(amounts)
+    if n < min_items:
+        return None
+    k = n // 2
+    sums_a, sizes_a = _subset_sums(amounts[:k])
+    sums_b, sizes_b = _subset_sums(amounts[k:])
+
+    order_b = np.argsort(sums_b, kind="stable")
+
+    best = None
+    # A subsets too small on their own only pair with B subsets that make up the size.
+    need_b = np.maximum(0, min_items - sizes_a)
+    for need in np.unique(need_b).tolist():
+        rows_a = np.flatnonzero(need_b == need)
+        rows_b = order_b[sizes_b[order_b] >= need] if need else order_b
+        if len(rows_b) == 0:
+            continue
+        sorted_b = sums_b[rows_b]
+        pos = np.searchsorted(sorted_b, target - sums_a[rows_a], side="left")
+        # The closest partner sum sits at pos or pos - 1.
+        for probe in (pos - 1, pos):
+            valid = (probe >= 0) & (probe < len(sorted_b))
+            ia = rows_a[valid]
+            ib = rows_b[probe[valid]]
+            diff = np.abs(sums_a[ia] + sums_b[ib] - target)
+            ok = diff <= tolerance
+            if not ok.any():
+                continue
+            ia, ib, diff = ia[ok], ib[ok], diff[ok]
+            size = sizes_a[ia] + sizes_b[ib]
+            pick = np.lexsort((ib, ia, size, diff))[0]
+            cand = (int(diff[pick]), int(size[pick]), int(ia[pick]), int(ib[pick]))
+            if best is None or cand < best:
+                best = cand
+    if best is None:
+        return None
+    _, _, ia, ib = best
+    chosen = [i for i in range(k) if (ia >> i) & 1] + [k + i for i in range(n - k) if (ib >> i) & 1]
+    return np.asarray(chosen, dtype=np.int64)
+
+def split_payment_matches(
+    batch_id: str,
+    fact_transactions: pd.DataFrame,
+    fact_vendor_payments: pd.DataFrame,
+    date_window_days: int = 31,
+    amount_tolerance_cents: int = 0,
+    max_group_size: int = 32,
+    max_nodes: int = 200_000,
+    time_budget_ms: int = 200,
+    w_vendor: float = 0.6,
+    w_date: float = 0.3,
+    w_amount: float = 0.1,
+    stats: Optional[Dict[str, int]] = None,
+) -> pd.DataFrame:
+    """Many-to-one pass: one payment settling several transactions of the same vendor.
+
+    Works on residual (unmatched) records grouped by vendor_id. For each
+    payment, the same-vendor transactions within ``date_window_days`` whose
+    amounts can still fit are searched for a subset summing to the payment.
+    The search is capped three ways: at most ``max_group_size`` candidates
+    (nearest dates first), at most ``max_nodes`` enumerated subset sums, and
+    ``time_budget_ms`` of wall time per vendor. Payments beyond a cap are left
+    unmatched. Returns one ``match_type = split`` row per (txn, pay) pair.
+    """
+    from .matching import MATCH_COLUMNS, _score, _to_day, _to_dt
+
+    counts = {"split_payments": 0, "split_truncated_searches": 0, "split_vendors_timed_out": 0}
+    if fact_transactions.empty or fact_vendor_payments.empty:
+        if stats is not None:
+            stats.update(counts)
+        return pd.DataFrame(columns=MATCH_COLUMNS)
+
+    def prepared(df: pd.DataFrame) -> pd.DataFrame:
+        out = df.assign(split_day=_to_dt(df["date"]))
+        out = out[out["split_day"].notna() & out["amount_cents"].notna() & out["vendor_id"].notna()]
+        out = out[out["vendor_id"].astype(str).str.strip() != ""]
+        return out.assign(split_day=_to_day(out["split_day"]), split_amount=out["amount_cents"].astype("int64"))
+
+    tx = prepared(fact_transactions)
+    pay = prepared(fact_vendor_payments)
+    tol = max(0, int(amount_tolerance_cents))
+    # 2 * 2^(n/2) subset sums must stay under the node cap.
+    node_limit = max(2, int(2 * math.log2(max(4, int(max_nodes)) / 2)))
+    limit = min(int(max_group_size), node_limit)
+
+    rows = []
+    tx_groups = {v: g for v, g in tx.groupby("vendor_id", sort=True)}
+    for vendor_id, pays in pay.groupby("vendor_id", sort=True):
+        group = tx_groups.get(vendor_id)
+        if group is None or len(group) < 2:
+            continue
+        deadline = time.perf_counter() + time_budget_ms / 1000.0
+        t_day = group["split_day"].to_numpy()
+        t_amount = group["split_amount"].to_numpy()
+        t_ids = group["txn_id"].to_numpy()
+        used = np.zeros(len(group), dtype=bool)
+        for p in pays.itertuples(index=False):
+            if time.perf_counter() > deadline:
+                counts["split_vendors_timed_out"] += 1
+                break
+            target = int(p.split_amount)
+            if target == 0:
+                continue
+            sign = 1 if target > 0 else -1
+            day_gap = np.abs(t_day - int(p.split_day))
+            fits = (~used) & (day_gap <= date_window_days)
+            fits &= (t_amount * sign > 0) & (t_amount * sign <= abs(target) + tol)
+            idx = np.flatnonzero(fits)
+            if len(idx) < 2 or int(t_amount[idx].sum()) * sign < abs(target) - tol:
+                continue
+            if len(idx) > limit:
+                counts["split_truncated_searches"] += 1
+                idx = idx[np.argsort(day_gap[idx], kind="stable")[:limit]]
+            found = subset_sum_mitm(t_amount[idx], target, tol)
+            if found is None:
+                continue
+            chosen = idx[found]
+            used[chosen] = True
+            counts["split_payments"] += 1
+            residual = target - int(t_amount[chosen].sum())
+            for i in chosen.tolist():
+                date_diff = int(p.split_day) - int(t_day[i])
+                rows.append({
+                    "batch_id": batch_id,
+                    "txn_id": t_ids[i],
+                    "pay_id": p.pay_id,
+                    "match_score": _score(1.0, date_diff, date_window_days, residual, tol, w_vendor, w_date, w_amount),
+                    "match_type": "split",
+                    "vendor_sim": 1.0,
+                    "date_diff_days": date_diff,
+                    "amount_diff_cents": residual,
+                    "matched_at_utc": utc_now_iso(),
+                })
+
+    if stats is not None:
+        stats.update(counts)
+    if not rows:
+        return pd.DataFrame(columns=MATCH_COLUMNS)
+    return pd.DataFrame(rows, columns=MATCH_COLUMNS)
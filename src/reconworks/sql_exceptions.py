@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import Optional
+
+from .db import (
+    create_match_candidates_table,
+    create_match_lookup_indexes,
+    create_matches_table,
+    create_open_items_table,
+    create_qa_flags_table,
+)
+from .exception_codes import (
+    LOW_CONFIDENCE_ACTION,
+    QA_ACTION,
+    UNMATCHED_PAY_ACTION,
+    UNMATCHED_PAY_MESSAGE,
+    UNMATCHED_TX_ACTION,
+    UNMATCHED_TX_MESSAGE,
+    mk_exception_id,
+)
+
+_EXCEPTION_COLUMNS = (
+    "batch_id, exception_id, record_type, record_id, related_record_id, exception_code, severity, message,"
+    " recommended_action, vendor_canonical, vendor_id, date, amount_cents, created_at_utc"
+)
+
+def _sql_format(spec: str, value):
+    return None if value is None else format(float(value), spec)
+
+def register_exception_functions(conn: sqlite3.Connection) -> None:
+    """Deterministic helpers used by the exception SQL.
+
+    ``reconworks_exception_id`` is the same hash as the pandas path and
+    ``reconworks_format`` uses Python formatting, because SQLite's ``printf``
+    rounds some halves differently.
+    """
+    conn.create_function("reconworks_exception_id", 5, mk_exception_id, deterministic=True)
+    conn.create_function("reconworks_format", 2, _sql_format, deterministic=True)
+
+def _text(col: str, default: str) -> str:
+    # str(value or default): NULL and '' fall back to the default.
+    return f"COALESCE(NULLIF(CAST({col} AS TEXT), ''), '{default}')"
+
+def insert_exceptions_sql(
+    conn: sqlite3.Connection,
+    batch_id: str,
+    low_conf_threshold: float,
+    created_at: str,
+    table: str = "exceptions",
+    code: Optional[str] = None,
+) -> int:
+    """Set-based ``build_exceptions``: four ``INSERT ... SELECT`` statements into ``table``.
+
+    Unmatched records are ``NOT EXISTS`` anti-joins against ``matches`` on the
+    (batch_id, txn_id) / (batch_id, pay_id) indexes, and against ``open_items``
+    closed by another batch (a ledger match is stored under the batch that
+    found it), so nothing is pulled into Python. Rows are written in the pandas path's order (QA flags, unmatched
+    transactions, unmatched payments, low-confidence matches; each in rowid
+    order). The caller clears the batch first. ``code`` limits the output to
+    one exception_code (the rollup drill-down). Returns the rows inserted.
+    """
+    create_qa_flags_table(conn)
+    create_matches_table(conn)
+    create_match_candidates_table(conn)
+    create_match_lookup_indexes(conn)
+    create_open_items_table(conn)
+    register_exception_functions(conn)
+
+    params = {"b": batch_id, "created": created_at, "thr": float(low_conf_threshold), "only": code}
+    total = 0
+
+    # 1) QA flags
+    total += conn.execute(
+        f"""
+        INSERT INTO {table} ({_EXCEPTION_COLUMNS})
+        SELECT :b, reconworks_exception_id(:b, rt, rid, code, ''), rt, rid, '', code, sev, msg, :action,
+               vendor_canonical, vendor_id, date, amount_cents, :created
+        FROM (
+            SELECT rowid AS r, {_text("record_type", "")} AS rt, {_text("record_id", "")} AS rid,
+                   {_text("flag_code", "QA_FLAG")} AS code, {_text("severity", "warning")} AS sev,
+                   {_text("message", "")} AS msg, vendor_canonical, vendor_id, date, amount_cents
+            FROM qa_flags WHERE batch_id = :b
+        )
+        WHERE :only IS NULL OR code = :only
+        ORDER BY r;
+        """,
+        {**params, "action": QA_ACTION},
+    ).rowcount
+
+    # 2) + 3) Unmatched facts
+    for rtype, ledger_type, facts, id_col, fact_code, message, action in (
+        ("transactions", "txn", "fact_transactions", "txn_id", "UNMATCHED_TRANSACTION", UNMATCHED_TX_MESSAGE, UNMATCHED_TX_ACTION),
+        ("vendor_payments", "pay", "fact_vendor_payments", "pay_id", "UNMATCHED_VENDOR_PAYMENT", UNMATCHED_PAY_MESSAGE, UNMATCHED_PAY_ACTION),
+    ):
+        if code is not None and code != fact_code:
+            continue
+        total += conn.execute(
+            f"""
+            INSERT INTO {table} ({_EXCEPTION_COLUMNS})
+            SELECT :b, reconworks_exception_id(:b, :rtype, CAST(f.{id_col} AS TEXT), :code, ''), :rtype,
+                   CAST(f.{id_col} AS TEXT), '', :code, 'warning', :message, :action,
+                   f.vendor_canonical, f.vendor_id, f.date, f.amount_cents, :created
+            FROM {facts} f
+            WHERE f.batch_id = :b
+              AND NOT EXISTS (SELECT 1 FROM matches m WHERE m.batch_id = :b AND m.{id_col} = f.{id_col})
+              AND NOT EXISTS (
+                  SELECT 1 FROM open_items o
+                  WHERE o.record_type = :ltype AND o.record_id = f.{id_col} AND o.batch_id = :b
+                    AND o.closed_by_batch_id IS NOT NULL AND o.closed_by_batch_id <> :b
+              )
+            ORDER BY f.rowid;
+            """,
+            {**params, "rtype": rtype, "ltype": ledger_type, "code": fact_code, "message": message, "action": action},
+        ).rowcount
+
+    # 4) Low-confidence matches
+    if code is None or code == "LOW_CONFIDENCE_MATCH":
+        total += conn.execute(
+            f"""
+            INSERT INTO {table} ({_EXCEPTION_COLUMNS})
+            SELECT :b, reconworks_exception_id(:b, 'transactions', CAST(m.txn_id AS TEXT), 'LOW_CONFIDENCE_MATCH', CAST(m.pay_id AS TEXT)),
+                   'transactions', CAST(m.txn_id AS TEXT), CAST(m.pay_id AS TEXT), 'LOW_CONFIDENCE_MATCH', 'warning',
+                   'Matched but low confidence (score=' || reconworks_format('.3f', m.match_score) || ').', :action,
+                   NULL, NULL, NULL, NULL, :created
+            FROM matches m
+            WHERE m.batch_id = :b AND CAST(m.match_score AS REAL) < :thr
+            ORDER BY m.rowid;
+            """,
+            {**params, "action": LOW_CONFIDENCE_ACTION},
+        ).rowcount
+
+    conn.commit()
+    return int(total)
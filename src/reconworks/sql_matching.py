@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .assignment import greedy_assign
+from .config import MatchingConfig
+from .db import create_fact_range_indexes, create_match_lookup_indexes, delete_where_batch, insert_matching_run
+from .incremental import snapshot_inputs
+from .pruning import top_k_mask
+from .scoring import match_type_arrays, score_arrays
+from .similarity import VendorSimilarityCache, vendor_similarity_bulk
+from .util import utc_now_iso
+
+_STAGE_COLUMNS = ["seq", "t_row", "p_row", "txn_id", "pay_id", "vendor_sim", "date_diff_days", "amount_diff_cents", "score"]
+
+def _iter_groups(cur: sqlite3.Cursor, chunk_rows: int, group_col: int) -> Iterator[List[tuple]]:
+    """Fetch rows in chunks that never split a run of equal ``group_col`` values.
+
+    Rows must arrive ordered by ``group_col``; the trailing group of each
+    fetch is held back and prepended to the next one.
+    """
+    carry: List[tuple] = []
+    while True:
+        rows = cur.fetchmany(chunk_rows)
+        if not rows:
+            if carry:
+                yield carry
+            return
+        rows = carry + rows
+        last = rows[-1][group_col]
+        cut = len(rows)
+        while cut > 0 and rows[cut - 1][group_col] == last:
+            cut -= 1
+        if cut == 0:
+            # One group larger than a chunk: keep reading until it ends.
+            carry = rows
+            continue
+        carry = rows[cut:]
+        yield rows[:cut]
+
+def _create_exact_table(conn: sqlite3.Connection) -> None:
+    # Declared INTEGER keys: the anti-joins against fact rowids must be index seeks.
+    conn.execute("DROP TABLE IF EXISTS _sql_exact;")
+    conn.execute("CREATE TEMP TABLE _sql_exact (t_row INTEGER PRIMARY KEY, p_row INTEGER UNIQUE);")
+
+def _exact_pass(conn: sqlite3.Connection, batch_id: str) -> None:
+    """SQL version of ``matching.exact_key_matches`` into temp table ``_sql_exact``."""
+    _create_exact_table(conn)
+    key_filter = (
+        " WHERE batch_id = ? AND vendor_id IS NOT NULL AND TRIM(vendor_id) <> ''"
+        " AND date IS NOT NULL AND TRIM(date) <> '' AND amount_cents IS NOT NULL"
+        " GROUP BY vendor_id, date, amount_cents HAVING COUNT(*) = 1"
+    )
+    conn.execute(
+        "INSERT INTO _sql_exact (t_row, p_row)"
+        " WITH tk AS (SELECT vendor_id, date, amount_cents, MIN(rowid) AS r FROM fact_transactions" + key_filter + "),"
+        " pk AS (SELECT vendor_id, date, amount_cents, MIN(rowid) AS r FROM fact_vendor_payments" + key_filter + ")"
+        " SELECT tk.r AS t_row, pk.r AS p_row FROM tk JOIN pk"
+        " ON pk.vendor_id = tk.vendor_id AND pk.date = tk.date AND pk.amount_cents = tk.amount_cents"
+        " ORDER BY tk.r;",
+        (batch_id, batch_id),
+    )
+
+def _candidate_sql(date_window_days: int) -> str:
+    date_clause = ""
+    if date_window_days > 0:
+        date_clause = " AND p.date BETWEEN date(t.date, :lo) AND date(t.date, :hi)"
+    return (
+        "SELECT t.rowid, p.rowid, t.txn_id, p.pay_id, t.vendor_canonical, p.vendor_canonical, t.vendor_id, p.vendor_id,"
+        " CAST(julianday(p.date) - julianday(t.date) AS INTEGER), p.amount_cents - t.amount_cents"
+        " FROM fact_transactions t"
+        " JOIN fact_vendor_payments p ON p.batch_id = :b"
+        " AND p.amount_cents BETWEEN t.amount_cents - :tol AND t.amount_cents + :tol"
+        f"{date_clause}"
+        " WHERE t.batch_id = :b AND t.amount_cents IS NOT NULL AND julianday(t.date) IS NOT NULL"
+        " AND julianday(p.date) IS NOT NULL"
+        " AND NOT EXISTS (SELECT 1 FROM _sql_exact e WHERE e.t_row = t.rowid)"
+        " AND NOT EXISTS (SELECT 1 FROM _sql_exact e WHERE e.p_row = p.rowid)"
+        " ORDER BY t.rowid, p.rowid"
+    )
+
+def _stage_candidates(
+    conn: sqlite3.Connection,
+    batch_id: str,
+    mcfg: MatchingConfig,
+    chunk_rows: int,
+    similarity_cache: Optional[VendorSimilarityCache],
+) -> int:
+    """Stream the range join through scoring into temp table ``_sql_candidates``."""
+    from .matching import _vendor_array, _vendor_id_array
+
+    conn.execute("DROP TABLE IF EXISTS _sql_candidates;")
+    conn.execute(
+        "CREATE TEMP TABLE _sql_candidates (seq INTEGER PRIMARY KEY, t_row INTEGER, p_row INTEGER, txn_id TEXT, pay_id TEXT,"
+        " vendor_sim REAL, date_diff_days INTEGER, amount_diff_cents INTEGER, score REAL);"
+    )
+    w = int(mcfg.date_window_days)
+    params = {"b": batch_id, "tol": int(mcfg.amount_tolerance_cents), "lo": f"-{w} days", "hi": f"+{w} days"}
+    reader = conn.cursor()
+    reader.execute(_candidate_sql(w), params)
+
+    seq = 0
+    cols = ["t_row", "p_row", "txn_id", "pay_id", "vendor_canonical_t", "vendor_canonical_p", "vendor_id_t", "vendor_id_p",
+            "date_diff_days", "amount_diff_cents"]
+    for rows in _iter_groups(reader, chunk_rows, 0):
+        chunk = pd.DataFrame.from_records(rows, columns=cols)
+        date_diff = chunk["date_diff_days"].to_numpy(dtype=np.int64)
+        amount_diff = chunk["amount_diff_cents"].to_numpy(dtype=np.int64)
+        tx_side = chunk[["vendor_canonical_t", "vendor_id_t"]].set_axis(["vendor_canonical", "vendor_id"], axis=1)
+        pay_side = chunk[["vendor_canonical_p", "vendor_id_p"]].set_axis(["vendor_canonical", "vendor_id"], axis=1)
+        vendor_sim = vendor_similarity_bulk(
+            _vendor_array(tx_side), _vendor_array(pay_side), workers=mcfg.similarity_workers,
+            ids_a=_vendor_id_array(tx_side), ids_b=_vendor_id_array(pay_side), cache=similarity_cache,
+        )
+        score = score_arrays(vendor_sim, date_diff, amount_diff, mcfg.date_window_days, mcfg.amount_tolerance_cents,
+                             mcfg.vendor_weight, mcfg.date_weight, mcfg.amount_weight)
+        # Chunks hold whole transactions, so per-transaction pruning is final here.
+        keep = score >= float(mcfg.candidate_min_score)
+        if mcfg.candidate_top_k > 0:
+            keep &= top_k_mask(chunk["t_row"].to_numpy(), score, vendor_sim, mcfg.candidate_top_k)
+        idx = np.flatnonzero(keep)
+        conn.executemany(
+            "INSERT INTO _sql_candidates VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);",
+            zip(
+                range(seq, seq + len(idx)),
+                chunk["t_row"].to_numpy()[idx].tolist(),
+                chunk["p_row"].to_numpy()[idx].tolist(),
+                chunk["txn_id"].to_numpy()[idx].tolist(),
+                chunk["pay_id"].to_numpy()[idx].tolist(),
+                vendor_sim[idx].tolist(),
+                date_diff[idx].tolist(),
+                amount_diff[idx].tolist(),
+                score[idx].tolist(),
+            ),
+        )
+        seq += len(idx)
+    reader.close()
+
+    if mcfg.candidate_top_k > 0:
+        # Payments span chunks: their top-K is applied once everything is staged.
+        conn.execute(
+            "DELETE FROM _sql_candidates WHERE seq IN (SELECT seq FROM ("
+            " SELECT seq, ROW_NUMBER() OVER (PARTITION BY p_row ORDER BY score DESC, vendor_sim DESC, seq) AS rn"
+            " FROM _sql_candidates) WHERE rn > ?);",
+            (int(mcfg.candidate_top_k),),
+        )
+    conn.commit()
+    return int(conn.execute("SELECT COUNT(1) FROM _sql_candidates;").fetchone()[0])
+
+def _store_candidates(conn: sqlite3.Connection, batch_id: str, storage: str, chunk_rows: int) -> None:
+    from .matching import summarize_candidates
+
+    if storage == "all":
+        conn.execute(
+            "INSERT INTO match_candidates (batch_id, txn_id, pay_id, vendor_sim, date_diff_days, amount_diff_cents, score)"
+            " SELECT ?, txn_id, pay_id, vendor_sim, date_diff_days, amount_diff_cents, score FROM _sql_candidates ORDER BY seq;",
+            (batch_id,),
+        )
+    elif storage == "summary":
+        cur = conn.cursor()
+        cur.execute("SELECT " + ", ".join(_STAGE_COLUMNS) + " FROM _sql_candidates ORDER BY t_row, seq;")
+        for rows in _iter_groups(cur, chunk_rows, 1):
+            chunk = pd.DataFrame.from_records(rows, columns=_STAGE_COLUMNS).assign(batch_id=batch_id)
+            summarize_candidates(chunk).to_sql("match_candidate_summary", conn, if_exists="append", index=False)
+        cur.close()
+    elif storage != "none":
+        raise ValueError("candidate_storage must be 'all', 'summary' or 'none'")
+    conn.commit()
+
+def _assign(conn: sqlite3.Connection, batch_id: str, min_score: float, chunk_rows: int, matched_at: str) -> int:
+    """Greedy assignment over staged candidates, streamed in rank order.
+
+    Used flags live in boolean arrays indexed by fact rowid, so memory is one
+    byte per fact row plus one chunk of candidates.
+    """
+    max_t = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM fact_transactions;").fetchone()[0]
+    max_p = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM fact_vendor_payments;").fetchone()[0]
+    used_t = np.zeros(int(max_t) + 1, dtype=bool)
+    used_p = np.zeros(int(max_p) + 1, dtype=bool)
+    for (t_row, p_row) in conn.execute("SELECT t_row, p_row FROM _sql_exact;"):
+        used_t[t_row] = True
+        used_p[p_row] = True
+
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT " + ", ".join(_STAGE_COLUMNS) + " FROM _sql_candidates WHERE score >= ?"
+        " ORDER BY score DESC, vendor_sim DESC, seq;",
+        (float(min_score),),
+    )
+    count = 0
+    while True:
+        rows = cur.fetchmany(chunk_rows)
+        if not rows:
+            break
+        chunk = pd.DataFrame.from_records(rows, columns=_STAGE_COLUMNS)
+        t_row = chunk["t_row"].to_numpy(dtype=np.int64)
+        p_row = chunk["p_row"].to_numpy(dtype=np.int64)
+        chunk = chunk[~(used_t[t_row] | used_p[p_row])]
+        if chunk.empty:
+            continue
+        # Rows arrive in walk order, so greedy within the chunk continues the global walk.
+        t_codes, _ = pd.factorize(chunk["t_row"])
+        p_codes, _ = pd.factorize(chunk["p_row"])
+        score = chunk["score"].to_numpy(dtype=np.float64)
+        vendor_sim = chunk["vendor_sim"].to_numpy(dtype=np.float64)
+        picked = chunk.iloc[greedy_assign(t_codes, p_codes, score, vendor_sim, min_score)]
+        used_t[picked["t_row"].to_numpy(dtype=np.int64)] = True
+        used_p[picked["p_row"].to_numpy(dtype=np.int64)] = True
+
+        date_diff = picked["date_diff_days"].to_numpy(dtype=np.int64)
+        amount_diff = picked["amount_diff_cents"].to_numpy(dtype=np.int64)
+        pd.DataFrame({
+            "batch_id": batch_id,
+            "txn_id": picked["txn_id"].to_numpy(),
+            "pay_id": picked["pay_id"].to_numpy(),
+            "match_score": picked["score"].to_numpy(dtype=np.float64),
+            "match_type": match_type_arrays(picked["vendor_sim"].to_numpy(dtype=np.float64), date_diff, amount_diff),
+            "vendor_sim": picked["vendor_sim"].to_numpy(dtype=np.float64),
+            "date_diff_days": date_diff,
+            "amount_diff_cents": amount_diff,
+            "matched_at_utc": matched_at,
+        }).to_sql("matches", conn, if_exists="append", index=False)
+        count += len(picked)
+    cur.close()
+    conn.commit()
+    return count
+
+def _unmatched(conn: sqlite3.Connection, table: str, id_col: str, batch_id: str, chunk_rows: int,
+               csv_path: Optional[Path]) -> int:
+    """Count (and optionally export) the batch's rows without a match, one chunk at a time."""
+    sql = (
+        f"SELECT f.* FROM {table} f WHERE f.batch_id = ? AND NOT EXISTS ("
+        f" SELECT 1 FROM matches m WHERE m.batch_id = ? AND m.{id_col} = f.{id_col})"
+    )
+    count = 0
+    first = True
+    for chunk in pd.read_sql_query(sql, conn, params=(batch_id, batch_id), chunksize=chunk_rows):
+        count += len(chunk)
+        if csv_path is not None:
+            chunk.to_csv(csv_path, mode="w" if first else "a", header=first, index=False)
+        first = False
+    if csv_path is not None and first:
+        pd.read_sql_query(f"SELECT * FROM {table} WHERE 0", conn).to_csv(csv_path, index=False)
+    return count
+
+def match_batch_sql(
+    conn: sqlite3.Connection,
+    batch_id: str,
+    mcfg: MatchingConfig,
+    csv_dir: Optional[Path] = None,
+) -> Dict[str, int]:
+    """Out-of-core matching for one batch, with results identical to the in-memory engine.
+
+    Candidates come from a SQLite range join on the fact tables' indexed
+    (batch_id, amount_cents, date) columns and are scored ``sql_chunk_rows`` at a
+    time into a temp table; greedy assignment then streams them in rank order
+    and appends matches as it goes. Nothing proportional to the batch is held
+    as a DataFrame.
+    """
+    if mcfg.assignment_mode != "greedy":
+        raise ValueError("engine = 'sql' supports assignment_mode = 'greedy' only")
+    if mcfg.open_items_ledger or mcfg.split_matching:
+        raise ValueError("engine = 'sql' does not support open_items_ledger or split_matching")
+    from .matching import _score
+
+    chunk_rows = max(1, int(mcfg.sql_chunk_rows))
+    create_fact_range_indexes(conn)
+    create_match_lookup_indexes(conn)
+
+    for table in ("match_candidates", "match_candidate_summary", "matches", "matching_runs"):
+        delete_where_batch(conn, table, batch_id)
+
+    sim_cache = VendorSimilarityCache(conn, max_rows=mcfg.similarity_cache_max_rows) if mcfg.similarity_cache else None
+    matched_at = utc_now_iso()
+
+    if mcfg.exact_fast_path:
+        _exact_pass(conn, batch_id)
+    else:
+        _create_exact_table(conn)
+    exact_count = int(conn.execute("SELECT COUNT(1) FROM _sql_exact;").fetchone()[0])
+    conn.execute(
+        "INSERT INTO matches (batch_id, txn_id, pay_id, match_score, match_type, vendor_sim, date_diff_days, amount_diff_cents, matched_at_utc)"
+        " SELECT ?, t.txn_id, p.pay_id, ?, 'exact', 1.0, 0, 0, ? FROM _sql_exact e"
+        " JOIN fact_transactions t ON t.rowid = e.t_row JOIN fact_vendor_payments p ON p.rowid = e.p_row ORDER BY e.t_row;",
+        (batch_id, _score(1.0, 0, 0, 0, 0, mcfg.vendor_weight, mcfg.date_weight, mcfg.amount_weight), matched_at),
+    )
+    conn.commit()
+
+    candidate_count = _stage_candidates(conn, batch_id, mcfg, chunk_rows, sim_cache)
+    _store_candidates(conn, batch_id, mcfg.candidate_storage, chunk_rows)
+    match_count = exact_count + _assign(conn, batch_id, mcfg.min_score, chunk_rows, matched_at)
+    conn.execute("DROP TABLE IF EXISTS _sql_candidates;")
+    conn.execute("DROP TABLE IF EXISTS _sql_exact;")
+
+    unmatched_tx = _unmatched(conn, "fact_transactions", "txn_id", batch_id, chunk_rows,
+                              csv_dir / "unmatched_transactions.csv" if csv_dir else None)
+    unmatched_pay = _unmatched(conn, "fact_vendor_payments", "pay_id", batch_id, chunk_rows,
+                               csv_dir / "unmatched_vendor_payments.csv" if csv_dir else None)
+    if csv_dir is not None:
+        first = True
+        for chunk in pd.read_sql_query("SELECT * FROM matches WHERE batch_id = ?", conn, params=(batch_id,), chunksize=chunk_rows):
+            chunk.to_csv(csv_dir / "matches.csv", mode="w" if first else "a", header=first, index=False)
+            first = False
+
+    snapshot_inputs(conn, batch_id)
+    insert_matching_run(conn, {
+        "matched_at_utc": matched_at,
+        "batch_id": batch_id,
+        "date_window_days": mcfg.date_window_days,
+        "amount_tolerance_cents": mcfg.amount_tolerance_cents,
+        "min_score": mcfg.min_score,
+        "match_count": match_count,
+        "unmatched_tx_count": unmatched_tx,
+        "unmatched_pay_count": unmatched_pay,
+    })
+    return {
+        "matches": match_count,
+        "unmatched_transactions": unmatched_tx,
+        "unmatched_vendor_payments": unmatched_pay,
+        "candidates": candidate_count,
+        "exact_matches": exact_count,
+        "similarity_cache_hits": int(sim_cache.hits) if sim_cache else 0,
+        "similarity_cache_misses": int(sim_cache.misses) if sim_cache else 0,
+    }
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import Tuple
+
+import pandas as pd
+
+from .db import (
+    create_exceptions_table,
+    create_match_candidates_table,
+    create_match_lookup_indexes,
+    create_matches_table,
+    create_report_indexes,
+)
+from .report_marts import exceptions_by_code_sql
+
+# Same groups as report_marts.spend_groups: NULL month/vendor form their own group, spend is summed
+# in whole cents, and is_matched is an EXISTS probe on the (batch_id, txn_id) index of matches.
+_GROUPS = """
+    WITH g AS (
+        SELECT f.batch_id, f.month, f.vendor_canonical,
+               SUM(f.txn_id IS NOT NULL) AS txn_count,
+               SUM(f.txn_id IS NOT NULL AND EXISTS (
+                   SELECT 1 FROM matches m WHERE m.batch_id = f.batch_id AND m.txn_id = f.txn_id
+               )) AS matched_count,
+               SUM(CASE WHEN f.txn_id IS NOT NULL THEN COALESCE(CAST(f.amount_cents AS INTEGER), 0) ELSE 0 END) AS spend_cents
+        FROM fact_transactions f
+        WHERE f.batch_id = :b
+        GROUP BY f.batch_id, f.month, f.vendor_canonical
+        HAVING SUM(f.txn_id IS NOT NULL) > 0
+    )
+"""
+
+def has_transactions(conn: sqlite3.Connection, batch_id: str) -> bool:
+    return conn.execute("SELECT 1 FROM fact_transactions WHERE batch_id = ? LIMIT 1;", (batch_id,)).fetchone() is not None
+
+def report_marts_sql(conn: sqlite3.Connection, batch_id: str, top_n: int) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """The four ``rpt_*`` marts of one batch, each computed by a single SQL statement.
+
+    Only the grouped rows are read into Python, so memory does not grow with
+    the batch. Values equal the pandas path (``marts_from_groups``): spend is
+    summed in cents and divided by 100 at the end, and match_rate is rounded
+    with pandas after the fetch. Ties in the top-vendor cut are broken by
+    vendor name. Returns (spend, match_rate, exceptions_by_code, top_vendors).
+    """
+    create_matches_table(conn)
+    create_match_candidates_table(conn)
+    create_match_lookup_indexes(conn)
+    create_exceptions_table(conn)
+    create_report_indexes(conn)
+    params = {"b": batch_id, "n": int(top_n)}
+
+    spend = pd.read_sql_query(
+        _GROUPS + """
+        SELECT batch_id, month, vendor_canonical, txn_count, matched_count, spend_cents / 100.0 AS spend_usd
+        FROM g
+        ORDER BY month IS NULL, month, spend_usd DESC, vendor_canonical;
+        """,
+        conn, params=params,
+    )
+    # groupby(["batch_id", "month"]) in pandas drops NULL months.
+    match_rate = pd.read_sql_query(
+        _GROUPS + """
+        SELECT batch_id, month, SUM(txn_count) AS txn_count, SUM(matched_count) AS matched_count,
+               SUM(spend_cents) / 100.0 AS spend_usd
+        FROM g
+        WHERE month IS NOT NULL
+        GROUP BY batch_id, month
+        ORDER BY month;
+        """,
+        conn, params=params,
+    )
+    match_rate["match_rate"] = (match_rate["matched_count"] / match_rate["txn_count"]).round(4)
+    top_vendors = pd.read_sql_query(
+        _GROUPS + """
+        SELECT batch_id, vendor_canonical, SUM(spend_cents) / 100.0 AS spend_usd, SUM(txn_count) AS txn_count
+        FROM g
+        WHERE vendor_canonical IS NOT NULL
+        GROUP BY batch_id, vendor_canonical
+        ORDER BY spend_usd DESC, vendor_canonical
+        LIMIT :n;
+        """,
+        conn, params=params,
+    )
+    exc_by = exceptions_by_code_sql(conn, batch_id)
+    return spend, match_rate, exc_by, top_vendors
@@ -0,0 +1,37 @@
+import pytest
+import numpy as np
+from reconworks.assignment import greedy_assign
+
+def _sequential(t, p, score, vs, min_score):
+    order = sorted(range(len(score)), key=lambda i: (-score[i], -vs[i], i))
+    used_t, used_p, out = set(), set(), []
+    for i in order:
+        if score[i] < min_score:
+            break
+        if t[i] in used_t or p[i] in used_p:
+            continue
+        used_t.add(t[i]); used_p.add(p[i]); out.append(i)
+    return out
+
+def test_greedy_assign_matches_sequential_walk():
+    rng = np.random.default_rng(11)
+    for _ in range(20):
+        n = int(rng.integers(1, 2000))
+        t = rng.integers(0, 150, n)
+        p = rng.integers(0, 150, n)
+        score = np.round(rng.random(n), 2)
+        vs = np.round(rng.random(n), 1)
+        got = greedy_assign(t, p, score, vs, 0.5).tolist()
+        assert got == _sequential(t.tolist(), p.tolist(), score.tolist(), vs.tolist(), 0.5)
+
+def test_optimal_assign_beats_blocking_greedy_pick():
+    pytest.importorskip("scipy")
+    from reconworks.assignment import optimal_assign
+
+    # Greedy takes t0-p0 (0.95) and blocks t0-p1 + t1-p0 (0.90 + 0.90).
+    t, p = np.array([0, 0, 1]), np.array([0, 1, 0])
+    score, vs = np.array([0.95, 0.90, 0.90]), np.ones(3)
+    assert greedy_assign(t, p, score, vs, 0.85).tolist() == [0]
+    assert sorted(optimal_assign(t, p, score, vs, 0.85).tolist()) == [1, 2]
+    # Oversized components fall back to greedy
+    assert optimal_assign(t, p, score, vs, 0.85, max_component_size=3).tolist() == [0]
@@ -0,0 +1,39 @@
+import sqlite3
+
+import pandas as pd
+from reconworks.db import create_ingest_files_table
+from reconworks.duplicates import cross_batch_duplicate_flags
+from reconworks.modeling import _ensure_fact_tables
+
+def test_cross_batch_duplicates_skip_reloaded_rows():
+    conn = sqlite3.connect(":memory:")
+    _ensure_fact_tables(conn)
+    rows = [
+        ("t1", "b1", "jan.csv", "v1", "2025-01-30", 4827),
+        ("t2", "b2", "feb.csv", "v1", "2025-01-30", 4827),  # same charge in the next export
+        ("t3", "b2", "jan.csv", "v2", "2025-01-12", 1790),  # jan.csv loaded again
+        ("t4", "b1", "jan.csv", "v2", "2025-01-12", 1790),
+        ("t5", "b2", "feb.csv", "v2", "2025-02-12", 1790),
+    ]
+    pd.DataFrame(rows, columns=["txn_id", "batch_id", "source_file", "vendor_id", "date", "amount_cents"]).to_sql(
+        "fact_transactions", conn, if_exists="append", index=False)
+
+    flags = cross_batch_duplicate_flags(conn, "b2", "now")
+    assert flags["record_id"].tolist() == ["t2"]
+    assert flags["message"].iloc[0].startswith("Potential duplicate of t1 in batch b1")
+    # Re-checking the older batch does not flag its side of the pair.
+    assert cross_batch_duplicate_flags(conn, "b1", "now").empty
+
+def test_cross_batch_duplicates_follow_ingest_order():
+    conn = sqlite3.connect(":memory:")
+    _ensure_fact_tables(conn)
+    create_ingest_files_table(conn)
+    conn.executemany("INSERT INTO ingest_files (batch_id, ingested_at_utc) VALUES (?, ?);",
+                     [("b1", "2025-02-01T00:00:00"), ("b2", "2025-03-01T00:00:00")])
+    # b1 was re-modeled after b2, so its fact rows now have the higher rowids.
+    rows = [("t2", "b2", "feb.csv", "v1", "2025-01-30", 4827), ("t1", "b1", "jan.csv", "v1", "2025-01-30", 4827)]
+    pd.DataFrame(rows, columns=["txn_id", "batch_id", "source_file", "vendor_id", "date", "amount_cents"]).to_sql(
+        "fact_transactions", conn, if_exists="append", index=False)
+
+    assert cross_batch_duplicate_flags(conn, "b1", "now").empty
+    assert cross_batch_duplicate_flags(conn, "b2", "now")["record_id"].tolist() == ["t2"]
@@ -0,0 +1,91 @@
+import sqlite3
+
+import pandas as pd
+from reconworks.db import create_exceptions_table, create_open_items_table
+from reconworks.exception_lifecycle import apply_exception_delta, create_exceptions_stage, exception_delta_frame, stage_exceptions
+from reconworks.exception_rollups import rollup_exceptions
+from reconworks.exceptions import build_exceptions
+
+def _run(conn, batch_id, ft, matches, now, rollup_threshold=0):
+    create_exceptions_stage(conn)
+    stage_exceptions(conn, build_exceptions(batch_id, None, ft, pd.DataFrame(), matches, low_conf_threshold=0.9))
+    rollup_exceptions(conn, batch_id, rollup_threshold, {}, now)
+    return apply_exception_delta(conn, batch_id, now)
+
+def test_lifecycle_writes_only_the_delta():
+    conn = sqlite3.connect(":memory:")
+    create_exceptions_table(conn)
+    ft = pd.DataFrame([{"txn_id": t, "vendor_canonical": "Uber", "vendor_id": "v2", "date": "2025-01-04", "amount_cents": 1790}
+                       for t in ("t1", "t2")])
+    none = pd.DataFrame(columns=["txn_id", "pay_id", "match_score"])
+
+    assert _run(conn, "b1", ft, none, "t0")["exceptions_new"] == 2
+    counts = _run(conn, "b1", ft, none, "t1")
+    assert (counts["exceptions_new"], counts["exceptions_unchanged"]) == (0, 2)
+
+    # t2 gets a low-confidence match: its unmatched exception resolves, a new one appears.
+    counts = _run(conn, "b1", ft, pd.DataFrame([{"txn_id": "t2", "pay_id": "p1", "match_score": 0.85}]), "t2")
+    assert (counts["exceptions_new"], counts["exceptions_resolved"], counts["exceptions_unchanged"]) == (1, 1, 1)
+    delta = exception_delta_frame(conn)
+    assert delta["change"].tolist() == ["new", "resolved"]
+    assert delta["message"].isna().tolist() == [False, True]
+
+    counts = _run(conn, "b1", ft, none, "t3")
+    assert (counts["exceptions_reopened"], counts["exceptions_resolved"]) == (1, 1)
+    life = pd.read_sql_query("SELECT * FROM exception_lifecycle ORDER BY first_seen_utc, record_id", conn)
+    assert life["first_seen_utc"].tolist() == ["t0", "t0", "t2"]
+    assert life["last_seen_utc"].tolist() == ["t3", "t3", "t2"]
+    assert life["resolved_at_utc"].fillna("").tolist() == ["", "", "t3"]
+    assert conn.execute("SELECT COUNT(*) FROM exceptions").fetchone()[0] == 2
+
+def test_ledger_closure_resolves_other_batch():
+    conn = sqlite3.connect(":memory:")
+    create_exceptions_table(conn)
+    create_open_items_table(conn)
+    ft = pd.DataFrame([{"txn_id": "t1", "vendor_canonical": "Uber", "vendor_id": "v2", "date": "2025-01-30", "amount_cents": 1790}])
+    _run(conn, "b1", ft, pd.DataFrame(columns=["txn_id", "pay_id", "match_score"]), "t0")
+    conn.execute("INSERT INTO open_items (record_type, record_id, batch_id, closed_by_batch_id) VALUES ('txn', 't1', 'b1', 'b2');")
+
+    counts = _run(conn, "b2", ft.head(0), pd.DataFrame(columns=["txn_id", "pay_id", "match_score"]), "t1")
+    assert counts["exceptions_resolved"] == 1
+    assert conn.execute("SELECT resolved_by_batch_id FROM exception_lifecycle").fetchone()[0] == "b2"
+    assert conn.execute("SELECT COUNT(*) FROM exceptions").fetchone()[0] == 0
+
+    # Re-running the older batch: its own matches still lack t1, but the ledger closure sticks.
+    counts = _run(conn, "b1", ft, pd.DataFrame(columns=["txn_id", "pay_id", "match_score"]), "t2")
+    assert (counts["exceptions_reopened"], counts["exceptions_new"], counts["exceptions_resolved"]) == (0, 0, 0)
+    assert conn.execute("SELECT resolved_by_batch_id, resolved_at_utc FROM exception_lifecycle").fetchone() == ("b2", "t1")
+    assert conn.execute("SELECT COUNT(*) FROM exceptions").fetchone()[0] == 0
+
+def test_ledger_closure_seen_first_by_the_older_batch():
+    conn = sqlite3.connect(":memory:")
+    create_exceptions_table(conn)
+    create_open_items_table(conn)
+    ft = pd.DataFrame([{"txn_id": "t1", "vendor_canonical": "Uber", "vendor_id": "v2", "date": "2025-01-30", "amount_cents": 1790}])
+    none = pd.DataFrame(columns=["txn_id", "pay_id", "match_score"])
+    _run(conn, "b1", ft, none, "t0")
+    conn.execute("INSERT INTO open_items (record_type, record_id, batch_id, closed_by_batch_id) VALUES ('txn', 't1', 'b1', 'b2');")
+
+    # b1 is re-run before b2's exceptions: the exception resolves, credited to the closing batch.
+    assert _run(conn, "b1", ft, none, "t1")["exceptions_resolved"] == 1
+    assert conn.execute("SELECT resolved_by_batch_id FROM exception_lifecycle").fetchone()[0] == "b2"
+
+def test_rolled_up_ids_stay_open():
+    conn = sqlite3.connect(":memory:")
+    create_exceptions_table(conn)
+    ft = pd.DataFrame([{"txn_id": t, "vendor_canonical": "Uber", "vendor_id": "v2", "date": "2025-01-04", "amount_cents": 1790}
+                       for t in ("t1", "t2", "t3")])
+    none = pd.DataFrame(columns=["txn_id", "pay_id", "match_score"])
+    _run(conn, "b1", ft, none, "t0")
+
+    # The code crosses the threshold: its rows fold into a rollup, but nothing was fixed.
+    counts = _run(conn, "b1", ft, none, "t1", rollup_threshold=2)
+    assert (counts["exceptions_new"], counts["exceptions_absorbed"], counts["exceptions_resolved"]) == (1, 3, 0)
+    assert conn.execute("SELECT COUNT(*) FROM exception_lifecycle WHERE resolved_at_utc IS NULL").fetchone()[0] == 4
+    assert conn.execute("SELECT record_type FROM exceptions").fetchall() == [("rollup",)]
+
+    # Fixing one record resolves it even while rolled up.
+    counts = _run(conn, "b1", ft, pd.DataFrame([{"txn_id": "t3", "pay_id": "p1", "match_score": 0.95}]), "t2", rollup_threshold=1)
+    assert (counts["exceptions_resolved"], counts["exceptions_unchanged"]) == (1, 2)
+    resolved = conn.execute("SELECT record_id FROM exception_lifecycle WHERE resolved_at_utc IS NOT NULL").fetchall()
+    assert resolved == [("t3",)]
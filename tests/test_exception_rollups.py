@@ -0,0 +1,47 @@
+import sqlite3
+
+import pandas as pd
+from reconworks.db import create_exceptions_table, create_qa_flags_table
+from reconworks.exception_lifecycle import STAGE_TABLE, create_exceptions_stage
+from reconworks.exception_rollups import drilldown_exceptions, rollup_exceptions
+from reconworks.report_marts import exceptions_by_code_sql
+from reconworks.sql_exceptions import insert_exceptions_sql
+
+def test_rollup_and_drilldown():
+    conn = sqlite3.connect(":memory:")
+    create_qa_flags_table(conn)
+    create_exceptions_table(conn)
+    qa = pd.DataFrame([
+        {"batch_id": "b1", "record_type": "transactions", "record_id": f"t{i}", "flag_code": "WEEKEND_TRANSACTION",
+         "severity": sev, "message": "Weekend.", "vendor_canonical": v, "vendor_id": v, "date": d, "amount_cents": 100 * i}
+        for i, (v, d, sev) in enumerate([("Uber", "2025-01-04", "info"), ("Uber", "2025-01-05", "info"),
+                                          ("Lyft", "2025-01-11", "info"), ("Lyft", "2025-01-12", "warning")], start=1)
+    ] + [{"batch_id": "b1", "record_type": "transactions", "record_id": "t9", "flag_code": "MISSING_DATE",
+          "severity": "error", "message": "Missing parsed date.", "amount_cents": 5}])
+    qa.to_sql("qa_flags", conn, if_exists="append", index=False)
+    for table, id_col in (("fact_transactions", "txn_id"), ("fact_vendor_payments", "pay_id")):
+        conn.execute(f"CREATE TABLE {table} (batch_id TEXT, {id_col} TEXT, vendor_canonical TEXT, vendor_id TEXT, date TEXT, amount_cents INTEGER);")
+
+    create_exceptions_stage(conn)
+    insert_exceptions_sql(conn, "b1", 0.9, "now", table=STAGE_TABLE)
+    counts = rollup_exceptions(conn, "b1", threshold=2, code_thresholds={"MISSING_DATE": 0}, created_at="now")
+    assert counts == {"exceptions_rolled_up": 4, "exception_rollups": 2}
+
+    # One rollup row per severity, so the by-code report keeps its severity split.
+    staged = pd.read_sql_query(f"SELECT * FROM {STAGE_TABLE} ORDER BY rowid", conn)
+    assert staged["exception_code"].tolist() == ["MISSING_DATE", "WEEKEND_TRANSACTION", "WEEKEND_TRANSACTION"]
+    assert staged["severity"].tolist()[1:] == ["info", "warning"]
+    assert staged["record_type"].iloc[1] == "rollup" and staged["amount_cents"].tolist()[1:] == [600, 400]
+    assert staged["exception_id"].nunique() == 3
+    rollups = conn.execute(
+        "SELECT severity, exception_count, amount_cents_sum, vendor_count, top_vendor_canonical, top_vendor_count, date_min, date_max"
+        " FROM exception_rollups ORDER BY severity").fetchall()
+    assert rollups == [("info", 3, 600, 2, "Uber", 2, "2025-01-04", "2025-01-11"),
+                       ("warning", 1, 400, 1, "Lyft", 1, "2025-01-12", "2025-01-12")]
+
+    conn.execute(f"INSERT INTO exceptions SELECT * FROM {STAGE_TABLE};")
+    by_code = exceptions_by_code_sql(conn, "b1").sort_values(["exception_code", "severity"])
+    assert by_code["exception_count"].tolist() == [1, 3, 1]
+
+    detail = drilldown_exceptions(conn, "b1", "WEEKEND_TRANSACTION", 0.9, "now")
+    assert detail["record_id"].tolist() == ["t1", "t2", "t3", "t4"]
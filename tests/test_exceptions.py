@@ -0,0 +1,67 @@
+import dataclasses
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+from reconworks.config import load_config
+from reconworks.db import create_exceptions_table, create_matches_table, create_open_items_table, create_qa_flags_table
+from reconworks.exception_codes import mk_exception_id
+from reconworks.exceptions import build_exceptions, exceptions_all
+from reconworks.sql_exceptions import insert_exceptions_sql
+
+def _inputs():
+    qa = pd.DataFrame([{"record_type": "transactions", "record_id": "t1", "flag_code": "MISSING_DATE", "severity": "error",
+                        "message": "Missing parsed date.", "vendor_canonical": "Uber", "vendor_id": "v2", "date": None, "amount_cents": 1790}])
+    ft = pd.DataFrame([{"txn_id": t, "vendor_canonical": "Uber", "vendor_id": "v2", "date": "2025-01-04", "amount_cents": 1790} for t in ("t1", "t2")])
+    fp = pd.DataFrame([{"pay_id": "p1", "vendor_canonical": "Uber", "vendor_id": "v2", "date": "2025-01-05", "amount_cents": 1790}])
+    matches = pd.DataFrame([{"txn_id": "t2", "pay_id": "p1", "match_score": 0.8512}])
+    return qa, ft, fp, matches
+
+def test_build_exceptions_rows_and_ids():
+    exc = build_exceptions("b1", *_inputs(), low_conf_threshold=0.9)
+    assert exc["exception_code"].tolist() == ["MISSING_DATE", "UNMATCHED_TRANSACTION", "LOW_CONFIDENCE_MATCH"]
+    assert exc["record_id"].tolist() == ["t1", "t1", "t2"]
+    assert exc["exception_id"].iloc[2] == mk_exception_id("b1", "transactions", "t2", "LOW_CONFIDENCE_MATCH", "p1")
+    assert exc["message"].iloc[2] == "Matched but low confidence (score=0.851)."
+    assert exc["amount_cents"].iloc[1] == 1790 and pd.isna(exc["amount_cents"].iloc[2])
+
+def test_sql_exceptions_match_pandas():
+    qa, ft, fp, matches = _inputs()
+    conn = sqlite3.connect(":memory:")
+    create_qa_flags_table(conn)
+    create_exceptions_table(conn)
+    qa.assign(batch_id="b1").to_sql("qa_flags", conn, if_exists="append", index=False)
+    ft.assign(batch_id="b1").to_sql("fact_transactions", conn, index=False)
+    fp.assign(batch_id="b1").to_sql("fact_vendor_payments", conn, index=False)
+    matches.assign(batch_id="b1").to_sql("matches", conn, index=False)
+
+    assert insert_exceptions_sql(conn, "b1", 0.9, "2025-01-01T00:00:00Z") == 3
+    got = pd.read_sql_query("SELECT * FROM exceptions ORDER BY rowid", conn).drop(columns="created_at_utc")
+    want = build_exceptions("b1", qa, ft, fp, matches, low_conf_threshold=0.9).drop(columns="created_at_utc")
+    pd.testing.assert_frame_equal(got, want, check_dtype=False)
+
+def test_ledger_closed_records_are_not_unmatched(tmp_path):
+    # Lifecycle off: a re-run of the older batch must not re-emit what a later batch matched via the ledger.
+    cfg = load_config(Path(__file__).resolve().parents[1] / "config.toml")
+    cfg = dataclasses.replace(cfg, output_dir="out", database_path="out/reconworks.db",
+                              exceptions=dataclasses.replace(cfg.exceptions, lifecycle=False, rollup_threshold=0, rollup_thresholds={}))
+    (tmp_path / "out").mkdir()
+    conn = sqlite3.connect(tmp_path / "out" / "reconworks.db")
+    _, ft, fp, _ = _inputs()
+    ft.assign(batch_id="b1").to_sql("fact_transactions", conn, index=False)
+    fp.head(0).assign(batch_id="b1").to_sql("fact_vendor_payments", conn, index=False)
+    create_qa_flags_table(conn)
+    create_matches_table(conn)
+    create_open_items_table(conn)
+    conn.execute("INSERT INTO matches (batch_id, txn_id, pay_id, match_score) VALUES ('b2', 't1', 'p9', 1.0);")
+    conn.execute("INSERT INTO open_items (record_type, record_id, batch_id, closed_by_batch_id) VALUES ('txn', 't1', 'b1', 'b2');")
+    conn.commit()
+    conn.close()
+
+    for engine in ("pandas", "sql"):
+        run_cfg = dataclasses.replace(cfg, exceptions=dataclasses.replace(cfg.exceptions, engine=engine))
+        exceptions_all(tmp_path, run_cfg, batch_id="b1")
+        conn = sqlite3.connect(tmp_path / "out" / "reconworks.db")
+        rows = conn.execute("SELECT exception_code, record_id FROM exceptions WHERE batch_id = 'b1' ORDER BY rowid").fetchall()
+        conn.close()
+        assert rows == [("UNMATCHED_TRANSACTION", "t2")], engine
@@ -0,0 +1,36 @@
+import sqlite3
+
+import pandas as pd
+from reconworks.db import create_matches_table
+from reconworks.incremental import affected_neighbourhood, changed_records, snapshot_inputs
+from reconworks.modeling import _ensure_fact_tables
+
+def test_changed_records_and_neighbourhood():
+    conn = sqlite3.connect(":memory:")
+    _ensure_fact_tables(conn)
+    create_matches_table(conn)
+    ft = pd.DataFrame([
+        {"txn_id": "t1", "batch_id": "b1", "vendor_canonical": "Amazon", "vendor_id": "v1", "date": "2025-03-02", "amount_cents": 4827},
+        {"txn_id": "t2", "batch_id": "b1", "vendor_canonical": "Uber", "vendor_id": "v2", "date": "2025-03-03", "amount_cents": 1790},
+    ])
+    fp = pd.DataFrame([
+        {"pay_id": "p1", "batch_id": "b1", "vendor_canonical": "Amazon", "vendor_id": "v1", "date": "2025-03-02", "amount_cents": 4827},
+        {"pay_id": "p2", "batch_id": "b1", "vendor_canonical": "Uber", "vendor_id": "v2", "date": "2025-03-04", "amount_cents": 1790},
+    ])
+    ft.to_sql("fact_transactions", conn, if_exists="append", index=False)
+    fp.to_sql("fact_vendor_payments", conn, if_exists="append", index=False)
+    conn.execute("INSERT INTO matches (batch_id, txn_id, pay_id) VALUES ('b1', 't1', 'p1'), ('b1', 't2', 'p2');")
+    snapshot_inputs(conn, "b1")
+    assert changed_records(conn, "b1", "pay") == ([], [])
+
+    # A late duplicate of the Uber payment and a corrected Amazon amount.
+    conn.execute("INSERT INTO fact_vendor_payments (pay_id, batch_id, vendor_canonical, vendor_id, date, amount_cents)"
+                 " VALUES ('p3', 'b1', 'Uber', 'v2', '2025-03-03', 1790);")
+    conn.execute("UPDATE fact_vendor_payments SET amount_cents = 4830 WHERE pay_id = 'p1';")
+    changed, deleted = changed_records(conn, "b1", "pay")
+    assert changed == ["p1", "p3"] and deleted == []
+
+    tx, pay = affected_neighbourhood(conn, "b1", set(), {"p3"}, set(), set(), 3, 0)
+    assert tx == {"t2"} and pay == {"p2", "p3"}
+    tx, pay = affected_neighbourhood(conn, "b1", set(), {"p1"}, set(), set(), 3, 0)
+    assert tx == {"t1"} and pay == {"p1"}
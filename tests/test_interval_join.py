@@ -0,0 +1,24 @@
+import numpy as np
+from reconworks.interval_join import interval_join
+
+def _brute(ta, td, pa, pd_, w, tol):
+    pairs = []
+    for i in range(len(ta)):
+        for j in range(len(pa)):
+            if w > 0 and abs(pd_[j] - td[i]) > w:
+                continue
+            if tol == 0 and pa[j] != ta[i]:
+                continue
+            if tol != 0 and abs(pa[j] - ta[i]) > tol:
+                continue
+            pairs.append((i, j))
+    return pairs
+
+def test_interval_join_matches_brute_force():
+    rng = np.random.default_rng(7)
+    ta, td = rng.integers(0, 20, 80), rng.integers(0, 30, 80)
+    pa, pd_ = rng.integers(0, 20, 90), rng.integers(0, 30, 90)
+    for w in (0, 1, 3):
+        for tol in (0, 2):
+            ti, pi = interval_join(ta, td, pa, pd_, w, tol, block_size=16)
+            assert list(zip(ti.tolist(), pi.tolist())) == _brute(ta, td, pa, pd_, w, tol)
@@ -1,5 +1,5 @@
 import pandas as pd
-from reconworks.matching import build_candidates, choose_matches
+from reconworks.matching import build_candidates, choose_matches, exact_key_matches
 
 def test_basic_exact_match():
     ft = pd.DataFrame([{
@@ -31,3 +31,19 @@ def test_basic_exact_match():
     matches = choose_matches(cand, min_score=0.85)
     assert len(matches) == 1
     assert matches.iloc[0]["match_type"] == "exact"
+
+def test_exact_key_fast_path_skips_ambiguous_keys():
+    ft = pd.DataFrame([
+        {"txn_id": "t1", "vendor_canonical": "Amazon", "vendor_id": "v1", "date": "2025-12-02", "amount_cents": 4827},
+        {"txn_id": "t2", "vendor_canonical": "Uber", "vendor_id": "v2", "date": "2025-12-03", "amount_cents": 1790},
+        {"txn_id": "t3", "vendor_canonical": "Uber", "vendor_id": "v2", "date": "2025-12-03", "amount_cents": 1790},
+    ])
+    fp = pd.DataFrame([
+        {"pay_id": "p1", "vendor_canonical": "Amazon", "vendor_id": "v1", "date": "2025-12-02", "amount_cents": 4827},
+        {"pay_id": "p2", "vendor_canonical": "Uber", "vendor_id": "v2", "date": "2025-12-03", "amount_cents": 1790},
+    ])
+    exact, rest_tx, rest_pay = exact_key_matches("b1", ft, fp, w_vendor=0.6, w_date=0.3, w_amount=0.1)
+    assert exact[["txn_id", "pay_id"]].values.tolist() == [["t1", "p1"]]
+    assert (exact["match_type"] == "exact").all()
+    assert sorted(rest_tx["txn_id"]) == ["t2", "t3"]
+    assert rest_pay["pay_id"].tolist() == ["p2"]
@@ -0,0 +1,35 @@
+import sqlite3
+
+import pandas as pd
+from reconworks.open_items import closed_elsewhere, load_open_items, reset_batch, update_ledger
+
+def _facts(conn):
+    ft = pd.DataFrame([
+        {"txn_id": "t1", "batch_id": "b1", "vendor_canonical": "Amazon", "vendor_id": "v1", "date": "2025-03-30", "amount_cents": 4827},
+        {"txn_id": "t2", "batch_id": "b1", "vendor_canonical": "Uber", "vendor_id": "v2", "date": "2025-03-01", "amount_cents": 1790},
+    ])
+    fp = pd.DataFrame([
+        {"pay_id": "p1", "batch_id": "b2", "vendor_canonical": "Amazon", "vendor_id": "v1", "date": "2025-04-01", "amount_cents": 4827},
+    ])
+    ft.to_sql("fact_transactions", conn, index=False)
+    fp.to_sql("fact_vendor_payments", conn, index=False)
+    return ft, fp
+
+def test_open_items_carry_over_and_close():
+    conn = sqlite3.connect(":memory:")
+    ft, fp = _facts(conn)
+    update_ledger(conn, "b1", pd.DataFrame(columns=["txn_id", "pay_id"]), ft, fp.iloc[:0])
+
+    # Only t1 sits inside the date window of the April payment.
+    carried = load_open_items(conn, "txn", "b2", fp, date_window_days=3, amount_tolerance_cents=0)
+    assert carried["txn_id"].tolist() == ["t1"]
+    assert load_open_items(conn, "txn", "b2", fp, date_window_days=1, amount_tolerance_cents=0).empty
+
+    stats = update_ledger(conn, "b2", pd.DataFrame({"txn_id": ["t1"], "pay_id": ["p1"]}), ft.iloc[:0], fp.iloc[:0])
+    assert stats == {"closed": 1, "added": 0}
+    assert load_open_items(conn, "txn", "b2", fp, date_window_days=3, amount_tolerance_cents=0).empty
+    assert closed_elsewhere(conn, "txn", "b1") == {"t1"}
+
+    # Re-running b2 reopens what it closed.
+    reset_batch(conn, "b2")
+    assert closed_elsewhere(conn, "txn", "b1") == set()
@@ -0,0 +1,35 @@
+import sqlite3
+
+import pandas as pd
+from reconworks.outliers import vendor_outlier_flags
+
+def _batch(prefix, rows):
+    return pd.DataFrame([
+        {"txn_id": f"{prefix}{i}", "vendor_canonical": v, "vendor_id": v, "date": "2025-03-01", "amount_cents": a}
+        for i, (v, a) in enumerate(rows)
+    ])
+
+def test_vendor_outliers_use_each_vendors_history():
+    conn = sqlite3.connect(":memory:")
+    history = _batch("a", [("coffee", 400 + i % 3) for i in range(30)] + [("cloud", 500000 + i % 3) for i in range(30)])
+    assert vendor_outlier_flags(conn, "b1", history, history.iloc[:0], 0.99, 20, 0.01, "now").empty
+
+    new = _batch("b", [("coffee", 40000), ("cloud", 500000), ("coffee", 410)])
+    for _ in range(2):  # re-running a batch replaces its sketch counts
+        flags = vendor_outlier_flags(conn, "b2", new, new.iloc[:0], 0.99, 20, 0.01, "now")
+        assert flags["record_id"].tolist() == ["b0"]
+        assert "over 32 records" in flags["message"].iloc[0]
+    assert conn.execute("SELECT SUM(count) FROM vendor_amount_sketch").fetchone()[0] == 63
+
+def test_blank_vendors_are_not_sketched_or_flagged():
+    conn = sqlite3.connect(":memory:")
+    # Unmapped vendors come out of modeling as "", a mix of unrelated payees.
+    history = _batch("a", [("", 400 + i % 3) for i in range(30)] + [(None, 500) for _ in range(5)])
+    assert vendor_outlier_flags(conn, "b1", history, history.iloc[:0], 0.99, 20, 0.01, "now").empty
+    assert conn.execute("SELECT COUNT(*) FROM vendor_amount_sketch").fetchone()[0] == 0
+
+    # Even with an old pooled "" sketch in the table, blank rows are not compared against it.
+    conn.execute("INSERT INTO vendor_amount_sketch (record_type, relative_accuracy, vendor_id, batch_id, bucket, count)"
+                 " VALUES ('transactions', 0.01, '', 'b0', 600, 50);")
+    new = _batch("b", [("", 900000), ("  ", 900000)])
+    assert vendor_outlier_flags(conn, "b2", new, new.iloc[:0], 0.99, 20, 0.01, "now").empty
@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+from reconworks.matching import build_candidates
+from reconworks.parallel_matching import build_candidates_parallel
+
+def _facts(idcol, n, rng):
+    days = pd.to_datetime("2025-01-01") + pd.to_timedelta(rng.integers(0, 90, n), unit="D")
+    return pd.DataFrame({
+        idcol: [f"{idcol}{i}" for i in range(n)],
+        "vendor_canonical": rng.choice(["Amazon", "Amazon Web Services", "Uber", "Lyft"], n),
+        "vendor_id": "",
+        "date": days.strftime("%Y-%m-%d"),
+        "amount_cents": rng.integers(0, 300, n),
+    })
+
+def test_parallel_candidates_match_serial():
+    rng = np.random.default_rng(2)
+    ft, fp = _facts("txn_id", 400, rng), _facts("pay_id", 450, rng)
+    for window, tol in [(3, 0), (3, 25), (0, 5)]:
+        serial = build_candidates("b1", ft, fp, window, tol, 0.6, 0.3, 0.1)
+        par = build_candidates_parallel(
+            "b1", ft, fp, window, tol, 0.6, 0.3, 0.1,
+            n_workers=2, amount_bucket_cents=40, date_block_days=10,
+        )
+        pd.testing.assert_frame_equal(serial.reset_index(drop=True), par, check_dtype=False)
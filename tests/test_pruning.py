@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+from reconworks.matching import build_candidates, summarize_candidates
+from reconworks.pruning import top_k_mask
+
+def test_top_k_mask_ranks_by_score_then_vendor_sim():
+    keys = np.array([0, 0, 0, 1, 1])
+    score = np.array([0.9, 0.95, 0.9, 0.5, 0.6])
+    vs = np.array([0.8, 0.7, 0.9, 1.0, 1.0])
+    assert top_k_mask(keys, score, vs, 2).tolist() == [False, True, True, True, True]
+    assert top_k_mask(keys, score, vs, 1).tolist() == [False, True, False, False, True]
+
+def test_build_candidates_prunes_per_txn_and_per_payment():
+    ft = pd.DataFrame({
+        "txn_id": ["t1", "t2"], "vendor_canonical": ["Amazon", "Uber"], "vendor_id": ["", ""],
+        "date": ["2025-12-02", "2025-12-02"], "amount_cents": [1000, 1000],
+    })
+    fp = pd.DataFrame({
+        "pay_id": ["p1", "p2", "p3"], "vendor_canonical": ["Amazon", "Amazon", "Lyft"], "vendor_id": ["", "", ""],
+        "date": ["2025-12-02", "2025-12-03", "2025-12-02"], "amount_cents": [1000, 1000, 1000],
+    })
+    full = build_candidates("b1", ft, fp, 3, 0, 0.6, 0.3, 0.1)
+    assert len(full) == 6
+    pruned = build_candidates("b1", ft, fp, 3, 0, 0.6, 0.3, 0.1, top_k=1, score_floor=0.5)
+    assert pruned[["txn_id", "pay_id"]].values.tolist() == [["t1", "p1"]]
+
+    summary = summarize_candidates(full)
+    t1 = summary[summary["txn_id"] == "t1"].iloc[0]
+    assert t1["candidate_count"] == 3 and t1["best_pay_id"] == "p1" and t1["best_score"] == 1.0
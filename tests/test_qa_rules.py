@@ -1,5 +1,10 @@
+import sqlite3
+
 import pandas as pd
-from reconworks.qa_checks import run_qa_for_batch, PolicyRule
+from reconworks.db import create_qa_flags_table
+from reconworks.modeling import _ensure_fact_tables
+from reconworks.policy_compiler import compile_policy_rules, insert_policy_flags
+from reconworks.qa_checks import QAProfiler, run_qa_for_batch, PolicyRule
 
 def test_policy_rule_triggers():
     ft = pd.DataFrame([{
@@ -17,3 +22,69 @@ def test_policy_rule_triggers():
     rules = [PolicyRule(flag_code="POLICY_HIGH_AMOUNT", field="amount_cents", op=">", value="50000", severity="warning", message="hi", applies_to="transactions")]
     flags = run_qa_for_batch("b1", ft, fp, rules)
     assert (flags["flag_code"] == "POLICY_HIGH_AMOUNT").any()
+
+def test_flags_keep_check_and_row_order():
+    ft = pd.DataFrame([
+        {"txn_id": "t1", "vendor_canonical": "Uber", "vendor_id": "v2", "date": "2025-01-04", "amount_cents": 1790, "is_weekend": 1},
+        {"txn_id": "t2", "vendor_canonical": None, "vendor_id": "v9", "date": "2025-01-06", "amount_cents": 500, "is_weekend": 0},
+        {"txn_id": "t3", "vendor_canonical": "Uber", "vendor_id": "v2", "date": "2025-01-04", "amount_cents": 1790, "is_weekend": 1},
+    ])
+    flags = run_qa_for_batch("b1", ft, pd.DataFrame([]), [])
+    assert list(zip(flags["flag_code"], flags["record_id"])) == [
+        ("MISSING_VENDOR", "t2"),
+        ("DUPLICATE_LIKELY", "t1"), ("DUPLICATE_LIKELY", "t3"),
+        ("WEEKEND_TRANSACTION", "t1"), ("WEEKEND_TRANSACTION", "t3"),
+    ]
+    assert flags["amount_cents"].tolist() == [500, 1790, 1790, 1790, 1790]
+    assert flags["source_file"].isna().all()
+
+def test_compiled_rules_match_in_pandas_and_sql():
+    ft = pd.DataFrame([
+        {"txn_id": f"t{i}", "batch_id": "b1", "vendor_canonical": v, "vendor_id": vid, "date": d, "amount_cents": a, "source_row_number": i}
+        for i, (v, vid, d, a) in enumerate([
+            ("Uber", "v2", "2025-01-04", 1790), ("Amazon", "v1", "2025-02-06", 48270),
+            ("United Airlines", "v5", "2025-03-04", 61000), ("Uber Eats", "v3", "2025-03-09", 2500),
+        ])
+    ])
+    rules = [
+        PolicyRule("UBER_ANY", "vendor_canonical", "regex", "^Uber", "info", "", "both"),
+        PolicyRule("MID_BAND", "amount_cents", "between", "2000|50000", "info", "", "both"),
+        PolicyRule("WATCHLIST", "vendor_id", "in", "v1|v5", "warning", "watch", "both"),
+        PolicyRule("HIGH", "amount_cents", ">", "10000", "warning", "", "both"),
+        PolicyRule("HIGH", "amount_cents", ">", "100000", "warning", "airline limit", "both", vendor_id="v5"),
+        PolicyRule("HIGH", "amount_cents", ">", "1000", "warning", "", "both", vendor_id="v2"),
+    ]
+    flags = run_qa_for_batch("b1", ft, pd.DataFrame([]), rules, created_at="now")
+    flags = flags[flags["flag_code"].isin({r.flag_code for r in rules})].reset_index(drop=True)
+    assert list(zip(flags["flag_code"], flags["record_id"])) == [
+        ("UBER_ANY", "t0"), ("UBER_ANY", "t3"),
+        ("MID_BAND", "t1"), ("MID_BAND", "t3"),
+        ("WATCHLIST", "t1"), ("WATCHLIST", "t2"),
+        ("HIGH", "t0"), ("HIGH", "t1"),
+    ]
+    assert flags["message"].iloc[6] == "Policy rule hit: amount_cents > 1000"
+
+    conn = sqlite3.connect(":memory:")
+    _ensure_fact_tables(conn)
+    create_qa_flags_table(conn)
+    ft.to_sql("fact_transactions", conn, if_exists="append", index=False)
+    rule_hits = {}
+    assert insert_policy_flags(conn, compile_policy_rules(rules), "b1", "now", rule_hits=rule_hits) == len(flags)
+    assert rule_hits == {**{("transactions", n): 2 for n in range(4)}, **{("vendor_payments", n): 0 for n in range(4)}}
+    got = pd.read_sql_query("SELECT * FROM qa_flags ORDER BY rowid", conn)
+    cols = ["record_id", "flag_code", "severity", "message", "vendor_id", "amount_cents"]
+    assert got[cols].values.tolist() == flags[cols].values.tolist()
+
+def test_profiler_records_every_check():
+    ft = pd.DataFrame([
+        {"txn_id": "t1", "vendor_canonical": "Uber", "vendor_id": "v2", "date": "2025-01-04", "amount_cents": 1790, "is_weekend": 1},
+        {"txn_id": "t2", "vendor_canonical": "Uber", "vendor_id": "v2", "date": "2025-01-04", "amount_cents": 1790, "is_weekend": 1},
+    ])
+    rules = [PolicyRule("OVER_10", "amount_cents", ">", "1000", "info", "", "both")]
+    profiler = QAProfiler(trace_memory=True)
+    flags = run_qa_for_batch("b1", ft, pd.DataFrame([]), rules, profiler=profiler)
+    metrics = pd.DataFrame(profiler.metrics)
+    assert metrics["hits"].sum() == len(flags)
+    assert metrics.set_index("check_name").loc["OVER_10", "rows_scanned"] == 2
+    assert metrics.set_index("check_name").loc["DUPLICATE_LIKELY", "hits"].tolist() == [2, 0]
+    assert metrics["memory_delta_bytes"].notna().all()
@@ -0,0 +1,41 @@
+import sqlite3
+
+import pandas as pd
+from reconworks.db import create_matches_table
+from reconworks.report_marts import MART_TABLES, mark_reports_stale, refresh_report_marts
+
+def _marts(conn):
+    out = {}
+    for table in MART_TABLES[:2] + MART_TABLES[3:]:
+        df = pd.read_sql_query(f"SELECT * FROM {table}", conn)
+        out[table] = df.sort_values(list(df.columns)).reset_index(drop=True)
+    return out
+
+def test_incremental_refresh_equals_full_rebuild():
+    conn = sqlite3.connect(":memory:")
+    create_matches_table(conn)
+    ft = pd.DataFrame([
+        {"batch_id": "b1", "txn_id": f"t{i}", "month": m, "vendor_canonical": v, "amount_cents": 1000 + i}
+        for i, (m, v) in enumerate([("2025-01", "Uber"), ("2025-01", "Uber"), ("2025-01", "Lyft"), ("2025-02", "Uber")])
+    ])
+    ft.to_sql("fact_transactions", conn, index=False)
+    conn.execute("INSERT INTO matches (batch_id, txn_id, pay_id, match_score) VALUES ('b1', 't0', 'p0', 0.95);")
+
+    first = refresh_report_marts(conn, "b1", top_n=5)
+    assert first["report_changed_transactions"] == 4
+    assert refresh_report_marts(conn, "b1", top_n=5) == {"report_changed_transactions": 0}
+
+    # t1 moves vendor and gets matched; t3 loses its row entirely.
+    conn.execute("UPDATE fact_transactions SET vendor_canonical = 'Lyft', amount_cents = 5000 WHERE txn_id = 't1';")
+    conn.execute("DELETE FROM fact_transactions WHERE txn_id = 't3';")
+    conn.execute("INSERT INTO matches (batch_id, txn_id, pay_id, match_score) VALUES ('b1', 't1', 'p1', 0.99);")
+    mark_reports_stale(conn, "b1", "txn", ["t1", "t3"])
+    assert refresh_report_marts(conn, "b1", top_n=5)["report_changed_transactions"] == 2
+    incremental = _marts(conn)
+
+    mark_reports_stale(conn, "b1")
+    refresh_report_marts(conn, "b1", top_n=5)
+    for table, df in _marts(conn).items():
+        pd.testing.assert_frame_equal(incremental[table], df)
+    rate = conn.execute("SELECT month, txn_count, matched_count, match_rate FROM rpt_match_rate_by_month").fetchall()
+    assert rate == [("2025-01", 3, 2, 0.6667)]
@@ -0,0 +1,15 @@
+import numpy as np
+from reconworks.matching import _match_type, _score
+from reconworks.scoring import match_type_arrays, score_arrays
+
+def test_score_arrays_match_scalar():
+    rng = np.random.default_rng(3)
+    vs = np.concatenate([rng.random(2000), np.round(rng.random(2000), 2), [1.0, 0.95, 0.999]])
+    dd = rng.integers(-4, 5, len(vs))
+    ad = rng.integers(-6, 7, len(vs))
+    for window, tol in [(3, 0), (3, 5), (0, 0)]:
+        got = score_arrays(vs, dd, ad, window, tol, 0.6, 0.3, 0.1)
+        want = [_score(float(v), int(d), window, int(a), tol, 0.6, 0.3, 0.1) for v, d, a in zip(vs, dd, ad)]
+        assert got.tolist() == want
+    types = match_type_arrays(vs, dd, ad)
+    assert types.tolist() == [_match_type(float(v), int(d), int(a)) for v, d, a in zip(vs, dd, ad)]
@@ -0,0 +1,27 @@
+import numpy as np
+from reconworks.matching import _vendor_similarity
+from reconworks.similarity import vendor_similarity_bulk
+
+def test_bulk_similarity_matches_scalar():
+    a = np.array(["Amazon", "amazon", "Uber", "Uber Eats", "", "Starbucks", "Amazon"], dtype=object)
+    b = np.array(["Amazon Web Services", "AMAZON", "Lyft", "Uber", "Uber", " Starbucks ", "Amazon Web Services"], dtype=object)
+    bulk = vendor_similarity_bulk(a, b, workers=1)
+    assert bulk.tolist() == [_vendor_similarity(x, y) for x, y in zip(a, b)]
+
+def test_similarity_cache_roundtrip_and_cap():
+    import sqlite3
+    from reconworks.similarity import VendorSimilarityCache
+
+    conn = sqlite3.connect(":memory:")
+    cache = VendorSimilarityCache(conn, max_rows=2)
+    a = np.array(["Amazon", "Uber"], dtype=object)
+    b = np.array(["Amazon Web Services", "Uber Eats"], dtype=object)
+    ids_a = np.array(["va", "vu"], dtype=object)
+    ids_b = np.array(["vaws", "vue"], dtype=object)
+    first = vendor_similarity_bulk(a, b, workers=1, ids_a=ids_a, ids_b=ids_b, cache=cache)
+    again = vendor_similarity_bulk(a, b, workers=1, ids_a=ids_a, ids_b=ids_b, cache=cache)
+    assert first.tolist() == again.tolist()
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    cache.store(np.array(["vx"], dtype=object), np.array(["vy"], dtype=object), np.array([0.5]))
+    assert conn.execute("SELECT COUNT(1) FROM vendor_similarity_cache").fetchone()[0] == 2
@@ -0,0 +1,93 @@
+import sqlite3
+
+import pandas as pd
+from reconworks.db import create_ingest_files_table, create_matches_table, create_open_items_table
+from reconworks.spend_cube import backfill_spend_cube, refresh_spend_cube, spend_trends
+
+def _facts(batch_id, rows, source_file=None):
+    return pd.DataFrame([
+        {"batch_id": batch_id, "txn_id": f"{batch_id}-{i}", "month": m, "vendor_id": v, "vendor_canonical": v.title(),
+         "currency": "USD", "amount_cents": a, "source_file": source_file or f"data/{batch_id}.csv"}
+        for i, (m, v, a) in enumerate(rows)
+    ])
+
+def test_cube_trends_across_batches():
+    conn = sqlite3.connect(":memory:")
+    create_matches_table(conn)
+    pd.concat([
+        _facts("b1", [("2025-01", "uber", 1000), ("2025-01", "lyft", 500), ("", "uber", 7)]),
+        _facts("b2", [("2025-01", "uber", 250), ("2025-02", "uber", 2000)]),
+    ]).to_sql("fact_transactions", conn, index=False)
+    conn.executemany("INSERT INTO matches (batch_id, txn_id, pay_id) VALUES (?, ?, ?);", [("b1", "b1-0", "p"), ("b2", "b2-1", "q")])
+
+    assert refresh_spend_cube(conn, "b1") == 3
+    assert backfill_spend_cube(conn) == ["b2"]
+    assert backfill_spend_cube(conn) == []
+
+    trends = spend_trends(conn)
+    assert trends[["month", "record_count", "matched_count", "spend_usd", "match_rate"]].values.tolist() == [
+        ["2025-01", 3, 1, 17.5, 0.3333],
+        ["2025-02", 1, 1, 20.0, 1.0],
+    ]
+    assert trends["spend_change_pct"].tolist()[1] == 14.29
+
+    # Re-slicing one batch replaces only its own rows.
+    conn.execute("DELETE FROM matches WHERE batch_id = 'b2';")
+    refresh_spend_cube(conn, "b2")
+    by_vendor = spend_trends(conn, by=["vendor_canonical"], start_month="2025-01", end_month="2025-01")
+    assert by_vendor[["vendor_canonical", "record_count", "matched_count"]].values.tolist() == [["Lyft", 1, 0], ["Uber", 2, 1]]
+
+def test_reingested_file_counts_once():
+    conn = sqlite3.connect(":memory:")
+    create_matches_table(conn)
+    create_ingest_files_table(conn)
+    rows = [("2025-01", "uber", 1000), ("2025-02", "uber", 500)]
+    # b2 re-ingests b1's file (the same export, one row corrected); b3 loads a new file.
+    pd.concat([
+        _facts("b1", rows, "data/jan.csv"),
+        _facts("b2", rows[:1] + [("2025-02", "uber", 700)], "data/jan.csv"),
+        _facts("b3", [("2025-02", "lyft", 300)], "data/feb.csv"),
+    ]).to_sql("fact_transactions", conn, index=False)
+    conn.executemany("INSERT INTO ingest_files (batch_id, source_file, ingested_at_utc) VALUES (?, ?, ?);",
+                     [("b2", "data/jan.csv", "2025-03-02"), ("b1", "data/jan.csv", "2025-03-01"), ("b3", "data/feb.csv", "2025-03-01")])
+    backfill_spend_cube(conn)
+
+    trends = spend_trends(conn)
+    assert trends[["month", "record_count", "spend_usd"]].values.tolist() == [["2025-01", 1, 10.0], ["2025-02", 2, 10.0]]
+
+def test_ledger_match_reslices_the_carried_batch():
+    conn = sqlite3.connect(":memory:")
+    create_matches_table(conn)
+    create_open_items_table(conn)
+    pd.concat([
+        _facts("b1", [("2025-01", "uber", 1000)]),
+        _facts("b2", [("2025-02", "uber", 2000)]),
+    ]).to_sql("fact_transactions", conn, index=False)
+    conn.execute("INSERT INTO open_items (record_type, record_id, batch_id) VALUES ('txn', 'b1-0', 'b1');")
+    backfill_spend_cube(conn)
+    assert spend_trends(conn)["matched_count"].tolist() == [0, 0]
+
+    # b2 matches the carried b1 record: the match row sits under b2, and b1's slice follows.
+    conn.execute("INSERT INTO matches (batch_id, txn_id, pay_id) VALUES ('b2', 'b1-0', 'p');")
+    conn.execute("UPDATE open_items SET closed_by_batch_id = 'b2';")
+    refresh_spend_cube(conn, "b2")
+    assert spend_trends(conn)["matched_count"].tolist() == [1, 0]
+
+    # b2 re-matched without it: the ledger reopens the item and b1's slice is unmatched again.
+    conn.execute("DELETE FROM matches;")
+    conn.execute("UPDATE open_items SET closed_by_batch_id = NULL;")
+    refresh_spend_cube(conn, "b2")
+    assert spend_trends(conn)["matched_count"].tolist() == [0, 0]
+
+def test_change_pct_needs_the_previous_calendar_month():
+    conn = sqlite3.connect(":memory:")
+    create_matches_table(conn)
+    _facts("b1", [("2025-01", "uber", 1000), ("2025-03", "uber", 3000), ("2025-04", "uber", 1500), ("2025-02", "lyft", 100)]
+           ).to_sql("fact_transactions", conn, index=False)
+    backfill_spend_cube(conn)
+
+    trends = spend_trends(conn, by=["vendor_id"])
+    uber = trends[trends["vendor_id"] == "uber"]
+    # No February row for uber: March has no prior month to compare with.
+    assert uber["spend_change_pct"].fillna(-1).tolist() == [-1, -1, -50.0]
+    assert spend_trends(conn, by=["vendor_id"], vendor_id="nobody").empty
@@ -0,0 +1,39 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+from reconworks.split_matching import split_payment_matches, subset_sum_mitm
+
+def test_subset_sum_mitm_finds_closest_subset():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        amounts = rng.integers(1, 30, rng.integers(0, 9))
+        target = int(rng.integers(1, 100))
+        best = None
+        for r in range(2, len(amounts) + 1):
+            for combo in itertools.combinations(range(len(amounts)), r):
+                diff = abs(int(amounts[list(combo)].sum()) - target)
+                if diff <= 1 and (best is None or diff < best):
+                    best = diff
+        got = subset_sum_mitm(amounts, target, tolerance=1)
+        if best is None:
+            assert got is None
+        else:
+            assert len(got) >= 2 and abs(int(amounts[got].sum()) - target) == best
+
+def test_split_payment_settles_several_rides():
+    rides = [1250, 980, 2210, 1540]
+    ft = pd.DataFrame([
+        {"txn_id": f"t{i}", "vendor_id": "uber", "date": f"2025-03-{i + 3:02d}", "amount_cents": a}
+        for i, a in enumerate(rides)
+    ] + [{"txn_id": "t9", "vendor_id": "lyft", "date": "2025-03-04", "amount_cents": 980}])
+    fp = pd.DataFrame([
+        {"pay_id": "p1", "vendor_id": "uber", "date": "2025-03-31", "amount_cents": 1250 + 2210 + 1540},
+        {"pay_id": "p2", "vendor_id": "uber", "date": "2025-03-31", "amount_cents": 17},
+    ])
+    stats = {}
+    out = split_payment_matches("b1", ft, fp, date_window_days=31, stats=stats)
+    assert sorted(out["txn_id"]) == ["t0", "t2", "t3"]
+    assert set(out["pay_id"]) == {"p1"}
+    assert (out["match_type"] == "split").all()
+    assert stats["split_payments"] == 1
@@ -0,0 +1,38 @@
+import sqlite3
+
+import pandas as pd
+from reconworks.config import MatchingConfig
+from reconworks.db import create_match_candidates_table, create_match_candidate_summary_table, create_matches_table, create_matching_runs_table
+from reconworks.matching import match_frames
+from reconworks.modeling import _ensure_fact_tables
+from reconworks.sql_matching import match_batch_sql
+
+def test_sql_engine_matches_in_memory_engine():
+    conn = sqlite3.connect(":memory:")
+    _ensure_fact_tables(conn)
+    for t in (create_match_candidates_table, create_match_candidate_summary_table, create_matches_table, create_matching_runs_table):
+        t(conn)
+    rows = [
+        ("1", "Amazon", "v1", "2025-12-02", 4827, "Amazon", "v1", "2025-12-02", 4827),
+        ("2", "Uber", "v2", "2025-12-03", 1790, "Uber Eats", "v3", "2025-12-04", 1790),
+        ("3", "Uber", "v2", "2025-12-03", 1790, "Uber", "v2", "2025-12-05", 1795),
+        ("4", "Lyft", "v4", "2025-12-09", 2500, "Lyft", "v4", "2025-12-30", 2500),
+        ("5", "Amazon", "v1", "2025-12-02", 4830, "Amazon", "v1", None, 4830),
+    ]
+    ft = pd.DataFrame([{"txn_id": f"t{r[0]}", "batch_id": "b1", "vendor_canonical": r[1], "vendor_id": r[2], "date": r[3], "amount_cents": r[4]} for r in rows])
+    fp = pd.DataFrame([{"pay_id": f"p{r[0]}", "batch_id": "b1", "vendor_canonical": r[5], "vendor_id": r[6], "date": r[7], "amount_cents": r[8]} for r in rows])
+    ft.to_sql("fact_transactions", conn, if_exists="append", index=False)
+    fp.to_sql("fact_vendor_payments", conn, if_exists="append", index=False)
+
+    mcfg = MatchingConfig(amount_tolerance_cents=10, min_score=0.5, similarity_cache=False, sql_chunk_rows=2)
+    ft = pd.read_sql_query("SELECT * FROM fact_transactions WHERE batch_id='b1'", conn)
+    fp = pd.read_sql_query("SELECT * FROM fact_vendor_payments WHERE batch_id='b1'", conn)
+    _, candidates, matches = match_frames("b1", ft, fp, mcfg)
+
+    summary = match_batch_sql(conn, "b1", mcfg)
+    cols = ["txn_id", "pay_id", "match_score", "match_type", "date_diff_days", "amount_diff_cents"]
+    got = pd.read_sql_query("SELECT * FROM matches", conn)
+    assert len(matches) == 3
+    assert got[cols].values.tolist() == matches[cols].values.tolist()
+    assert summary["candidates"] == len(candidates)
+    assert summary["unmatched_transactions"] == len(ft) - len(matches)
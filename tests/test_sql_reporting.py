@@ -0,0 +1,32 @@
+import sqlite3
+
+import pandas as pd
+from reconworks.db import create_matches_table
+from reconworks.report_marts import marts_from_groups, spend_groups
+from reconworks.sql_reporting import report_marts_sql
+
+def test_sql_marts_match_pandas():
+    conn = sqlite3.connect(":memory:")
+    create_matches_table(conn)
+    ft = pd.DataFrame([
+        {"batch_id": "b1", "txn_id": f"t{i}", "month": m, "vendor_canonical": v, "amount_cents": a}
+        for i, (m, v, a) in enumerate([
+            ("2025-01", "Uber", 1790), ("2025-01", "Uber", 1), ("2025-01", "Lyft", 333),
+            ("2025-02", None, 500), (None, "Lyft", 250), ("2025-02", "Bolt", 90),
+        ])
+    ] + [{"batch_id": "b2", "txn_id": "x", "month": "2025-01", "vendor_canonical": "Uber", "amount_cents": 10**6}])
+    ft.to_sql("fact_transactions", conn, index=False)
+    conn.executemany("INSERT INTO matches (batch_id, txn_id, pay_id) VALUES (?, ?, ?);",
+                     [("b1", "t0", "p0"), ("b1", "t4", "p4"), ("b2", "t2", "p9")])
+
+    spend, match_rate, exc_by, top_vendors = report_marts_sql(conn, "b1", top_n=2)
+    ref = ft[ft["batch_id"] == "b1"].assign(is_matched=lambda d: d["txn_id"].isin({"t0", "t4"}))
+    expected = marts_from_groups(spend_groups(ref), top_n=2)
+    for got, want in zip((spend, match_rate, top_vendors), expected):
+        key = list(want.columns)
+        pd.testing.assert_frame_equal(
+            got.sort_values(key).reset_index(drop=True), want.sort_values(key).reset_index(drop=True), check_dtype=False
+        )
+    assert top_vendors["vendor_canonical"].tolist() == ["Uber", "Lyft"]
+    assert match_rate["match_rate"].tolist() == [0.3333, 0.0]
+    assert exc_by.empty